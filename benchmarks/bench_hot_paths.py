@@ -0,0 +1,335 @@
+'''
+    Micro-benchmarks of the hot paths of the environments, the replay buffer and the trainers.
+
+    Every benchmark is timed in a few rounds, the median seconds per call is the result.
+    Results could be saved as a JSON baseline, a later run is compared with the baseline
+    and fails if any benchmark is slower than the baseline by more than the threshold.
+    Runs offline and on CPU only, no GPU is used even if available.
+
+    Usage:
+        python benchmarks/bench_hot_paths.py --save benchmarks/baseline.json
+        python benchmarks/bench_hot_paths.py --compare benchmarks/baseline.json --threshold 0.2
+        python benchmarks/bench_hot_paths.py --only replay env.negotiation
+'''
+import os
+# CPU only, must be set before tensorflow is imported
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import numpy as np
+
+# drl_negotiation of this checkout, the script is run from benchmarks/ without installing the package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(name, number=100):
+    '''
+    registers a benchmark, the decorated function does the setup and returns the callable which is timed
+
+    Args:
+        name: name of the benchmark, used as the key in the baseline
+        number: calls of the callable in every round
+    '''
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, number)
+        return setup
+    return decorator
+
+
+####################################################################################################
+# Environments
+####################################################################################################
+
+def _negotiation_env():
+    from drl_negotiation.env import NegotiationEnv
+    from drl_negotiation.game import NegotiationGame
+    from drl_negotiation.negotiator import MyDRLNegotiator, MyOpponentNegotiator
+    from drl_negotiation.utility_functions import MyUtilityFunction
+    from drl_negotiation.utils import generate_config, genearate_observation_space
+
+    config = generate_config()
+    game = NegotiationGame(
+        name="negotiation_game",
+        game_type="DRLNegotiation",
+        issues=config.get("issues"),
+        competitors=[
+            MyDRLNegotiator(name="my_drl_negotiator", ufun=MyUtilityFunction(weights=(-0.35,)), init_proposal=False),
+            MyOpponentNegotiator(name="my_opponent_negotiator", ufun=MyUtilityFunction(weights=(0.25,))),
+        ],
+        n_steps=100,
+    )
+    return NegotiationEnv(
+        name="bench_n_env",
+        game=game,
+        strategy="ac_s",
+        observation_space=genearate_observation_space(config),
+        action_space=3,
+    )
+
+
+@benchmark("env.negotiation.reset", number=20)
+def bench_negotiation_reset(args):
+    env = _negotiation_env()
+    return env.reset
+
+
+@benchmark("env.negotiation.step", number=100)
+def bench_negotiation_step(args):
+    env = _negotiation_env()
+    env.reset()
+
+    def run():
+        _, _, done, _ = env.step(action=env.action_space.sample())
+        if done:
+            env.reset()
+    return run
+
+
+def _scml_env():
+    from drl_negotiation.utils import make_env
+    return make_env("scml")
+
+
+@benchmark("env.scml.reset", number=3)
+def bench_scml_reset(args):
+    env = _scml_env()
+    return env.reset
+
+
+@benchmark("env.scml.step", number=10)
+def bench_scml_step(args):
+    env = _scml_env()
+    env.reset()
+
+    def run():
+        _, _, done_n, _ = env.step([space.sample() for space in env.action_space])
+        if all(done_n):
+            env.reset()
+    return run
+
+
+####################################################################################################
+# Replay buffer
+####################################################################################################
+
+def _transition(obs_dim, act_dim):
+    return (np.random.uniform(-1, 1, obs_dim), np.random.uniform(0, 1, act_dim),
+            np.random.uniform(-1, 1), np.random.uniform(-1, 1, obs_dim), 0.0)
+
+
+@benchmark("replay.add", number=10000)
+def bench_replay_add(args):
+    from drl_negotiation.a2c.replay_buffer import ReplayBuffer
+
+    buffer = ReplayBuffer(args.buffer_size)
+    transition = _transition(args.obs_dim, args.act_dim)
+    return lambda: buffer.add(*transition)
+
+
+@benchmark("replay.sample_index", number=1000)
+def bench_replay_sample_index(args):
+    from drl_negotiation.a2c.replay_buffer import ReplayBuffer
+
+    buffer = ReplayBuffer(args.buffer_size)
+    for _ in range(args.buffer_size):
+        buffer.add(*_transition(args.obs_dim, args.act_dim))
+    return lambda: buffer.sample_index(buffer.make_index(args.batch_size))
+
+
+####################################################################################################
+# Trainer
+####################################################################################################
+
+@benchmark("trainer.update", number=20)
+def bench_trainer_update(args):
+    import tensorflow.compat.v1 as tf
+    from gym import spaces
+    import drl_negotiation.utils as U
+    from drl_negotiation.hyperparameters import ONLY_SELLER
+
+    n_policies = args.n_agents if ONLY_SELLER else 2 * args.n_agents
+    env = SimpleNamespace(
+        n=args.n_agents,
+        agents=[SimpleNamespace(name=f"agent@{i}") for i in range(args.n_agents)],
+        observation_space=[spaces.Box(low=-1.0, high=1.0, shape=(args.obs_dim, )) for _ in range(n_policies)],
+        action_space=[spaces.Discrete(args.act_dim) for _ in range(n_policies)],
+    )
+    obs_shape_n = [space.shape for space in env.observation_space]
+    arglist = argparse.Namespace(**{"good_policy": "maddpg",
+                                    "adv_policy": "maddpg",
+                                    "lr": 1e-2,
+                                    "num_units": 64,
+                                    "batch_size": args.batch_size,
+                                    "max_episode_len": 1,
+                                    "gamma": 0.95,
+                                    "n_steps": 1,
+                                    })
+
+    graph = tf.Graph()
+    with graph.as_default():
+        sess = U.make_session(num_cpu=1, graph=graph)
+        with sess.as_default():
+            trainers = U.get_trainers(env, 0, obs_shape_n, arglist)
+            U.initialize()
+            for _ in range(args.batch_size * 2):
+                for trainer in trainers:
+                    trainer.experience(*_transition(args.obs_dim, args.act_dim), False)
+
+    def run():
+        with graph.as_default(), sess.as_default():
+            for trainer in trainers:
+                trainer.preupdate()
+            for trainer in trainers:
+                trainer.update(trainers, 0)
+    return run
+
+
+####################################################################################################
+# Observation and utility functions
+####################################################################################################
+
+@benchmark("utils.normalize_observation", number=10000)
+def bench_normalize_observation(args):
+    from negmas import Issue
+    from drl_negotiation.utils import normalize_observation
+
+    # normalize_observation only reads the issues and the maximum time of the negotiator
+    negotiator = SimpleNamespace(ami=SimpleNamespace(issues=[Issue((300, 550))]), maximum_time=100)
+    obs = [350, 10]
+    return lambda: normalize_observation(obs, negotiator)
+
+
+def _outcomes(args):
+    from negmas import Issue
+    issues = [Issue(values=10, name="quantity"),
+              Issue(values=100, name="delivery_time"),
+              Issue(values=100, name="unit_price")]
+    return Issue.sample(issues=issues, n_outcomes=args.n_outcomes, astype=tuple)
+
+
+@benchmark("ufun.my.call", number=10)
+def bench_my_ufun_call(args):
+    from drl_negotiation.utility_functions import MyUtilityFunction
+
+    ufun = MyUtilityFunction(weights=(0, 0.25, 1))
+    outcomes = _outcomes(args)
+    return lambda: [ufun(_) for _ in outcomes]
+
+
+@benchmark("ufun.my.eval_batch", number=100)
+def bench_my_ufun_eval_batch(args):
+    from drl_negotiation.utility_functions import MyUtilityFunction
+
+    ufun = MyUtilityFunction(weights=(0, 0.25, 1))
+    outcomes = np.asarray(_outcomes(args), dtype=np.float64)
+    return lambda: ufun.eval_batch(outcomes)
+
+
+####################################################################################################
+# Runner
+####################################################################################################
+
+def run_benchmark(name, args):
+    setup, number = BENCHMARKS[name]
+    number = max(1, int(number * args.scale))
+    fn = setup(args)
+    for _ in range(args.warmup):
+        fn()
+
+    rounds = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+
+    return {"median": statistics.median(rounds), "min": min(rounds), "number": number, "repeat": args.repeat}
+
+
+def machine_info():
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+
+def compare(results, baseline, threshold):
+    '''
+    Returns:
+        names of the benchmarks slower than the baseline by more than threshold
+    '''
+    regressions = []
+    print(f"{'benchmark':<32} {'baseline':>12} {'current':>12} {'ratio':>8}")
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            print(f"{name:<32} {'-':>12} {result['median']:>12.3e} {'new':>8}")
+            continue
+        base = baseline["results"][name]["median"]
+        ratio = result["median"] / base if base > 0 else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<32} {base:>12.3e} {result['median']:>12.3e} {ratio:>8.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser("Micro-benchmarks of the hot paths of drl_negotiation")
+    parser.add_argument("--only", nargs="+", default=None, help="run the benchmarks whose names contain any of these")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--save", type=str, default=None, help="save the results as the JSON baseline")
+    parser.add_argument("--compare", type=str, default=None, help="compare the results with the JSON baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown, 0.2 means 20%%")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--scale", type=float, default=1.0, help="scale the number of calls of every benchmark")
+    parser.add_argument("--n-agents", type=int, default=4)
+    parser.add_argument("--obs-dim", type=int, default=30)
+    parser.add_argument("--act-dim", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--buffer-size", type=int, default=100000)
+    parser.add_argument("--n-outcomes", type=int, default=1000)
+    args = parser.parse_args()
+
+    names = [name for name in BENCHMARKS if args.only is None or any(_ in name for _ in args.only)]
+    if args.list:
+        print("\n".join(names))
+        return 0
+
+    np.random.seed(0)
+    results = OrderedDict()
+    for name in names:
+        results[name] = run_benchmark(name, args)
+        print(f"{name:<32} {results[name]['median']:>12.3e} s/call")
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump({"machine": machine_info(), "results": results}, fp, indent=2)
+
+    if args.compare:
+        with open(args.compare) as fp:
+            baseline = json.load(fp)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+'''
+    Benchmark: import time of the modules of drl_negotiation.
+
+    Every module is imported in a fresh interpreter several times, the median wall time is reported,
+    together with the heavy packages the import pulled in(tensorflow, stable_baselines, plotly, matplotlib).
+    Run it before and after a change of the imports to see the difference, e.g. with --save.
+
+    Usage:
+        python benchmarks/bench_import.py --repeat 5
+        python benchmarks/bench_import.py --modules drl_negotiation.env --save import_times.json
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HEAVY_PACKAGES = ["tensorflow", "stable_baselines", "plotly", "matplotlib"]
+
+DEFAULT_MODULES = [
+    "drl_negotiation",
+    "drl_negotiation.utils",
+    "drl_negotiation.env",
+    "drl_negotiation.mynegotiationmanager",
+    "drl_negotiation.a2c.numpy_actor",
+    "drl_negotiation.a2c.a2c",
+]
+
+_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [_ for _ in {heavy!r} if _ in sys.modules]}}))
+'''
+
+
+def import_time(module, cwd):
+    '''
+    Returns:
+        seconds of the import and the heavy packages loaded, in a fresh interpreter
+    '''
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    out = subprocess.run([sys.executable, "-c", _SCRIPT.format(module=module, heavy=HEAVY_PACKAGES)],
+                         cwd=cwd, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    if out.returncode != 0:
+        raise RuntimeError(f"Error when importing {module}:\n{out.stderr}")
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+    return result["seconds"], result["loaded"]
+
+
+def main():
+    parser = argparse.ArgumentParser("Import time of the modules of drl_negotiation")
+    parser.add_argument("--modules", nargs="+", default=DEFAULT_MODULES)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--save", type=str, default=None, help="save the results as JSON")
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    results = {}
+    print(f"{'module':<40} {'median(s)':>10} {'min(s)':>8}  heavy packages loaded")
+    for module in args.modules:
+        times, loaded = [], []
+        for _ in range(args.repeat):
+            seconds, loaded = import_time(module, root)
+            times.append(seconds)
+        results[module] = {"median": statistics.median(times), "min": min(times), "loaded": loaded}
+        print(f"{module:<40} {results[module]['median']:>10.3f} {results[module]['min']:>8.3f}  "
+              f"{', '.join(loaded) or '-'}")
+
+    if args.save:
+        with open(args.save, "w") as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+'''
+    Benchmark: throughput of the MADDPG update with different sizes of the tensorflow thread pools.
+
+    Random transitions are put into the replay buffer, then all trainers are updated with
+    FusedMADDPGUpdate, in a session created by utils.make_session for every number of threads.
+
+    Usage:
+        python benchmarks/bench_session_threads.py --threads 1 2 4 8 16 32 --n-agents 4 --batch-size 1024
+'''
+import argparse
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import tensorflow.compat.v1 as tf
+from gym import spaces
+
+import drl_negotiation.utils as U
+from drl_negotiation.a2c.trainer import FusedMADDPGUpdate
+from drl_negotiation.hyperparameters import ONLY_SELLER
+
+
+def make_fake_env(n_agents, obs_dim, act_dim):
+    '''
+    the trainers only need the spaces and the names of agents
+    '''
+    n_policies = n_agents if ONLY_SELLER else 2 * n_agents
+    return SimpleNamespace(
+        n=n_agents,
+        agents=[SimpleNamespace(name=f"agent@{i}") for i in range(n_agents)],
+        observation_space=[spaces.Box(low=-1.0, high=1.0, shape=(obs_dim, )) for _ in range(n_policies)],
+        action_space=[spaces.Discrete(act_dim) for _ in range(n_policies)],
+    )
+
+
+def bench(num_threads, args):
+    env = make_fake_env(args.n_agents, args.obs_dim, args.act_dim)
+    obs_shape_n = [space.shape for space in env.observation_space]
+    arglist = argparse.Namespace(**{"good_policy": "maddpg",
+                                    "adv_policy": "maddpg",
+                                    "lr": 1e-2,
+                                    "num_units": args.num_units,
+                                    "batch_size": args.batch_size,
+                                    "max_episode_len": 1,
+                                    "gamma": 0.95,
+                                    "n_steps": 1,
+                                    "joint_replay": True,
+                                    })
+
+    with tf.Graph().as_default():
+        sess = U.make_session(num_cpu=num_threads)
+        with sess.as_default():
+            trainers = U.get_trainers(env, 0, obs_shape_n, arglist)
+            update_all = FusedMADDPGUpdate(trainers)
+            U.initialize()
+
+            replay_buffer = trainers[0].replay_buffer
+            for _ in range(args.batch_size * 2):
+                replay_buffer.add(
+                    [np.random.uniform(-1, 1, shape) for shape in obs_shape_n],
+                    [np.random.uniform(0, 1, args.act_dim) for _ in obs_shape_n],
+                    np.random.uniform(-1, 1, len(obs_shape_n)),
+                    [np.random.uniform(-1, 1, shape) for shape in obs_shape_n],
+                    np.zeros(len(obs_shape_n)),
+                )
+
+            # warm up
+            for t in range(args.warmup):
+                update_all.update(t)
+
+            start = time.perf_counter()
+            for t in range(args.iters):
+                update_all.update(t)
+            elapsed = time.perf_counter() - start
+        sess.close()
+
+    return args.iters / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser("Throughput of the MADDPG update with different numbers of threads")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--n-agents", type=int, default=4)
+    parser.add_argument("--obs-dim", type=int, default=30)
+    parser.add_argument("--act-dim", type=int, default=5)
+    parser.add_argument("--num-units", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--iters", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'updates/s':>12} {'speedup':>8}")
+    baseline = None
+    for num_threads in args.threads:
+        throughput = bench(num_threads, args)
+        baseline = baseline or throughput
+        print(f"{num_threads:>8} {throughput:>12.2f} {throughput / baseline:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
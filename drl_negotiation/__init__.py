@@ -18,16 +18,22 @@ author = "naodongbanana"
 email = "n1085633848@outlook.com"
 license = "MIT License"
 
-import time
-from drl_negotiation.utils import logging_setup, init_setup
-
-print("#################################### \n"
-      "Welcome to drl negotiation, enjoy it!\n "
-      "if you have any questions, redirect to\n"
-      "uqveo@student.kit.edu\n"
-      "####################################")
-
-current_time = time.strftime('%a %d %b %Y %H:%M:%S +0000', time.localtime())
-print(f"{current_time} Initial drl negotiation!")
-init_setup()
-logging_setup()
+
+def setup():
+    """
+        creates SAVE_DIR and configures logging, called explicitly by the scripts of training and evaluation,
+        importing drl_negotiation has no side effects
+    """
+    import time
+    from drl_negotiation.utils import logging_setup, init_setup
+
+    print("#################################### \n"
+          "Welcome to drl negotiation, enjoy it!\n "
+          "if you have any questions, redirect to\n"
+          "uqveo@student.kit.edu\n"
+          "####################################")
+
+    current_time = time.strftime('%a %d %b %Y %H:%M:%S +0000', time.localtime())
+    print(f"{current_time} Initial drl negotiation!")
+    init_setup()
+    logging_setup()
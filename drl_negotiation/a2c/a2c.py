@@ -7,18 +7,26 @@ import argparse
 import tensorflow.compat.v1 as tf
 import gym
 from drl_negotiation.env import SCMLEnv
+from drl_negotiation.vec_env import SubprocVecSCMLEnv
+from drl_negotiation.a2c.async_rollouts import AsyncRollouts, is_stale
+from drl_negotiation.a2c.checkpoint import CheckpointWriter, write_checkpoint_index
+from drl_negotiation.a2c.numpy_actor import ACTORS_FILE, actor_spec, export_actors
+from drl_negotiation.a2c.trajectory import TrajectoryRecorder
+from drl_negotiation.timer import PhaseTimer
 import drl_negotiation.utils as U
+from drl_negotiation.a2c.trainer import make_joint_act, FusedMADDPGUpdate
 import numpy as np
 import pickle
 from tqdm import tqdm
 from drl_negotiation.hyperparameters import *
 import logging
+from typing import Union
 
 class MADDPGModel:
     trained_model = None
 
     def __init__(self,
-                 env: SCMLEnv = None,
+                 env: Union[SCMLEnv, SubprocVecSCMLEnv] = None,
                  policy=None,
                  only_seller=ONLY_SELLER,
                  logging_level = LOGGING_LEVEL,
@@ -43,7 +51,30 @@ class MADDPGModel:
                  # batch size * max_episode_len = replay buffer
                  batch_size=1,
                  num_units=64,
-                 # env
+                 # replay buffer, shared by all trainers
+                 joint_replay=JOINT_REPLAY,
+                 prioritized_replay=PRIORITIZED_REPLAY,
+                 prioritized_replay_alpha=PRIORITIZED_REPLAY_ALPHA,
+                 prioritized_replay_beta=PRIORITIZED_REPLAY_BETA,
+                 # replay buffers on memory-mapped files, continued when restored
+                 memmap_replay=MEMMAP_REPLAY,
+                 replay_dir=REPLAY_DIR,
+                 # update all trainers together
+                 fused_update=FUSED_UPDATE,
+                 # threads of the tensorflow session
+                 num_cpu=NUM_CPU,
+                 intra_op_threads=INTRA_OP_THREADS,
+                 inter_op_threads=INTER_OP_THREADS,
+                 # asynchronous actor/learner, env_fn creates the env of rollout workers
+                 async_rollouts=ASYNC_ROLLOUTS,
+                 env_fn=None,
+                 n_rollout_workers=N_ROLLOUT_WORKERS,
+                 weight_broadcast_interval=WEIGHT_BROADCAST_INTERVAL,
+                 max_staleness=MAX_STALENESS,
+                 rollout_chunk_size=ROLLOUT_CHUNK_SIZE,
+                 # time spent in every phase of the training loop
+                 phase_timer=PHASE_TIMER,
+                 # env, number of parallel worlds, set by the env if it is a SubprocVecSCMLEnv
                  n_envs=1,
                  # number of training episodes
                  num_episodes=60,
@@ -60,12 +91,20 @@ class MADDPGModel:
                  benchmark=False,
                  benchmark_iters=1000,
                  benchmark_dir="./benchmark_files/",
+                 # steps of a chunk of the recorded trajectory
+                 trajectory_chunk_size=TRAJECTORY_CHUNK_SIZE,
                  restore=False,
                  display=False,
                  plots_dir="./learning_curves/",
                  # init the model, used for evaluation
                  _init_setup_model=False,
                  save_trainers=SAVE_TRAINERS,
+                 # checkpoints written in the background, rotated
+                 async_checkpoint=ASYNC_CHECKPOINT,
+                 max_to_keep=MAX_TO_KEEP,
+                 max_pending_checkpoints=MAX_PENDING_CHECKPOINTS,
+                 # weights of actors in a .npz file, used by NumpyActor
+                 export_actors=EXPORT_ACTORS,
                  **kwargs,
         ):
         self.policy = policy
@@ -84,9 +123,40 @@ class MADDPGModel:
         self.exp_name = exp_name
         self.batch_size = batch_size
         self.num_units = num_units
+        self.joint_replay = joint_replay
+        self.prioritized_replay = prioritized_replay
+        self.prioritized_replay_alpha = prioritized_replay_alpha
+        self.prioritized_replay_beta = prioritized_replay_beta
+        self.memmap_replay = memmap_replay
+        self.replay_dir = replay_dir
+        self.fused_update = fused_update
+        self.num_cpu = num_cpu
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.async_rollouts = async_rollouts
+        self.env_fn = env_fn
+        self.n_rollout_workers = n_rollout_workers
+        self.weight_broadcast_interval = weight_broadcast_interval
+        self.max_staleness = max_staleness
+        self.rollout_chunk_size = rollout_chunk_size
+        self.async_checkpoint = async_checkpoint
+        self.max_to_keep = max_to_keep
+        self.max_pending_checkpoints = max_pending_checkpoints
+        self.checkpoint_writer = None
+        self.export_actors = export_actors
+        self.timer = PhaseTimer(enabled=phase_timer)
+        if hasattr(env, "timer"):
+            # phases inside SCMLEnv.step, e.g. world_step, observation, reward
+            env.timer = self.timer
+        # one long-lived session of the model, see sess
+        self._sess = None
+        # the trained model is loaded once for evaluation
+        self._loaded = False
 
         # env
-        self.n_envs = n_envs
+        # rollouts are collected from K worlds in parallel
+        self._vectorized = isinstance(env, SubprocVecSCMLEnv)
+        self.n_envs = env.num_envs if self._vectorized else n_envs
         self.num_episodes = num_episodes
         self.max_episode_len = max_episode_len
         self.num_adversaries = num_adversaries
@@ -97,6 +167,7 @@ class MADDPGModel:
         self.benchmark = benchmark
         self.benchmark_iters = benchmark_iters
         self.benchmark_dir = benchmark_dir
+        self.trajectory_chunk_size = trajectory_chunk_size
         self.restore = restore
         self.display = display
         self.plots_dir = plots_dir
@@ -104,14 +175,37 @@ class MADDPGModel:
         self.arglist = kwargs
 
         self.trainers = None
+        # actions of all trainers in a single session.run
+        self.joint_act = None
+        # FusedMADDPGUpdate of all trainers
+        self.update_all = None
 
         if _init_setup_model:
             self.setup_model()
 
         self.save_trainers = save_trainers
 
+    @property
+    def sess(self):
+        '''
+        the session is created when it is used the first time, then shared by setup_model, learn and predict
+        '''
+        if self._sess is None:
+            self._sess = U.make_session(
+                num_cpu=self.num_cpu,
+                intra_op_threads=self.intra_op_threads,
+                inter_op_threads=self.inter_op_threads,
+            )
+        return self._sess
+
+    def close(self):
+        if self._sess is not None:
+            self._sess.close()
+            self._sess = None
+            self._loaded = False
+
     def setup_model(self):
-        with U.single_threaded_session():
+        with self.sess.as_default():
             if not ONLY_SELLER:
                 obs_shape_n = []
                 for i in range(self.env.n):
@@ -128,9 +222,18 @@ class MADDPGModel:
                                             "batch_size": self.batch_size,
                                             "max_episode_len": self.max_episode_len,
                                             "gamma": self.gamma,
-                                            "n_steps": self.n_steps
+                                            "n_steps": self.n_steps,
+                                            "joint_replay": self.joint_replay,
+                                            "prioritized_replay": self.prioritized_replay,
+                                            "prioritized_replay_alpha": self.prioritized_replay_alpha,
+                                            "prioritized_replay_beta": self.prioritized_replay_beta,
+                                            "replay_dir": self.replay_dir if self.memmap_replay else None,
+                                            "restore": self.restore,
                                             })
             self.trainers = U.get_trainers(self.env, num_adversaries, obs_shape_n, arglist)
+            self.joint_act = make_joint_act(self.trainers)
+            if self.fused_update:
+                self.update_all = FusedMADDPGUpdate(self.trainers)
             logging.info(f"Using good policy {self.good_policy} and adv policy {self.adv_policy}")
 
         # assert issubclass(self.policy, Policy), "Error: the input policy for the maddpg model must be an" \
@@ -151,7 +254,7 @@ class MADDPGModel:
         if train_episodes is not None:
             self.num_episodes = train_episodes
 
-        with U.single_threaded_session():
+        with self.sess.as_default():
             if not ONLY_SELLER:
                 obs_shape_n = []
                 for i in range(self.env.n):
@@ -168,9 +271,18 @@ class MADDPGModel:
                        "batch_size": self.batch_size,
                        "max_episode_len": self.max_episode_len,
                        "gamma": self.gamma,
-                        "n_steps": self.n_steps
+                        "n_steps": self.n_steps,
+                        "joint_replay": self.joint_replay,
+                        "prioritized_replay": self.prioritized_replay,
+                        "prioritized_replay_alpha": self.prioritized_replay_alpha,
+                        "prioritized_replay_beta": self.prioritized_replay_beta,
+                        "replay_dir": self.replay_dir if self.memmap_replay else None,
+                        "restore": self.restore,
                        })
             self.trainers = U.get_trainers(self.env, num_adversaries, obs_shape_n, arglist)
+            self.joint_act = make_joint_act(self.trainers)
+            if self.fused_update:
+                self.update_all = FusedMADDPGUpdate(self.trainers)
             logging.info(f"Using good policy {self.good_policy} and adv policy {self.adv_policy}")
 
             U.initialize()
@@ -186,130 +298,450 @@ class MADDPGModel:
             if saver is None:
                 saver = U.get_saver()
 
-            episode_rewards = [0.0]
-            agent_rewards = [[0.0] for _ in range(self.env.n)]
-
-            final_ep_rewards = []
-            final_ep_ag_rewards = []
-            agent_info = [[[]]]
-            obs_n = self.env.reset()
-
-            episode_step = 0
-            current_episode = 0
-            train_step = 0
-            t_start = time.time()
-            pbar = tqdm(total=self.num_episodes)
-
-            while True:
-                #print(f'episodes: {len(episode_rewards)}, train steps: {train_step}')
-                action_n = self.predict(obs_n)
-
-                clipped_action_n = action_n
-                for i, _ in enumerate(self.env.action_space):
-                    if isinstance(_ , gym.spaces.Box):
-                        clipped_action_n[i] = np.clip(action_n[i], self.env.action_space[i].low, self.env.action_space[i].high)
+            if self.save_trainers and not (self.display or self.benchmark):
+                # actors of all trainers in the checkpoint, loaded separately by MyNegotiationManager
+                write_checkpoint_index(self.save_dir, self.model_name, self.trainers)
+            self._setup_checkpoint_writer()
+            try:
+                if self.async_rollouts:
+                    self._learn_async(saver, num_adversaries, obs_shape_n)
+                    return
+
+                if self._vectorized:
+                    self._learn_vectorized(saver, num_adversaries)
+                    return
+
+                episode_rewards = [0.0]
+                agent_rewards = [[0.0] for _ in range(self.env.n)]
+
+                final_ep_rewards = []
+                final_ep_ag_rewards = []
+                obs_n = self.env.reset()
+                recorder = None
+                if self.benchmark:
+                    # streamed to benchmark_dir/exp_name/, loaded by load_trajectory
+                    recorder = TrajectoryRecorder(self.benchmark_dir + self.exp_name, n_agents=len(obs_n),
+                                                  chunk_size=self.trajectory_chunk_size)
+
+                episode_step = 0
+                current_episode = 0
+                train_step = 0
+                t_start = time.time()
+                pbar = tqdm(total=self.num_episodes)
+
+                while True:
+                    #print(f'episodes: {len(episode_rewards)}, train steps: {train_step}')
+                    action_n = self.predict(obs_n)
+
+                    clipped_action_n = self._clip_actions(action_n)
+
+                    #print(f"action_n: {action_n}")
+                    with self.timer.phase("env_step"):
+                        new_obs_n, rew_n, done_n, info_n = self.env.step(clipped_action_n)
+
+                    episode_step +=1
+                    done = all(done_n)
+                    terminal = (episode_step > self.max_episode_len)
+
+                    if recorder is not None:
+                        recorder.add(obs_n, action_n, rew_n, done_n, done or terminal, info_n['n'])
+
+                    # experience
+                    self._experience(obs_n, action_n, rew_n, new_obs_n, done_n, terminal)
+
+                    obs_n = new_obs_n
+
+                    for i, rew in enumerate(rew_n):
+                        episode_rewards[-1] += rew
+                        if not ONLY_SELLER:
+                            agent_rewards[int(i / 2)][-1] += rew
+                        else:
+                            agent_rewards[i][-1] += rew
+
+                    if done or terminal:
+                        with self.timer.phase("env_reset"):
+                            obs_n = self.env.reset()
+                        self.timer.end_episode()
+                        episode_step = 0
+                        pbar.update(1)
+                        episode_rewards.append(0)
+                        for a in agent_rewards:
+                            a.append(0)
+
+                    train_step += 1
+
+                    # Evaluate, benchmarking learned policies
+                    if self.benchmark:
+                        if train_step > self.benchmark_iters and (done or terminal):
+                            logging.info("Finished benchmarking, now saving....")
+                            recorder.close()
+                            break
+                        continue
+
+                    # for displaying learned policies, not learning
+                    if self.display:
+                        time.sleep(0.1)
+                        self.env.render()
+                        continue
+
+                    # learn, update all policies in trainers, if not in display or benchmark mode
+                    self._update_trainers(train_step)
+
+                    ##############################################################################
+                    # save model
+                    # display training output
+                    ##############################################################################
+                    if terminal and (len(episode_rewards) % self.save_rate == 0):
+                        self._save_model(saver, train_step)
+
+                        if num_adversaries == 0:
+                            logging.info(f"steps: {train_step}, episodes: {len(episode_rewards)}, "
+                                  f"mean episode reward: {np.mean(episode_rewards[-self.save_rate:])}, "
+                                  f"time: {round(time.time() - t_start, 3)}")
+                        self.timer.log(last_episodes=self.save_rate)
+                        t_start = time.time()
+                        final_ep_rewards.append(np.mean(episode_rewards[-self.save_rate:]))
+                        for rew in agent_rewards:
+                            final_ep_ag_rewards.append(np.mean(rew[-self.save_rate:]))
+
+                    ##############################################################################
+                    # saves final episode reward for plotting training curve
+                    ##############################################################################
+                    if len(episode_rewards) > self.num_episodes:
+                        self._save_learning_curves(final_ep_rewards, final_ep_ag_rewards)
+                        logging.info(f'...Finished total of {len(episode_rewards)} episodes')
+                        break
+            finally:
+                self._close_checkpoint_writer()
+                if self.memmap_replay:
+                    self._flush_replay()
 
-                #print(f"action_n: {action_n}")
+    def _learn_vectorized(self, saver, num_adversaries):
+        """
+        Training loop for SubprocVecSCMLEnv, K worlds are stepped in parallel,
+        the actions of all worlds are predicted in one batch per trainer.
+        """
+        if self.benchmark or self.display:
+            raise ValueError("Error: benchmark and display mode are not supported with a vectorized environment, "
+                             "please use a single SCMLEnv!")
+
+        n_agents = len(self.trainers)
+        episode_rewards = [0.0]
+        agent_rewards = [[0.0] for _ in range(self.env.n)]
+        # running rewards of the current episode of every world
+        running_rewards = np.zeros(self.n_envs)
+        running_agent_rewards = np.zeros((self.n_envs, self.env.n))
+
+        final_ep_rewards = []
+        final_ep_ag_rewards = []
+        obs_n = self.env.reset()
+
+        train_step = 0
+        t_start = time.time()
+        pbar = tqdm(total=self.num_episodes)
+
+        while True:
+            action_n = self.predict(obs_n)
+            clipped_action_n = self._clip_actions(action_n)
+
+            # obs_n[i]: (K, obs_dim), rew_n: (n_agents, K), done_n: (n_agents, K)
+            with self.timer.phase("env_step"):
                 new_obs_n, rew_n, done_n, info_n = self.env.step(clipped_action_n)
 
-                episode_step +=1
-                done = all(done_n)
-                terminal = (episode_step > self.max_episode_len)
-
-                # experience
-                for i, agent in enumerate(self.trainers):
-                    agent.experience(obs_n[i], action_n[i], rew_n[i], new_obs_n[i], done_n[i], terminal)
-
-                obs_n = new_obs_n
-
-                for i, rew in enumerate(rew_n):
-                    episode_rewards[-1] += rew
+            n_finished = 0
+            for k in range(self.n_envs):
+                terminal = info_n[k]["terminal"]
+                # worlds which finished the episode are already reset by the worker
+                next_obs_n = info_n[k].get("terminal_observation", None)
+                if next_obs_n is None:
+                    next_obs_n = [new_obs[k] for new_obs in new_obs_n]
+                self._experience(
+                    [obs[k] for obs in obs_n],
+                    [action[k] for action in action_n],
+                    rew_n[:, k],
+                    next_obs_n,
+                    done_n[:, k],
+                    terminal
+                )
+
+                running_rewards[k] += np.sum(rew_n[:, k])
+                for i in range(n_agents):
                     if not ONLY_SELLER:
-                        agent_rewards[int(i / 2)][-1] += rew
+                        running_agent_rewards[k][int(i / 2)] += rew_n[i][k]
                     else:
-                        agent_rewards[i][-1] += rew
+                        running_agent_rewards[k][i] += rew_n[i][k]
 
-                if done or terminal:
-                    obs_n = self.env.reset()
-                    episode_step = 0
-                    pbar.update(1)
+                if "terminal_observation" in info_n[k]:
+                    episode_rewards[-1] = running_rewards[k]
                     episode_rewards.append(0)
-                    for a in agent_rewards:
+                    for a, rew in zip(agent_rewards, running_agent_rewards[k]):
+                        a[-1] = rew
                         a.append(0)
-                    agent_info.append([[]])
+                    running_rewards[k] = 0
+                    running_agent_rewards[k][:] = 0
+                    n_finished += 1
+
+            obs_n = new_obs_n
+            pbar.update(n_finished)
+            if n_finished:
+                self.timer.end_episode(n_finished)
+            train_step += 1
+
+            self._update_trainers(train_step)
+
+            # save the model when the number of episodes passes a multiple of save_rate
+            if n_finished and (len(episode_rewards) // self.save_rate) != \
+                    ((len(episode_rewards) - n_finished) // self.save_rate):
+                self._save_model(saver, train_step)
+
+                if num_adversaries == 0:
+                    logging.info(f"steps: {train_step}, episodes: {len(episode_rewards)}, "
+                                 f"mean episode reward: {np.mean(episode_rewards[-self.save_rate:])}, "
+                                 f"time: {round(time.time() - t_start, 3)}")
+                self.timer.log(last_episodes=self.save_rate)
+                t_start = time.time()
+                final_ep_rewards.append(np.mean(episode_rewards[-self.save_rate:]))
+                for rew in agent_rewards:
+                    final_ep_ag_rewards.append(np.mean(rew[-self.save_rate:]))
+
+            if len(episode_rewards) > self.num_episodes:
+                self._save_learning_curves(final_ep_rewards, final_ep_ag_rewards)
+                logging.info(f'...Finished total of {len(episode_rewards)} episodes')
+                break
+
+    def _learn_async(self, saver, num_adversaries, obs_shape_n):
+        """
+        Asynchronous actor/learner training, rollout workers run SCMLEnv created by env_fn,
+        this process(learner) consumes the transitions and updates the trainers continuously.
+        """
+        if self.benchmark or self.display:
+            raise ValueError("Error: benchmark and display mode are not supported with asynchronous rollouts, "
+                             "please use a single SCMLEnv!")
+        if self.env_fn is None:
+            raise ValueError("Error: asynchronous rollouts need env_fn to create the env of rollout workers, "
+                             "e.g. functools.partial(make_env, 'scml')!")
+
+        n_agents = len(self.trainers)
+        episode_rewards = [0.0]
+        agent_rewards = [[0.0] for _ in range(self.env.n)]
+        # running rewards of the current episode of every worker
+        running_rewards = np.zeros(self.n_rollout_workers)
+        running_agent_rewards = np.zeros((self.n_rollout_workers, self.env.n))
+
+        final_ep_rewards = []
+        final_ep_ag_rewards = []
+
+        rollouts = AsyncRollouts(
+            [self.env_fn] * self.n_rollout_workers,
+            self.trainers,
+            obs_shape_n,
+            self.env.action_space,
+            num_units=self.num_units,
+            max_episode_len=self.max_episode_len,
+            chunk_size=self.rollout_chunk_size,
+        )
+
+        train_step = 0
+        n_stale = 0
+        rollouts.broadcast(train_step)
+        t_start = time.time()
+        pbar = tqdm(total=self.num_episodes)
+
+        try:
+            while True:
+                # wait for transitions until the replay buffer is large enough, then update continuously
+                warm = all(len(_.replay_buffer) >= _.max_replay_buffer_len for _ in self.trainers)
+                with self.timer.phase("receive"):
+                    records = rollouts.receive(timeout=0 if warm else 1.0)
+                if not warm and not records:
+                    continue
 
+                n_finished = 0
+                for k, (obs_n, action_n, rew_n, new_obs_n, done_n, terminal, episode_end, version) in records:
+                    running_rewards[k] += np.sum(rew_n)
+                    for i in range(n_agents):
+                        if not ONLY_SELLER:
+                            running_agent_rewards[k][int(i / 2)] += rew_n[i]
+                        else:
+                            running_agent_rewards[k][i] += rew_n[i]
+
+                    if episode_end:
+                        episode_rewards[-1] = running_rewards[k]
+                        episode_rewards.append(0)
+                        for a, rew in zip(agent_rewards, running_agent_rewards[k]):
+                            a[-1] = rew
+                            a.append(0)
+                        running_rewards[k] = 0
+                        running_agent_rewards[k][:] = 0
+                        n_finished += 1
+
+                    # drop the transitions produced by too old actors
+                    if is_stale(version, train_step, self.max_staleness):
+                        n_stale += 1
+                        continue
+                    self._experience(obs_n, action_n, rew_n, new_obs_n, done_n, terminal)
+
+                pbar.update(n_finished)
+                if n_finished:
+                    self.timer.end_episode(n_finished)
                 train_step += 1
 
-                # Evaluate, benchmarking learned policies
-                if self.benchmark:
-                    for i, info in enumerate(info_n):
-                        agent_info[-1][i].append(info_n['n'])
-
-                    if train_step > self.benchmark_iters and (done or terminal):
-                        file_name = self.benchmark_dir + self.exp_name + '.pkl'
-                        logging.info("Finished benchmarking, now saving....")
-                        with open(file_name, 'wb') as fp:
-                            pickle.dump(agent_info[:-1], fp)
-                        break
-                    continue
+                self._update_trainers(train_step)
 
-                # for displaying learned policies, not learning
-                if self.display:
-                    time.sleep(0.1)
-                    self.env.render()
-                    continue
+                if train_step % self.weight_broadcast_interval == 0:
+                    rollouts.broadcast(train_step)
 
-                # learn, update all policies in trainers, if not in display or benchmark mode
-                loss = None
-                for agent in self.trainers:
-                    agent.preupdate()
-                for agent in self.trainers:
-                    loss = agent.update(self.trainers, train_step)
-                    if loss is not None:
-                        logging.debug(f"{agent}'s loss is {loss}")
-
-                ##############################################################################
-                # save model
-                # display training output
-                ##############################################################################
-                if terminal and (len(episode_rewards) % self.save_rate == 0):
-                    # save the model separately
-                    if self.save_trainers:
-                        for _ in self.trainers:
-                            U.save_as_scope(_.name, save_dir=self.save_dir, model_name=self.model_name)
-                    # save all model paramters
-                    U.save_state(self.save_dir + self.model_name, saver=saver)
+                # save the model when the number of episodes passes a multiple of save_rate
+                if n_finished and (len(episode_rewards) // self.save_rate) != \
+                        ((len(episode_rewards) - n_finished) // self.save_rate):
+                    self._save_model(saver, train_step)
 
                     if num_adversaries == 0:
                         logging.info(f"steps: {train_step}, episodes: {len(episode_rewards)}, "
-                              f"mean episode reward: {np.mean(episode_rewards[-self.save_rate:])}, "
-                              f"time: {round(time.time() - t_start, 3)}")
+                                     f"mean episode reward: {np.mean(episode_rewards[-self.save_rate:])}, "
+                                     f"stale transitions: {n_stale}, "
+                                     f"time: {round(time.time() - t_start, 3)}")
+                    self.timer.log(last_episodes=self.save_rate)
                     t_start = time.time()
                     final_ep_rewards.append(np.mean(episode_rewards[-self.save_rate:]))
                     for rew in agent_rewards:
                         final_ep_ag_rewards.append(np.mean(rew[-self.save_rate:]))
 
-                ##############################################################################
-                # saves final episode reward for plotting training curve
-                ##############################################################################
                 if len(episode_rewards) > self.num_episodes:
-                    module_path = os.getcwd()
-                    rew_file_name = self.plots_dir + self.exp_name + "_rewards.pkl"
-                    rew_file_name = os.path.join(module_path, rew_file_name)
-                    with open(rew_file_name, 'wb') as fp:
-                        pickle.dump(final_ep_rewards, fp)
-                    agrew_file_name = self.plots_dir + self.exp_name + '_agrewards.pkl'
-                    with open(agrew_file_name, 'wb') as fp:
-                        pickle.dump(final_ep_ag_rewards, fp)
+                    self._save_learning_curves(final_ep_rewards, final_ep_ag_rewards)
                     logging.info(f'...Finished total of {len(episode_rewards)} episodes')
                     break
+        finally:
+            rollouts.close()
+
+    def _clip_actions(self, action_n):
+        clipped_action_n = action_n
+        for i, _ in enumerate(self.env.action_space):
+            if isinstance(_ , gym.spaces.Box):
+                clipped_action_n[i] = np.clip(action_n[i], self.env.action_space[i].low, self.env.action_space[i].high)
+        return clipped_action_n
+
+    def _experience(self, obs_n, action_n, rew_n, new_obs_n, done_n, terminal):
+        with self.timer.phase("experience"):
+            self._add_experience(obs_n, action_n, rew_n, new_obs_n, done_n, terminal)
+
+    def _add_experience(self, obs_n, action_n, rew_n, new_obs_n, done_n, terminal):
+        if self.joint_replay:
+            # a single row for all agents in the shared buffer
+            self.trainers[0].replay_buffer.add(obs_n, action_n, rew_n, new_obs_n, [float(_) for _ in done_n])
+        else:
+            for i, agent in enumerate(self.trainers):
+                agent.experience(obs_n[i], action_n[i], rew_n[i], new_obs_n[i], done_n[i], terminal)
+
+    def _update_trainers(self, train_step):
+        with self.timer.phase("update"):
+            self._run_update(train_step)
+
+    def _run_update(self, train_step):
+        if self.update_all is not None:
+            loss_n = self.update_all.update(train_step)
+            if loss_n is not None:
+                for agent, loss in zip(self.trainers, loss_n):
+                    logging.debug(f"{agent}'s loss is {loss}")
+            return
+
+        loss = None
+        for agent in self.trainers:
+            agent.preupdate()
+        for agent in self.trainers:
+            loss = agent.update(self.trainers, train_step)
+            if loss is not None:
+                logging.debug(f"{agent}'s loss is {loss}")
+
+    def _setup_checkpoint_writer(self):
+        if not self.async_checkpoint or self.display or self.benchmark:
+            return
+        # the meta graph is exported once, the variables are written in the background
+        os.makedirs(self.save_dir, exist_ok=True)
+        tf.train.export_meta_graph(filename=self.save_dir + self.model_name + ".meta")
+        self.checkpoint_writer = CheckpointWriter(
+            tf.global_variables(),
+            save_dir=self.save_dir,
+            model_name=self.model_name,
+            max_to_keep=self.max_to_keep,
+            max_pending=self.max_pending_checkpoints,
+            actors={_.name: actor_spec(_) for _ in self.trainers} if self.export_actors else None,
+        )
+
+    def _close_checkpoint_writer(self):
+        if self.checkpoint_writer is None:
+            return
+        # waits for the last checkpoints
+        self.checkpoint_writer.close()
+        if self.checkpoint_writer.n_dropped:
+            logging.info(f"checkpoint writer dropped {self.checkpoint_writer.n_dropped} snapshots")
+        self.checkpoint_writer = None
+
+    def _replay_buffers(self):
+        # the joint replay buffer is shared by all trainers
+        buffers = []
+        for trainer in self.trainers or []:
+            if all(trainer.replay_buffer is not _ for _ in buffers):
+                buffers.append(trainer.replay_buffer)
+        return buffers
+
+    def _flush_replay(self):
+        '''
+        persists the memory-mapped replay buffers, a restored run continues with their transitions
+        '''
+        for buffer in self._replay_buffers():
+            if hasattr(buffer, "flush"):
+                buffer.flush()
+
+    def _save_model(self, saver, train_step=None):
+        if self.memmap_replay:
+            with self.timer.phase("save"):
+                self._flush_replay()
+
+        if self.checkpoint_writer is not None:
+            with self.timer.phase("save"):
+                self.checkpoint_writer.save(train_step)
+            return
+
+        with self.timer.phase("save"):
+            # save all model paramters, the actors of trainers are listed in the checkpoint index
+            U.save_state(self.save_dir + self.model_name, saver=saver)
+            if self.export_actors:
+                export_actors(self.trainers, self.save_dir + ACTORS_FILE)
+
+    def _save_learning_curves(self, final_ep_rewards, final_ep_ag_rewards):
+        module_path = os.getcwd()
+        rew_file_name = self.plots_dir + self.exp_name + "_rewards.pkl"
+        rew_file_name = os.path.join(module_path, rew_file_name)
+        with open(rew_file_name, 'wb') as fp:
+            pickle.dump(final_ep_rewards, fp)
+        agrew_file_name = self.plots_dir + self.exp_name + '_agrewards.pkl'
+        with open(agrew_file_name, 'wb') as fp:
+            pickle.dump(final_ep_ag_rewards, fp)
+
+        # time spent in every phase of the training loop
+        if self.timer.enabled:
+            self.timer.to_json(os.path.join(module_path, self.plots_dir + self.exp_name + "_timing.json"))
+            self.timer.to_csv(os.path.join(module_path, self.plots_dir + self.exp_name + "_timing.csv"))
+
+    def _joint_action(self, obs_n):
+        '''
+        actions of all trainers with the fused actors
+        '''
+        if self._vectorized:
+            # obs_n[i] is a batch of observations, one for every world
+            return self.joint_act(*obs_n)
+        return [act[0] for act in self.joint_act(*[np.asarray(obs)[None] for obs in obs_n])]
 
     def predict(self, obs_n, train=True):
         if train:
-            action_n = [agent.action(obs) for agent, obs in zip(self.trainers, obs_n)]
-            return action_n
+            with self.sess.as_default(), self.timer.phase("predict"):
+                return self._joint_action(obs_n)
         else:
-            with U.single_threaded_session():
+            with self.sess.as_default():
+                if self._loaded:
+                    return self._joint_action(obs_n)
+
                 U.initialize()
                 if self.load_dir == '':
                     self.load_dir = self.save_dir
@@ -318,9 +750,9 @@ class MADDPGModel:
                 try:
                     saver = tf.train.import_meta_graph(self.save_dir + self.model_name + ".meta")
                     U.load_state(tf.train.latest_checkpoint(self.save_dir), saver=saver)
+                    self._loaded = True
 
-                    action_n = [agent.action(obs) for agent, obs in zip(self.trainers, obs_n)]
-                    return action_n
+                    return self._joint_action(obs_n)
                 except IOError as e:
                     logging.error(f"Loading model error when not Train, please check path: "
                                   f"{self.save_dir + self.model_name} whether model is exist.")
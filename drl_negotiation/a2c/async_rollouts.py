@@ -0,0 +1,246 @@
+'''
+    Asynchronous actor/learner training of MADDPG.
+
+    Rollout workers run SCMLEnv in their own processes with a copy of the actors(p_func) of all trainers,
+    the transitions are sent to the learner(MADDPGModel) in chunks, the learner updates the trainers
+    continuously and broadcasts the weights of the actors periodically.
+'''
+import logging
+import multiprocessing
+import queue
+from typing import Callable, List, Optional
+
+import gym
+import numpy as np
+
+__all__ = [
+    "AsyncRollouts",
+    "is_stale",
+]
+
+
+def is_stale(version: int, train_step: int, max_staleness: Optional[int]) -> bool:
+    '''
+    whether a transition produced by the weights of version is too old at train_step and dropped by the learner
+
+    Args:
+        version: version of the weights tagged on the transition
+        train_step: current training step of the learner
+        max_staleness: max number of training steps between version and train_step, None means never stale
+    '''
+    return max_staleness is not None and train_step - version > max_staleness
+
+
+def _rollout_worker(
+        worker_id: int,
+        env_fn: Callable,
+        actor_specs: List,
+        num_units: int,
+        max_episode_len: Optional[int],
+        chunk_size: int,
+        weight_queue,
+        transition_queue,
+        stop_event,
+):
+    '''
+        Runs a SCMLEnv with the actors received from the learner,
+        every transition is tagged with the version of the weights which produced it.
+    '''
+    import tensorflow.compat.v1 as tf
+    import drl_negotiation.utils as U
+    from drl_negotiation.a2c.trainer import p_predict
+    from drl_negotiation.a2c.policy import mlp_model
+
+    env = env_fn()
+
+    # the same scopes as the trainers, the names of variables are the same as in the learner
+    graph = tf.Graph()
+    with graph.as_default():
+        actors = []
+        for name, obs_shape, act_space in actor_specs:
+            obs_ph = U.BatchInput(obs_shape, name="observation").get()
+            act, _ = p_predict(obs_ph, act_space, mlp_model, num_units=num_units, scope=name)
+            actors.append(act)
+        variables = {var.name: var for var in tf.global_variables()}
+        sess = U.make_session(num_cpu=1, graph=graph)
+
+    def receive_weights(block):
+        weights = None
+        try:
+            while weights is None and block and not stop_event.is_set():
+                try:
+                    weights = weight_queue.get(timeout=1.0)
+                except queue.Empty:
+                    pass
+            # only the latest weights are used
+            while True:
+                weights = weight_queue.get_nowait()
+        except queue.Empty:
+            pass
+        return weights
+
+    def send(chunk):
+        while not stop_event.is_set():
+            try:
+                transition_queue.put((worker_id, chunk), timeout=1.0)
+                return
+            except queue.Full:
+                pass
+
+    version = None
+    chunk = []
+    try:
+        with sess.as_default():
+            obs_n = env.reset()
+            episode_step = 0
+            while not stop_event.is_set():
+                weights = receive_weights(block=version is None)
+                if weights is not None:
+                    version, values = weights
+                    for name, value in values.items():
+                        variables[name].load(value, sess)
+                if version is None:
+                    break
+
+                action_n = [act(np.asarray(obs)[None])[0] for act, obs in zip(actors, obs_n)]
+                for i, space in enumerate(env.action_space):
+                    if isinstance(space, gym.spaces.Box):
+                        action_n[i] = np.clip(action_n[i], space.low, space.high)
+
+                new_obs_n, rew_n, done_n, info_n = env.step(action_n)
+                episode_step += 1
+                terminal = max_episode_len is not None and episode_step > max_episode_len
+                episode_end = all(done_n) or terminal
+
+                chunk.append((obs_n, action_n, rew_n, new_obs_n, done_n, terminal, episode_end, version))
+                obs_n = new_obs_n
+
+                if episode_end:
+                    obs_n = env.reset()
+                    episode_step = 0
+
+                if len(chunk) >= chunk_size or episode_end:
+                    send(chunk)
+                    chunk = []
+    except KeyboardInterrupt:
+        print(f"Rollout worker {worker_id}: got KeyboardInterrupt")
+    finally:
+        sess.close()
+        env.close()
+
+
+class AsyncRollouts:
+    '''
+    Rollout workers of the asynchronous actor/learner training, used by MADDPGModel.learn.
+
+    The learner
+        broadcasts the weights of the actors with broadcast(version), the version is the training step,
+        receives the transitions of all workers with receive(timeout),
+            every record is (worker_id, (obs_n, act_n, rew_n, obs_next_n, done_n, terminal, episode_end, version)).
+
+    The weight queue of a worker only keeps a few versions, workers always use the latest weights they received.
+    The transition queue is bounded, workers wait if the learner falls behind.
+
+    Example:
+        >>> rollouts = AsyncRollouts([functools.partial(make_env, "scml")] * 4, trainers, obs_shape_n, env.action_space)
+        >>> rollouts.broadcast(0)
+        >>> records = rollouts.receive(timeout=1.0)
+    '''
+    def __init__(
+            self,
+            env_fns: List[Callable],
+            trainers: List,
+            obs_shape_n: List,
+            act_space_n: List,
+            num_units: int = 64,
+            max_episode_len: Optional[int] = None,
+            chunk_size: int = 32,
+            max_queue_size: int = 64,
+            start_method: Optional[str] = None,
+    ):
+        """
+
+        Args:
+            env_fns: functions which create SCMLEnv, must be picklable, e.g. functools.partial(make_env, "scml")
+            trainers: MADDPGAgentTrainer of the learner
+            obs_shape_n: shapes of observations of all agents, the same as passed to get_trainers
+            act_space_n: action spaces of all agents
+            num_units: number of units of mlp_model
+            max_episode_len: workers reset the env after max_episode_len steps, None means only reset when done
+            chunk_size: number of transitions sent together
+            max_queue_size: max number of chunks in the transition queue
+            start_method: start method of multiprocessing, default is forkserver if available, otherwise spawn
+        """
+        self.num_workers = len(env_fns)
+        self.closed = False
+        self.version = None
+
+        # actor of every trainer, observation and action space of its agent
+        actor_specs = [
+            (trainer.name, obs_shape_n[trainer.agent_index], act_space_n[trainer.agent_index])
+            for trainer in trainers
+        ]
+        self._variables = [var for trainer in trainers for var in trainer.p_debug["p_func_vars"]]
+
+        if start_method is None:
+            # fork is not safe after tensorflow session created
+            forkserver_available = "forkserver" in multiprocessing.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = multiprocessing.get_context(start_method)
+
+        self.stop_event = ctx.Event()
+        self.transition_queue = ctx.Queue(maxsize=max_queue_size)
+        self.weight_queues = [ctx.Queue(maxsize=2) for _ in range(self.num_workers)]
+        self.processes = []
+        for worker_id, (env_fn, weight_queue) in enumerate(zip(env_fns, self.weight_queues)):
+            args = (worker_id, env_fn, actor_specs, num_units, max_episode_len, chunk_size,
+                    weight_queue, self.transition_queue, self.stop_event)
+            process = ctx.Process(target=_rollout_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+
+    def broadcast(self, version: int):
+        '''
+        sends the current weights of all actors to the workers, must be called in the session of the learner
+        '''
+        import drl_negotiation.utils as U
+
+        values = U.get_session().run(self._variables)
+        weights = (version, {var.name: value for var, value in zip(self._variables, values)})
+        for weight_queue in self.weight_queues:
+            try:
+                weight_queue.put_nowait(weights)
+            except queue.Full:
+                # the worker has not consumed the older versions yet, it gets the next broadcast
+                logging.debug(f"weight queue is full, skip the version {version}")
+        self.version = version
+
+    def receive(self, timeout: Optional[float] = None) -> List:
+        '''
+        Args:
+            timeout: seconds to wait for the first chunk, 0 means not wait
+
+        Returns:
+            all records available now
+        '''
+        chunks = []
+        try:
+            if timeout is None or timeout > 0:
+                chunks.append(self.transition_queue.get(timeout=timeout))
+            while True:
+                chunks.append(self.transition_queue.get_nowait())
+        except queue.Empty:
+            pass
+        return [(worker_id, record) for worker_id, chunk in chunks for record in chunk]
+
+    def close(self):
+        if self.closed:
+            return
+        self.stop_event.set()
+        # unblock the workers which wait for putting transitions
+        self.receive(timeout=0)
+        for process in self.processes:
+            process.join(timeout=5.0)
+            if process.is_alive():
+                process.terminate()
+        self.closed = True
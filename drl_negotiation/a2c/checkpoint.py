@@ -0,0 +1,270 @@
+'''
+    Background checkpoint writer of MADDPG.
+
+    The training loop only takes a snapshot of the values of variables(one session run, in memory),
+    the checkpoints are written by a background thread, from a side graph which holds a copy of the variables.
+    The checkpoints have the same variable names as the training graph, loaded by tf.train.Saver as before.
+
+    Layout of the checkpoint directory:
+        model_name-<step>.*     one checkpoint of all variables, rotated
+        model_name.meta         meta graph of the training graph
+        checkpoint_index.json   actors of all trainers in the checkpoint, by agent and role(seller/buyer),
+                                a single policy is loaded with policy_saver, only its own variables are restored
+'''
+import json
+import logging
+import os
+import queue
+import threading
+from typing import Dict, List, Optional
+
+__all__ = [
+    "CHECKPOINT_INDEX",
+    "CheckpointWriter",
+    "write_checkpoint_index",
+    "read_checkpoint_index",
+    "policy_saver",
+]
+
+CHECKPOINT_INDEX = "checkpoint_index.json"
+
+
+def write_checkpoint_index(save_dir: str, model_name: str, trainers: List):
+    '''
+    writes the index of the actors of all trainers, the layout of the checkpoint is static during training
+
+    Example of the index:
+        {
+            "model_name": "model",
+            "agents": {"02Dec-0": {"seller": "02Dec-0_seller", "buyer": "02Dec-0_buyer"}},
+            "policies": {"02Dec-0_seller": {"agent": "02Dec-0", "role": "seller", "agent_index": 0,
+                                            "variables": {"02Dec-0_seller/p_func/dense/kernel": [30, 64], ...}}}
+        }
+    '''
+    index = {"model_name": model_name, "agents": {}, "policies": {}}
+    for trainer in trainers:
+        agent, _, role = trainer.name.rpartition("_")
+        index["agents"].setdefault(agent, {})[role] = trainer.name
+        index["policies"][trainer.name] = {
+            "agent": agent,
+            "role": role,
+            "agent_index": trainer.agent_index,
+            "variables": {var.op.name: var.get_shape().as_list() for var in trainer.p_debug["p_func_vars"]},
+        }
+
+    os.makedirs(save_dir, exist_ok=True)
+    with open(os.path.join(save_dir, CHECKPOINT_INDEX), "w") as fp:
+        json.dump(index, fp, indent=2)
+    return index
+
+
+def read_checkpoint_index(save_dir: str) -> Optional[Dict]:
+    '''
+    Returns:
+        the index of the checkpoint directory, None if the directory has no index(per scope layout)
+    '''
+    try:
+        with open(os.path.join(save_dir, CHECKPOINT_INDEX)) as fp:
+            return json.load(fp)
+    except FileNotFoundError:
+        return None
+
+
+def policy_saver(scope: str, variables: List, index: Dict):
+    '''
+    saver which restores a single policy from the consolidated checkpoint, build it once and reuse it
+
+    Args:
+        scope: name of the trainer, e.g. 02Dec-0_seller
+        variables: variables of the actor, e.g. returned by create_actor, the same names as in the training graph
+        index: read_checkpoint_index of the checkpoint directory
+    '''
+    import tensorflow.compat.v1 as tf
+
+    if scope not in index["policies"]:
+        raise KeyError(f"Error, policy {scope} is not in the checkpoint {index['model_name']}!")
+
+    expected = index["policies"][scope]["variables"]
+    var_list = {var.op.name: var for var in variables}
+    missing = set(expected) - set(var_list)
+    if missing:
+        raise ValueError(f"Error, variables {sorted(missing)} of policy {scope} are not created!")
+    for name, shape in expected.items():
+        if var_list[name].get_shape().as_list() != shape:
+            raise ValueError(f"Error, shape of {name} is {var_list[name].get_shape().as_list()}, "
+                             f"but {shape} in the checkpoint!")
+
+    return tf.train.Saver({name: var_list[name] for name in expected})
+
+
+class CheckpointWriter:
+    '''
+    Writes the checkpoint of all variables in the background.
+
+    The queue of pending snapshots is bounded by max_pending, if the writer falls behind,
+    the oldest pending snapshot is dropped, save never blocks the training loop.
+    Old checkpoints are rotated, only the last max_to_keep checkpoints are kept.
+
+    Example:
+        >>> writer = CheckpointWriter(tf.global_variables(), save_dir, model_name)
+        >>> writer.save(train_step)
+        >>> writer.close()
+    '''
+    def __init__(
+            self,
+            variables: List,
+            save_dir: str,
+            model_name: str,
+            max_to_keep: int = 5,
+            max_pending: int = 2,
+            actors: Optional[Dict[str, Dict]] = None,
+    ):
+        """
+
+        Args:
+            variables: variables of the checkpoint, save_dir + model_name
+            save_dir: directory of checkpoints
+            model_name: name of checkpoints
+            max_to_keep: number of checkpoints kept
+            max_pending: max number of snapshots waiting for writing
+            actors: actor_spec of trainers by scope, exported to save_dir + ACTORS_FILE for NumpyActor,
+                    None means not exported
+        """
+        self.save_dir = save_dir
+        self.model_name = model_name
+        self.max_to_keep = max_to_keep
+        self.variables = list(variables)
+        self.actors = actors
+
+        self.closed = False
+        self.n_written = 0
+        self.n_dropped = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+
+    def snapshot(self) -> Dict:
+        '''
+        values of all variables, must be called in the session of the training graph
+        '''
+        import drl_negotiation.utils as U
+
+        values = U.get_session().run(self.variables)
+        return {var.op.name: value for var, value in zip(self.variables, values)}
+
+    def save(self, step: int):
+        '''
+        takes a snapshot now and writes it in the background
+        '''
+        assert not self.closed, "Error, the checkpoint writer is closed!"
+        item = (step, self.snapshot())
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    dropped_step, _ = self._queue.get_nowait()
+                    self._queue.task_done()
+                    self.n_dropped += 1
+                    logging.debug(f"checkpoint writer falls behind, drop the snapshot of step {dropped_step}")
+                except queue.Empty:
+                    pass
+
+    def flush(self):
+        '''
+        waits until all pending snapshots are written
+        '''
+        self._queue.join()
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self._queue.put(None)
+        self._thread.join()
+        self.closed = True
+
+    ####################################################################################################
+    # background thread
+    ####################################################################################################
+
+    def _build(self, graph):
+        '''
+        side graph, a copy of the variables, their assign ops and the saver
+        '''
+        import tensorflow.compat.v1 as tf
+
+        with graph.as_default():
+            self._side_vars = {}
+            self._assign = {}
+            for var in self.variables:
+                name = var.op.name
+                dtype = var.dtype.base_dtype
+                shape = var.get_shape()
+                side_var = tf.Variable(tf.zeros(shape, dtype=dtype), trainable=False, name="side")
+                ph = tf.placeholder(dtype, shape)
+                self._side_vars[name] = side_var
+                self._assign[name] = (side_var.assign(ph), ph)
+
+            # the keys are the names of the variables in the training graph
+            self._saver = tf.train.Saver(self._side_vars, max_to_keep=self.max_to_keep)
+
+    def _write(self, sess, step, values):
+        ops, feed_dict = [], {}
+        for name, value in values.items():
+            op, ph = self._assign[name]
+            ops.append(op)
+            feed_dict[ph] = value
+        sess.run(ops, feed_dict=feed_dict)
+
+        path = self.save_dir + self.model_name
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # the meta graph of the side graph is useless, the training graph exports its own
+        self._saver.save(sess, path, global_step=step, write_meta_graph=False)
+
+        if self.actors:
+            from drl_negotiation.a2c.numpy_actor import ACTORS_FILE, save_actors
+            save_actors(self.save_dir + ACTORS_FILE, {
+                scope: {"weights": [(name, values[name]) for name in spec["variables"]],
+                        "distribution": spec["distribution"], "size": spec["size"]}
+                for scope, spec in self.actors.items()
+            })
+
+    def _run(self):
+        import tensorflow.compat.v1 as tf
+        import drl_negotiation.utils as U
+
+        sess = None
+        try:
+            graph = tf.Graph()
+            self._build(graph)
+            sess = U.make_session(num_cpu=1, graph=graph)
+        except Exception as e:
+            # pending snapshots are still consumed, flush and close never hang
+            self.error = e
+            logging.error(f"Error when building the graph of the checkpoint writer: {e}")
+
+        try:
+            while True:
+                item = self._queue.get()
+                if item is None:
+                    self._queue.task_done()
+                    break
+                step, values = item
+                if sess is None:
+                    self._queue.task_done()
+                    continue
+                try:
+                    self._write(sess, step, values)
+                    self.n_written += 1
+                except Exception as e:
+                    # training goes on, the next snapshot is written again
+                    self.error = e
+                    logging.error(f"Error when writing the checkpoint of step {step}: {e}")
+                finally:
+                    self._queue.task_done()
+        finally:
+            if sess is not None:
+                sess.close()
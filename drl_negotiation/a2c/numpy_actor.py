@@ -0,0 +1,198 @@
+'''
+    Pure NumPy inference of the actors(p_func) of trained MADDPG trainers.
+
+    The weights of the dense layers of every actor and the type of its action distribution
+    are exported to a single .npz file, NumpyActor reproduces p_predict/create_actor without tensorflow.
+
+    Layout of the .npz file, for every scope(name of the trainer, e.g. 02Dec-0_seller):
+        <scope>/distribution    soft_categorical or diag_gaussian
+        <scope>/size            number of categories or dimensions of the action
+        <scope>/<i>/kernel      kernel of the i-th dense layer, (n_inputs, n_outputs)
+        <scope>/<i>/bias        bias of the i-th dense layer, (n_outputs, )
+'''
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+__all__ = [
+    "ACTORS_FILE",
+    "NumpyActor",
+    "actor_spec",
+    "save_actors",
+    "export_actors",
+    "load_actors",
+]
+
+ACTORS_FILE = "actors.npz"
+
+
+def _distribution(act_space) -> Tuple[str, int]:
+    '''
+    the same distributions as make_pd_type
+    '''
+    from gym import spaces
+
+    if isinstance(act_space, spaces.Box):
+        assert len(act_space.shape) == 1, "Error: the action space must be a vector"
+        return "diag_gaussian", int(act_space.shape[0])
+    if isinstance(act_space, spaces.Discrete):
+        return "soft_categorical", int(act_space.n)
+    raise NotImplementedError(f"Error: NumpyActor is not implemented for action space of type {type(act_space)}, "
+                              f"must be of type Gym Spaces: Box or Discrete.")
+
+
+def actor_spec(trainer) -> Dict:
+    '''
+    names of the variables of the actor and its distribution, values are not included
+
+    Returns:
+        {"variables": [names of p_func_vars], "distribution": str, "size": int}
+    '''
+    distribution, size = _distribution(trainer.act_space)
+    return {
+        "variables": [var.op.name for var in trainer.p_debug["p_func_vars"]],
+        "distribution": distribution,
+        "size": size,
+    }
+
+
+def _layers(weights: List[Tuple[str, np.ndarray]]) -> List[Tuple[np.ndarray, np.ndarray]]:
+    '''
+    pairs the kernel and bias of every dense layer, in the order of creation
+    '''
+    layers = OrderedDict()
+    for name, value in weights:
+        layer, _, kind = name.rpartition("/")
+        if kind not in ("kernel", "bias"):
+            raise ValueError(f"Error, {name} is not a variable of a dense layer!")
+        layers.setdefault(layer, {})[kind] = value
+    return [(layer["kernel"], layer["bias"]) for layer in layers.values()]
+
+
+def save_actors(file_name: str, actors: Dict[str, Dict]):
+    '''
+    Args:
+        file_name: path of the .npz file, replaced atomically
+        actors: {scope: {"weights": [(name, value)], "distribution": str, "size": int}}
+    '''
+    arrays = {}
+    for scope, actor in actors.items():
+        arrays[f"{scope}/distribution"] = np.array(actor["distribution"])
+        arrays[f"{scope}/size"] = np.array(actor["size"])
+        for i, (kernel, bias) in enumerate(_layers(actor["weights"])):
+            arrays[f"{scope}/{i}/kernel"] = np.asarray(kernel, dtype=np.float32)
+            arrays[f"{scope}/{i}/bias"] = np.asarray(bias, dtype=np.float32)
+
+    os.makedirs(os.path.dirname(file_name) or ".", exist_ok=True)
+    tmp_file_name = file_name + ".tmp.npz"
+    np.savez(tmp_file_name, **arrays)
+    os.replace(tmp_file_name, file_name)
+
+
+def export_actors(trainers: List, file_name: str):
+    '''
+    exports the actors of trainers, must be called in the session of the training graph
+    '''
+    import drl_negotiation.utils as U
+
+    variables = [trainer.p_debug["p_func_vars"] for trainer in trainers]
+    values = U.get_session().run(variables)
+    actors = {}
+    for trainer, _vars, _values in zip(trainers, variables, values):
+        spec = actor_spec(trainer)
+        actors[trainer.name] = {
+            "weights": [(var.op.name, value) for var, value in zip(_vars, _values)],
+            "distribution": spec["distribution"],
+            "size": spec["size"],
+        }
+    save_actors(file_name, actors)
+
+
+def load_actors(file_name: str, seed: Optional[int] = None) -> Dict[str, "NumpyActor"]:
+    '''
+    Returns:
+        NumpyActor of every scope in the file
+    '''
+    with np.load(file_name) as data:
+        arrays = {key: data[key] for key in data.files}
+
+    scopes = [key[:-len("/distribution")] for key in arrays if key.endswith("/distribution")]
+    actors = {}
+    for scope in scopes:
+        layers = []
+        while f"{scope}/{len(layers)}/kernel" in arrays:
+            i = len(layers)
+            layers.append((arrays[f"{scope}/{i}/kernel"], arrays[f"{scope}/{i}/bias"]))
+        actors[scope] = NumpyActor(layers, str(arrays[f"{scope}/distribution"]), int(arrays[f"{scope}/size"]),
+                                   seed=seed)
+    return actors
+
+
+class NumpyActor:
+    '''
+    NumPy version of the actor built by p_predict with mlp_model,
+    dense layers with relu activations except the last one, the output is sampled from the distribution.
+
+    Example:
+        >>> actors = load_actors(save_dir + ACTORS_FILE)
+        >>> act = actors["02Dec-0_seller"](obs[None])
+    '''
+    def __init__(self, layers: List[Tuple[np.ndarray, np.ndarray]], distribution: str, size: int,
+                 seed: Optional[int] = None):
+        """
+
+        Args:
+            layers: (kernel, bias) of every dense layer
+            distribution: soft_categorical or diag_gaussian
+            size: number of categories or dimensions of the action
+            seed: seed of the noise of sampling
+        """
+        if distribution not in ("soft_categorical", "diag_gaussian"):
+            raise NotImplementedError(f"Error: distribution {distribution} is not implemented in NumpyActor!")
+        self.layers = [(np.array(kernel, dtype=np.float32), np.array(bias, dtype=np.float32))
+                       for kernel, bias in layers]
+        # shared by all agents which use the policy, see PolicyRegistry
+        for kernel, bias in self.layers:
+            kernel.flags.writeable = False
+            bias.flags.writeable = False
+        self.distribution = distribution
+        self.size = size
+        self.rng = np.random.RandomState(seed)
+
+    def p_values(self, obs: np.ndarray) -> np.ndarray:
+        '''
+        output of p_func, the flat parameters of the distribution
+        '''
+        out = np.asarray(obs, dtype=np.float32)
+        for i, (kernel, bias) in enumerate(self.layers):
+            out = out @ kernel + bias
+            if i < len(self.layers) - 1:
+                out = np.maximum(out, 0)
+        return out
+
+    def mode(self, obs: np.ndarray) -> np.ndarray:
+        p = self.p_values(obs)
+        if self.distribution == "soft_categorical":
+            return self._softmax(p)
+        return p[..., :self.size]
+
+    def __call__(self, obs: np.ndarray) -> np.ndarray:
+        '''
+        sampled actions of a batch of observations, the same as act of p_predict
+        '''
+        p = self.p_values(obs)
+        if self.distribution == "soft_categorical":
+            # gumbel-softmax, as SoftCategoricalProbabilityDistribution.sample
+            u = self.rng.uniform(np.finfo(np.float32).tiny, 1.0, size=p.shape).astype(np.float32)
+            return self._softmax(p - np.log(-np.log(u)))
+
+        mean, logstd = p[..., :self.size], p[..., self.size:]
+        return mean + np.exp(logstd) * self.rng.standard_normal(mean.shape).astype(np.float32)
+
+    @staticmethod
+    def _softmax(x):
+        x = x - np.max(x, axis=-1, keepdims=True)
+        e = np.exp(x)
+        return e / np.sum(e, axis=-1, keepdims=True)
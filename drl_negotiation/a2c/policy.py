@@ -115,10 +115,14 @@ def mlp_model(input, num_outputs, scope, reuse=False, num_units=64, rnn_cell=Non
 from drl_negotiation.a2c.trainer import p_predict
 
 def create_actor(make_obs_ph, act_space, scope):
+    """
+    Returns:
+        act, variables of the actor, loaded by their names from the checkpoint
+    """
     p_func = mlp_model
-    act = p_predict(make_obs_ph=make_obs_ph,
+    act, p_debug = p_predict(make_obs_ph=make_obs_ph,
                     act_space=act_space,
                     p_func=p_func,
                     scope=scope,
                     )
-    return act
+    return act, p_debug["p_func_vars"]
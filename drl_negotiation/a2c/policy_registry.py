@@ -0,0 +1,175 @@
+'''
+    Process-wide registry of trained policies.
+
+    All MyNegotiationManager of a process share the actors, every policy is keyed by (model path, scope)
+    and loaded once, no matter how many agents use it. The least recently used policies are evicted
+    when the registry is full, an evicted actor lives on as long as an agent still holds it.
+
+    Actors are NumpyActor if the weights are exported(actors.npz), otherwise TFActor,
+    the actor of create_actor in its own graph and session, restored from the checkpoint once.
+'''
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+__all__ = [
+    "TFActor",
+    "PolicyRegistry",
+    "get_registry",
+]
+
+
+class TFActor:
+    '''
+    actor built by create_actor in its own graph, restored from the checkpoint at model_path
+    '''
+    def __init__(self, model_path: str, scope: str, obs_shape: Tuple, act_space, checkpoint_index: Optional[Dict] = None):
+        """
+
+        Args:
+            model_path: directory of the checkpoint
+            scope: name of the trainer, e.g. 02Dec-0_seller
+            obs_shape: shape of the observation of the policy
+            act_space: action space of the policy
+            checkpoint_index: read_checkpoint_index of model_path, None means one checkpoint per scope
+        """
+        import tensorflow.compat.v1 as tf
+        import drl_negotiation.utils as U
+        from drl_negotiation.a2c.policy import create_actor
+        from drl_negotiation.a2c.checkpoint import policy_saver
+        from drl_negotiation.hyperparameters import NUM_CPU, INTRA_OP_THREADS, INTER_OP_THREADS
+
+        self.scope = scope
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            obs_ph = U.BatchInput(obs_shape, name="observation").get()
+            self._act, p_func_vars = create_actor(make_obs_ph=obs_ph, act_space=act_space, scope=scope)
+            self.sess = U.make_session(num_cpu=NUM_CPU, intra_op_threads=INTRA_OP_THREADS,
+                                       inter_op_threads=INTER_OP_THREADS, graph=self.graph)
+            if checkpoint_index is not None:
+                # consolidated checkpoint, only the variables of this policy are restored
+                saver = policy_saver(scope, p_func_vars, checkpoint_index)
+                saver.restore(self.sess, tf.train.latest_checkpoint(model_path))
+            else:
+                saver = tf.train.Saver(p_func_vars)
+                saver.restore(self.sess, tf.train.latest_checkpoint(model_path + scope))
+            self.graph.finalize()
+
+    def __call__(self, obs):
+        with self.sess.as_default():
+            return self._act(obs)
+
+
+class PolicyRegistry:
+    '''
+    LRU cache of actors keyed by (model path, scope), thread safe.
+
+    Example:
+        >>> registry = get_registry()
+        >>> act = registry.actor("/tmp/policy2/", "02Dec-0_seller", obs_shape, act_space)
+        >>> act(obs[None])
+    '''
+    def __init__(self, max_size: int = 32):
+        """
+
+        Args:
+            max_size: max number of cached actors
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._policies = OrderedDict()
+        # sub directories and checkpoint index of every policy directory
+        self._dirs = {}
+        # exported actors(actors.npz) of every policy directory, None if not exported
+        self._exported = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._policies)
+
+    def __contains__(self, key):
+        return key in self._policies
+
+    def get(self, key: Hashable, load: Callable):
+        '''
+        Args:
+            key: key of the policy
+            load: loads the policy if it is not cached
+
+        Returns:
+            the cached policy
+        '''
+        with self._lock:
+            if key in self._policies:
+                self.hits += 1
+                self._policies.move_to_end(key)
+                return self._policies[key]
+
+            self.misses += 1
+            policy = load()
+            self._policies[key] = policy
+            while len(self._policies) > self.max_size:
+                self._policies.popitem(last=False)
+            return policy
+
+    def policy_dir(self, path: str) -> Tuple[List[str], Optional[Dict]]:
+        '''
+        Returns:
+            sub directories(checkpoints per scope) and checkpoint index of the policy directory, scanned once
+        '''
+        import drl_negotiation.utils as U
+        from drl_negotiation.a2c.checkpoint import read_checkpoint_index
+
+        with self._lock:
+            if path not in self._dirs:
+                self._dirs[path] = (U.traversal_dir_first_dir(path), read_checkpoint_index(path))
+            return self._dirs[path]
+
+    def exported_actors(self, path: str) -> Optional[Dict]:
+        '''
+        Returns:
+            NumpyActor of every scope exported to the policy directory, loaded once, None if not exported
+        '''
+        from drl_negotiation.a2c.numpy_actor import ACTORS_FILE, load_actors
+
+        with self._lock:
+            if path not in self._exported:
+                actors_file = path + ACTORS_FILE
+                self._exported[path] = load_actors(actors_file) if os.path.exists(actors_file) else None
+            return self._exported[path]
+
+    def actor(self, model_path: str, scope: str, obs_shape: Tuple, act_space):
+        '''
+        shared actor of the policy, NumpyActor if its weights are exported, otherwise TFActor
+        '''
+        return self.get((model_path, scope), lambda: self._load(model_path, scope, obs_shape, act_space))
+
+    def _load(self, model_path, scope, obs_shape, act_space):
+        actors = self.exported_actors(model_path)
+        if actors and scope in actors:
+            return actors[scope]
+        return TFActor(model_path, scope, obs_shape, act_space, checkpoint_index=self.policy_dir(model_path)[1])
+
+    def clear(self):
+        with self._lock:
+            self._policies.clear()
+            self._dirs.clear()
+            self._exported.clear()
+
+
+_REGISTRY = None
+_REGISTRY_LOCK = threading.Lock()
+
+
+def get_registry() -> PolicyRegistry:
+    '''
+    the registry of this process, created at the first call
+    '''
+    global _REGISTRY
+    with _REGISTRY_LOCK:
+        if _REGISTRY is None:
+            from drl_negotiation.hyperparameters import POLICY_CACHE_SIZE
+            _REGISTRY = PolicyRegistry(max_size=POLICY_CACHE_SIZE)
+        return _REGISTRY
@@ -1,57 +1,490 @@
-import numpy as np 
-import random 
+import json
+import os
+
+import numpy as np
 
 class ReplayBuffer(object):
 
+    # names of the columns, the same order as returned by sample
+    _columns = ("obs", "act", "rew", "obs_next", "done")
+
     def __init__(self, size):
         """
-        prioritized replay buffer
-        """
+        replay buffer, a ring buffer with preallocated numpy columns,
+        the columns are allocated when the first transition is added,
+        since the shape of observation and action is only known then.
 
-        self._storage = []
+        Args:
+            size: max number of transitions, the oldest transitions are overwritten
+        """
         self._maxsize = int(size)
+        self._storage = None
         self._next_idx = 0
+        self._size = 0
 
     def __len__(self):
-        return len(self._storage)
+        return self._size
 
     def clear(self):
-        self._storage = []
         self._next_idx = 0
+        self._size = 0
+
+    def _allocate(self, name, shape, dtype):
+        '''
+        allocate one column of the buffer, (maxsize, *shape)
+        '''
+        return np.zeros((self._maxsize, ) + tuple(shape), dtype=dtype)
+
+    def _storage_columns(self):
+        '''
+        allocated columns by name
+        '''
+        return self._storage
+
+    def _dump_layout(self):
+        return None
+
+    def _restore_storage(self, columns, layout):
+        self._storage = columns
+
+    def _transition_shapes(self, obs_t, action, reward, obs_tp1, done):
+        '''
+        Returns:
+            shapes of the columns of a transition(without the first axis) and the layout of a row, None here
+        '''
+        shapes = {name: np.shape(value) for name, value in zip(self._columns, (obs_t, action, reward, obs_tp1, done))}
+        return shapes, None
+
+    def _init_storage(self, obs_t, action, reward, obs_tp1, done):
+        shapes, _ = self._transition_shapes(obs_t, action, reward, obs_tp1, done)
+        self._storage = {name: self._allocate(name, shape, np.float32) for name, shape in shapes.items()}
 
     def add(self, obs_t, action, reward, obs_tp1, done):
-        data = (obs_t, action, reward, obs_tp1, done)
-        
-        if self._next_idx >=len(self._storage):
-            self._storage.append(data)
-        else:
-            self._storage[self._next_idx] = data
+        if self._storage is None:
+            self._init_storage(obs_t, action, reward, obs_tp1, done)
+
+        idx = self._next_idx
+        for name, value in zip(self._columns, (obs_t, action, reward, obs_tp1, done)):
+            self._storage[name][idx] = value
+
         self._next_idx = (self._next_idx + 1) % self._maxsize
+        self._size = min(self._size + 1, self._maxsize)
 
     def make_index(self, batch_size):
-        return [random.randint(0, len(self._storage) -1) for _ in range(batch_size)]
-    
+        return np.random.randint(0, self._size, size=batch_size)
+
     def sample_index(self, idx):
         return self._encode_sample(idx)
-    
+
     def sample(self, batch_size):
         if batch_size >0:
             idxes = self.make_index(batch_size)
         else:
-            idxes = range(0, len(self._storage))
+            idxes = np.arange(0, self._size)
         return self._encode_sample(idxes)
 
     def collect(self):
         return self.sample(-1)
 
     def _encode_sample(self, idxes):
-        obses_t, actions, rewards, obses_tp1, dones = [], [], [], [], []
-        for i in idxes:
-            data = self._storage[i]
-            obs_t, action, reward, obs_tp1, done = data
-            obses_t.append(np.array(obs_t, copy=False))
-            actions.append(np.array(action, copy=False))
-            rewards.append(reward)
-            obses_tp1.append(np.array(obs_tp1, copy=False))
-            dones.append(done)
-        return np.array(obses_t), np.array(actions), np.array(rewards), np.array(obses_tp1), np.array(dones)
+        idxes = np.asarray(idxes, dtype=np.int64)
+        if self._storage is None:
+            return tuple(np.array([]) for _ in self._columns)
+        return tuple(self._storage[name][idxes] for name in self._columns)
+
+
+class JointReplayBuffer(ReplayBuffer):
+
+    def __init__(self, size, n_agents):
+        """
+        joint replay buffer, shared by all trainers of MADDPG,
+        one row holds the transition of all agents at a timestep,
+        obs_0, ..., obs_n-1, act_0, ..., act_n-1, rew_0, ..., rew_n-1, obs_next_0, ..., obs_next_n-1, done_0, ..., done_n-1
+
+        sample_index gathers all agents' columns with a single fancy index.
+
+        Args:
+            size: max number of timesteps
+            n_agents: number of agents(trainers)
+        """
+        super().__init__(size)
+        self.n_agents = n_agents
+        # name -> (start, end, shape) of every field in the row
+        self._layout = None
+
+    def _transition_shapes(self, obs_n, act_n, rew_n, obs_next_n, done_n):
+        assert len(obs_n) == self.n_agents, "Error, length of obs_n is not same as the number of agents!"
+        layout = {}
+        start = 0
+        for name, values in zip(self._columns, (obs_n, act_n, rew_n, obs_next_n, done_n)):
+            for i, value in enumerate(values):
+                shape = np.shape(value)
+                end = start + int(np.prod(shape))
+                layout[(name, i)] = (start, end, shape)
+                start = end
+        return {"joint": (start, )}, layout
+
+    def _init_storage(self, obs_n, act_n, rew_n, obs_next_n, done_n):
+        shapes, self._layout = self._transition_shapes(obs_n, act_n, rew_n, obs_next_n, done_n)
+        self._storage = self._allocate("joint", shapes["joint"], np.float32)
+
+    def _storage_columns(self):
+        return {"joint": self._storage}
+
+    def _dump_layout(self):
+        return [[name, i, start, end, list(shape)] for (name, i), (start, end, shape) in self._layout.items()]
+
+    def _restore_storage(self, columns, layout):
+        self._storage = columns["joint"]
+        self._layout = {(name, i): (start, end, tuple(shape)) for name, i, start, end, shape in layout}
+
+    def add(self, obs_n, act_n, rew_n, obs_next_n, done_n):
+        '''
+        add the transition of all agents at a timestep
+        '''
+        if self._storage is None:
+            self._init_storage(obs_n, act_n, rew_n, obs_next_n, done_n)
+
+        row = self._storage[self._next_idx]
+        for name, values in zip(self._columns, (obs_n, act_n, rew_n, obs_next_n, done_n)):
+            for i, value in enumerate(values):
+                start, end, _ = self._layout[(name, i)]
+                row[start:end] = np.ravel(value)
+
+        self._next_idx = (self._next_idx + 1) % self._maxsize
+        self._size = min(self._size + 1, self._maxsize)
+
+    def _encode_sample(self, idxes):
+        '''
+        Returns:
+            obs_n, act_n: list of (batch_size, dim) per agent
+            rew, done: (batch_size, n_agents)
+            obs_next_n: list of (batch_size, dim) per agent
+        '''
+        idxes = np.asarray(idxes, dtype=np.int64)
+        if self._storage is None:
+            return [], [], np.array([]), [], np.array([])
+        rows = self._storage[idxes]
+
+        def field(name, i):
+            start, end, shape = self._layout[(name, i)]
+            return rows[:, start:end].reshape((len(idxes), ) + tuple(shape))
+
+        agents = range(self.n_agents)
+        return (
+            [field("obs", i) for i in agents],
+            [field("act", i) for i in agents],
+            np.stack([field("rew", i) for i in agents], axis=1),
+            [field("obs_next", i) for i in agents],
+            np.stack([field("done", i) for i in agents], axis=1),
+        )
+
+
+class SumTree(object):
+
+    def __init__(self, capacity):
+        """
+        sum tree, every parent node is the sum of its two children,
+        the leaves are the priorities of transitions.
+        update and sampling(find_prefixsum_idx) are O(log n).
+
+        Args:
+            capacity: number of leaves, rounded up to a power of two
+        """
+        self._capacity = 1
+        while self._capacity < capacity:
+            self._capacity *= 2
+        self._depth = int(np.log2(self._capacity))
+        # node 1 is the root, leaves are in [capacity, 2 * capacity)
+        self._tree = np.zeros(2 * self._capacity, dtype=np.float64)
+
+    def total(self):
+        return self._tree[1]
+
+    def __getitem__(self, idx):
+        return self._tree[np.asarray(idx) + self._capacity]
+
+    def update(self, idx, priorities):
+        '''
+        set the priorities of leaves idx, and the sums of their ancestors
+        '''
+        idx = np.asarray(idx, dtype=np.int64).reshape(-1) + self._capacity
+        self._tree[idx] = priorities
+        for _ in range(self._depth):
+            idx = np.unique(idx // 2)
+            self._tree[idx] = self._tree[2 * idx] + self._tree[2 * idx + 1]
+
+    def find_prefixsum_idx(self, values):
+        '''
+        for every value finds the highest leaf i, such that sum(priorities[:i]) <= value
+        '''
+        values = np.array(values, dtype=np.float64).reshape(-1)
+        idx = np.ones(len(values), dtype=np.int64)
+        for _ in range(self._depth):
+            left = 2 * idx
+            go_right = values > self._tree[left]
+            values -= self._tree[left] * go_right
+            idx = left + go_right
+        return idx - self._capacity
+
+
+class PrioritizedReplayMixIn:
+    """
+        Prioritized experience replay, https://arxiv.org/abs/1511.05952
+        transitions are sampled in proportion to priority ** alpha, the priority is |td error| + epsilon,
+        new transitions get the max priority seen so far.
+
+        A buffer can have several columns of priorities, e.g. JointReplayBuffer owns one column for every agent,
+        since every critic has its own td error.
+    """
+    def _init_priorities(self, n_columns=1, alpha=0.6, epsilon=1e-6):
+        self.alpha = alpha
+        self.epsilon = epsilon
+        self._trees = [SumTree(self._maxsize) for _ in range(n_columns)]
+        self._max_priority = 1.0
+
+    def add(self, *args, **kwargs):
+        idx = self._next_idx
+        super().add(*args, **kwargs)
+        for tree in self._trees:
+            tree.update(idx, self._max_priority ** self.alpha)
+
+    def clear(self):
+        super().clear()
+        self._init_priorities(len(self._trees), self.alpha, self.epsilon)
+
+    def make_index(self, batch_size, column=0):
+        '''
+        stratified sampling, one transition from every segment of the total priority
+        '''
+        tree = self._trees[column]
+        segment = tree.total() / batch_size
+        values = (np.arange(batch_size) + np.random.uniform(size=batch_size)) * segment
+        return np.minimum(tree.find_prefixsum_idx(values), self._size - 1)
+
+    def importance_weights(self, idxes, beta=0.4, column=0):
+        '''
+        importance-sampling weights of the sampled transitions, normalized by the max weight
+        '''
+        tree = self._trees[column]
+        probabilities = tree[idxes] / tree.total()
+        weights = (self._size * probabilities) ** (-beta)
+        return (weights / weights.max()).astype(np.float32)
+
+    def update_priorities(self, idxes, td_errors, column=0):
+        priorities = np.abs(td_errors) + self.epsilon
+        self._max_priority = max(self._max_priority, float(priorities.max()))
+        self._trees[column].update(idxes, priorities ** self.alpha)
+
+
+class PrioritizedReplayBuffer(PrioritizedReplayMixIn, ReplayBuffer):
+
+    def __init__(self, size, alpha=0.6, epsilon=1e-6):
+        """
+        prioritized replay buffer of a single trainer
+
+        Args:
+            size: max number of transitions
+            alpha: how much prioritization is used, 0 means uniform
+            epsilon: added to the |td error|, every transition can be sampled
+        """
+        super().__init__(size)
+        self._init_priorities(1, alpha, epsilon)
+
+
+class PrioritizedJointReplayBuffer(PrioritizedReplayMixIn, JointReplayBuffer):
+
+    def __init__(self, size, n_agents, alpha=0.6, epsilon=1e-6):
+        """
+        prioritized joint replay buffer, one column of priorities for every agent
+
+        Args:
+            size: max number of timesteps
+            n_agents: number of agents(trainers)
+            alpha: how much prioritization is used, 0 means uniform
+            epsilon: added to the |td error|, every transition can be sampled
+        """
+        super().__init__(size, n_agents)
+        self._init_priorities(n_agents, alpha, epsilon)
+
+
+class MemmapReplayMixIn:
+    """
+        Replay buffer on memory-mapped .npy files, the columns live outside the python heap(in the page cache)
+        and survive restarts. The write cursor and size are persisted in meta.json by flush,
+        a buffer created with restore=True continues with the transitions of the last flush.
+
+        Layout of the directory:
+            meta.json           cursor, size, max size and shapes of the columns, written after the columns are flushed
+            <column>.npy        a column of the buffer, (maxsize, *shape)
+    """
+    _meta_file = "meta.json"
+
+    def _init_memmap(self, directory, restore=False):
+        self.directory = directory
+        # the first transition added to a restored buffer is checked against its columns
+        self._check_transition = False
+        os.makedirs(directory, exist_ok=True)
+        meta_file = os.path.join(directory, self._meta_file)
+        if not os.path.exists(meta_file):
+            return
+        if not restore:
+            # a new buffer, the old columns are overwritten when the first transition is added
+            os.remove(meta_file)
+            return
+
+        with open(meta_file) as fp:
+            meta = json.load(fp)
+        if meta["maxsize"] != self._maxsize:
+            raise ValueError(f"Error, max size of the replay buffer in {directory} is {meta['maxsize']}, "
+                             f"not {self._maxsize}!")
+        columns = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode="r+")
+                   for name in meta["columns"]}
+        for name, column in columns.items():
+            if list(column.shape) != [self._maxsize] + meta["shapes"][name]:
+                raise ValueError(f"Error, shape of {name} in {directory} is {column.shape}, "
+                                 f"not {[self._maxsize] + meta['shapes'][name]} as in {self._meta_file}!")
+        self._restore_storage(columns, meta.get("layout"))
+        self._check_transition = True
+        self._next_idx = meta["next_idx"]
+        self._size = meta["size"]
+        # priorities are not persisted, restored transitions start with the max priority
+        if getattr(self, "_trees", None) and self._size:
+            for tree in self._trees:
+                tree.update(np.arange(self._size), self._max_priority ** self.alpha)
+
+    def add(self, *args, **kwargs):
+        if self._check_transition:
+            self._validate_transition(*args, **kwargs)
+            self._check_transition = False
+        super().add(*args, **kwargs)
+
+    def _validate_transition(self, *args, **kwargs):
+        '''
+        the shapes of the transition must be the same as the columns restored from the directory
+        '''
+        shapes, layout = self._transition_shapes(*args, **kwargs)
+        columns = {name: tuple(column.shape[1:]) for name, column in self._storage_columns().items()}
+        if {name: tuple(shape) for name, shape in shapes.items()} != columns:
+            raise ValueError(f"Error, shapes of the transition {shapes} are not the same as "
+                             f"the shapes of the replay buffer in {self.directory} {columns}!")
+        if layout is not None and layout != self._layout:
+            raise ValueError(f"Error, layout of the transition is not the same as "
+                             f"the layout of the replay buffer in {self.directory}!")
+
+    def _allocate(self, name, shape, dtype):
+        return np.lib.format.open_memmap(os.path.join(self.directory, name + ".npy"), mode="w+",
+                                         dtype=dtype, shape=(self._maxsize, ) + tuple(shape))
+
+    def clear(self):
+        super().clear()
+        if self._storage is not None:
+            self.flush()
+
+    def flush(self):
+        '''
+        writes the columns to disk, then the cursor and size
+        '''
+        if self._storage is None:
+            return
+        columns = self._storage_columns()
+        for column in columns.values():
+            column.flush()
+
+        meta = {
+            "next_idx": self._next_idx,
+            "size": self._size,
+            "maxsize": self._maxsize,
+            "columns": list(columns),
+            "shapes": {name: list(column.shape[1:]) for name, column in columns.items()},
+            "layout": self._dump_layout(),
+        }
+        meta_file = os.path.join(self.directory, self._meta_file)
+        with open(meta_file + ".tmp", "w") as fp:
+            json.dump(meta, fp)
+        os.replace(meta_file + ".tmp", meta_file)
+
+
+class MemmapReplayBuffer(MemmapReplayMixIn, ReplayBuffer):
+
+    def __init__(self, size, directory, restore=False):
+        """
+        replay buffer of a single trainer on memory-mapped files
+
+        Args:
+            size: max number of transitions
+            directory: directory of the columns
+            restore: continue with the transitions in the directory
+        """
+        super().__init__(size)
+        self._init_memmap(directory, restore)
+
+
+class MemmapJointReplayBuffer(MemmapReplayMixIn, JointReplayBuffer):
+
+    def __init__(self, size, n_agents, directory, restore=False):
+        """
+        joint replay buffer on memory-mapped files
+
+        Args:
+            size: max number of timesteps
+            n_agents: number of agents(trainers)
+            directory: directory of the columns
+            restore: continue with the transitions in the directory
+        """
+        super().__init__(size, n_agents)
+        self._init_memmap(directory, restore)
+
+
+class PrioritizedMemmapReplayBuffer(PrioritizedReplayMixIn, MemmapReplayMixIn, ReplayBuffer):
+
+    def __init__(self, size, directory, restore=False, alpha=0.6, epsilon=1e-6):
+        """
+        prioritized replay buffer of a single trainer on memory-mapped files, priorities are kept in memory
+        """
+        super().__init__(size)
+        self._init_priorities(1, alpha, epsilon)
+        self._init_memmap(directory, restore)
+
+
+class PrioritizedMemmapJointReplayBuffer(PrioritizedReplayMixIn, MemmapReplayMixIn, JointReplayBuffer):
+
+    def __init__(self, size, n_agents, directory, restore=False, alpha=0.6, epsilon=1e-6):
+        """
+        prioritized joint replay buffer on memory-mapped files, priorities are kept in memory
+        """
+        super().__init__(size, n_agents)
+        self._init_priorities(n_agents, alpha, epsilon)
+        self._init_memmap(directory, restore)
+
+
+def make_replay_buffer(size, n_agents=None, prioritized=False, alpha=0.6, directory=None, restore=False):
+    '''
+    Args:
+        size: max number of transitions
+        n_agents: number of agents of a joint replay buffer, None means the buffer of a single trainer
+        prioritized: prioritized experience replay
+        alpha: how much prioritization is used
+        directory: directory of a memory-mapped buffer, None means in memory
+        restore: continue with the transitions in directory
+
+    Returns:
+        the replay buffer
+    '''
+    joint = n_agents is not None
+    if directory is None:
+        if joint:
+            if prioritized:
+                return PrioritizedJointReplayBuffer(size, n_agents, alpha=alpha)
+            return JointReplayBuffer(size, n_agents)
+        if prioritized:
+            return PrioritizedReplayBuffer(size, alpha=alpha)
+        return ReplayBuffer(size)
+
+    if joint:
+        if prioritized:
+            return PrioritizedMemmapJointReplayBuffer(size, n_agents, directory, restore=restore, alpha=alpha)
+        return MemmapJointReplayBuffer(size, n_agents, directory, restore=restore)
+    if prioritized:
+        return PrioritizedMemmapReplayBuffer(size, directory, restore=restore, alpha=alpha)
+    return MemmapReplayBuffer(size, directory, restore=restore)
@@ -1,16 +1,23 @@
 import drl_negotiation.utils as U
 import tensorflow.compat.v1 as tf
 import numpy as np
-from drl_negotiation.a2c.replay_buffer import ReplayBuffer
+from drl_negotiation.a2c.replay_buffer import make_replay_buffer, PrioritizedReplayMixIn
 from drl_negotiation.a2c.distributions import make_pd_type
 
-def make_update_exp(vals, target_vals):
+def make_update_expression(vals, target_vals):
+    '''
+    soft update of the target network, read_value makes the update see the
+    latest values if it is created under control dependencies
+    '''
     polyak = 1.0 - 1e-2
     expression = []
 
     for var, var_target in zip(sorted(vals, key=lambda v: v.name), sorted(target_vals, key=lambda v: v.name)):
-        expression.append(var_target.assign(polyak*var_target - (1-polyak) * var))
-    expression = tf.group(*expression)
+        expression.append(var_target.assign(polyak*var_target.read_value() - (1-polyak) * var.read_value()))
+    return tf.group(*expression)
+
+def make_update_exp(vals, target_vals):
+    expression = make_update_expression(vals, target_vals)
     return U.function([], [], updates=[expression])
 
 def p_predict(
@@ -21,6 +28,13 @@ def p_predict(
         scope = 'trainer',
         reuse = None
 ):
+    """
+    only the actor of p_train, the variables have the same names as in p_train,
+    used to act with a trained policy outside of MADDPGModel
+
+    Returns:
+        act, {"p_values", "p_func_vars"}
+    """
     with tf.variable_scope(scope, reuse=reuse):
         act_pdtype = make_pd_type(act_space)
 
@@ -28,11 +42,29 @@ def p_predict(
 
         p_input = obs_ph
         p = p_func(p_input, int(act_pdtype.param_shape()[0]), scope="p_func", num_units=num_units)
+        p_func_vars = U.scope_vars(U.absolute_scope_name("p_func"))
 
         act_pd = act_pdtype.proba_distribution_from_flat(p)
         act_sample = act_pd.sample()
         act = U.function(inputs=[obs_ph], outputs=act_sample)
-        return act
+        p_values = U.function([obs_ph], p)
+        return act, {"p_values": p_values, "p_func_vars": p_func_vars}
+
+def make_joint_act(trainers):
+    '''
+    fused actors of all trainers, one session.run for the actions of all agents
+
+    Args:
+        trainers: MADDPGAgentTrainer, built by p_train
+
+    Returns:
+        callable, joint_act(obs_0, ..., obs_n-1) -> [act_0, ..., act_n-1],
+        obs_i is a batch of observations of trainer i
+    '''
+    return U.function(
+        inputs=[trainer.p_debug["obs_ph"] for trainer in trainers],
+        outputs=[trainer.p_debug["act_sample"] for trainer in trainers]
+    )
 
 def p_train(make_obs_ph_n,
         act_space_n,
@@ -48,7 +80,6 @@ def p_train(make_obs_ph_n,
     ):
     with tf.variable_scope(scope, reuse=reuse):
         # distributions of actions
-        import ipdb
         act_pdtype_n = [make_pd_type(act_space) for act_space in act_space_n]
 
         # set up placeholders
@@ -99,12 +130,16 @@ def p_train(make_obs_ph_n,
         target_act_sample = act_pdtype_n[p_index].proba_distribution_from_flat(target_p).sample()
         target_act = U.function(inputs=[obs_ph_n[p_index]], outputs=target_act_sample)
 
-        return act, train, update_target_p, {"p_values": p_values, "target_act": target_act}
+        return act, train, update_target_p, {"p_values": p_values, "target_act": target_act,
+                                             "obs_ph": obs_ph_n[p_index], "act_sample": act_sample,
+                                             # used by the fused update of all trainers
+                                             "obs_ph_n": obs_ph_n, "act_ph_n": act_ph_n, "loss": loss, "optimize_expr": optimizer_expr,
+                                             "target_act_sample": target_act_sample,
+                                             "p_func_vars": p_func_vars, "target_p_func_vars": target_p_func_vars}
 
 def q_train(make_obs_ph_n, act_space_n, q_index, q_func, optimizer, grad_norm_clipping=None, local_q_func=False, scope="trainer", reuse=None, num_units=64):
     with tf.variable_scope(scope, reuse=reuse):
         # action probability distribution
-        import ipdb
         act_pdtype_n = [make_pd_type(act_space) for act_space in act_space_n]
 
         obs_ph_n = make_obs_ph_n
@@ -112,6 +147,8 @@ def q_train(make_obs_ph_n, act_space_n, q_index, q_func, optimizer, grad_norm_cl
 
 
         target_ph = tf.placeholder(tf.float32, [None], name="target")
+        # importance-sampling weights of prioritized replay, ones for uniform replay
+        weights_ph = tf.placeholder(tf.float32, [None], name="weights")
 
         # critic could observe many information, and actions of all agents and so on.
         q_input = tf.concat(obs_ph_n + act_ph_n, 1)
@@ -125,7 +162,8 @@ def q_train(make_obs_ph_n, act_space_n, q_index, q_func, optimizer, grad_norm_cl
         q_func_vars = U.scope_vars(U.absolute_scope_name("q_func"))
 
         # loss of q-value, mean square error
-        q_loss = tf.reduce_mean(tf.square(q-target_ph))
+        td_error = q - target_ph
+        q_loss = tf.reduce_mean(weights_ph * tf.square(td_error))
 
         q_reg = tf.reduce_mean(tf.square(q))
 
@@ -136,7 +174,7 @@ def q_train(make_obs_ph_n, act_space_n, q_index, q_func, optimizer, grad_norm_cl
 
 
         # callable
-        train = U.function(inputs=obs_ph_n+act_ph_n + [target_ph], outputs=loss, updates=[optimizer_expr])
+        train = U.function(inputs=obs_ph_n+act_ph_n + [target_ph, weights_ph], outputs=[loss, td_error], updates=[optimizer_expr])
         q_values = U.function(obs_ph_n+act_ph_n, q)
 
         # target network
@@ -145,7 +183,13 @@ def q_train(make_obs_ph_n, act_space_n, q_index, q_func, optimizer, grad_norm_cl
         update_target_q = make_update_exp(q_func_vars, target_q_func_vars)
         target_q_values = U.function(obs_ph_n + act_ph_n, target_q)
 
-        return train, update_target_q, {'q_values': q_values, 'target_q_values': target_q_values}
+        return train, update_target_q, {'q_values': q_values, 'target_q_values': target_q_values,
+                                        # used by the fused update of all trainers
+                                        'obs_ph_n': obs_ph_n, 'act_ph_n': act_ph_n,
+                                        'target_ph': target_ph, 'weights_ph': weights_ph,
+                                        'loss': loss, 'td_error': td_error, 'optimize_expr': optimizer_expr,
+                                        'target_q': target_q,
+                                        'q_func_vars': q_func_vars, 'target_q_func_vars': target_q_func_vars}
 
 class AgentTrainer(object):
     def __init__(self, name, model, obs_shape, act_space, args):
@@ -173,7 +217,8 @@ class MADDPGAgentTrainer(AgentTrainer):
                  agent_index,
                  args,
                  local_q_func=False,
-                 independent=False
+                 independent=False,
+                 replay_buffer=None,
                  ):
         """
 
@@ -186,10 +231,13 @@ class MADDPGAgentTrainer(AgentTrainer):
             args:
             local_q_func:
             independent: use the learned policy in SCML2020World, otherwise in SCMLEnv
+            replay_buffer: JointReplayBuffer shared by all trainers, created in get_trainers,
+                            None means every trainer owns its ReplayBuffer
         """
         self.name = name
         self.n = len(obs_shape_n)
         self.agent_index = agent_index
+        self.act_space = act_space_n[agent_index]
         self.args = args
         obs_ph_n = []
 
@@ -227,7 +275,20 @@ class MADDPGAgentTrainer(AgentTrainer):
                 )
 
         # replay buffer for training
-        self.replay_buffer = ReplayBuffer(1e6)
+        # joint replay buffer is filled once per timestep by the owner(MADDPGModel), not by experience
+        self.joint_replay = replay_buffer is not None
+        if self.joint_replay:
+            self.replay_buffer = replay_buffer
+        else:
+            replay_dir = getattr(args, "replay_dir", None)
+            self.replay_buffer = make_replay_buffer(
+                1e6,
+                prioritized=getattr(args, "prioritized_replay", False),
+                alpha=getattr(args, "prioritized_replay_alpha", 0.6),
+                directory=replay_dir + self.name if replay_dir else None,
+                restore=getattr(args, "restore", False),
+            )
+        self.prioritized_replay = isinstance(self.replay_buffer, PrioritizedReplayMixIn)
         self.max_replay_buffer_len = args.batch_size * args.max_episode_len
         self.replay_sample_index = None
     
@@ -241,29 +302,66 @@ class MADDPGAgentTrainer(AgentTrainer):
         return self.act(obs[None])[0]
 
     def experience(self, obs, act, rew, new_obs, done, terminal):
+        assert not self.joint_replay, "Error, joint replay buffer is shared by all trainers, " \
+                                      "add the transitions of all agents at once!"
         self.replay_buffer.add(obs, act, rew, new_obs, float(done))
 
     def preupdate(self):
         self.replay_sample_index = None
 
-    def update(self, agents, t):
-        if len(self.replay_buffer) < self.max_replay_buffer_len:
-            return 
+    def ready(self, t):
+        '''
+        whether the trainer is updated at the training step t
+        '''
+        return len(self.replay_buffer) >= self.max_replay_buffer_len and t % self.args.n_steps == 0
+
+    def sample(self, agents):
+        '''
+        sample a batch for the update of this trainer
+
+        Returns:
+            obs_n, act_n, rew, obs_next_n, done, weights(importance-sampling weights)
+        '''
+        # column of priorities in the replay buffer
+        column = agents.index(self) if self.joint_replay else 0
+        if self.prioritized_replay:
+            self.replay_sample_index = self.replay_buffer.make_index(self.args.batch_size, column=column)
+            weights = self.replay_buffer.importance_weights(
+                self.replay_sample_index,
+                beta=self.args.prioritized_replay_beta,
+                column=column
+            )
+        else:
+            self.replay_sample_index = self.replay_buffer.make_index(self.args.batch_size)
+            weights = np.ones(len(self.replay_sample_index), dtype=np.float32)
+        index = self.replay_sample_index
+        if self.joint_replay:
+            # one gather for all agents, own reward and done are in the column of this trainer
+            obs_n, act_n, rew_n, obs_next_n, done_n = self.replay_buffer.sample_index(index)
+            rew = rew_n[:, column]
+            done = done_n[:, column]
+        else:
+            obs_n = []
+            obs_next_n = []
+            act_n = []
+            for i in range(self.n):
+                obs, act, rew, obs_next, done = agents[i].replay_buffer.sample_index(index)
+                obs_n.append(obs)
+                obs_next_n.append(obs_next)
+                act_n.append(act)
+            obs, act, rew, obs_next, done = self.replay_buffer.sample_index(index)
+        return obs_n, act_n, rew, obs_next_n, done, weights
+
+    def update_priorities(self, agents, td_error):
+        if self.prioritized_replay:
+            column = agents.index(self) if self.joint_replay else 0
+            self.replay_buffer.update_priorities(self.replay_sample_index, td_error, column=column)
 
-        if not t % self.args.n_steps == 0:
-            return 
+    def update(self, agents, t):
+        if not self.ready(t):
+            return
 
-        self.replay_sample_index = self.replay_buffer.make_index(self.args.batch_size)
-        obs_n = []
-        obs_next_n = []
-        act_n = []
-        index = self.replay_sample_index
-        for i in range(self.n):
-            obs, act, rew, obs_next, done = agents[i].replay_buffer.sample_index(index)
-            obs_n.append(obs)
-            obs_next_n.append(obs_next)
-            act_n.append(act)
-        obs, act, rew, obs_next, done = self.replay_buffer.sample_index(index)
+        obs_n, act_n, rew, obs_next_n, done, weights = self.sample(agents)
 
         # train q network
         num_sample = 1
@@ -274,7 +372,8 @@ class MADDPGAgentTrainer(AgentTrainer):
             target_q += rew + self.args.gamma * (1.0 - done) * target_q_next
 
         target_q /= num_sample
-        q_loss = self.q_train(*(obs_n + act_n + [target_q]))
+        q_loss, td_error = self.q_train(*(obs_n + act_n + [target_q, weights]))
+        self.update_priorities(agents, td_error)
 
         # train p network
         p_loss = self.p_train(*(obs_n + act_n))
@@ -284,3 +383,113 @@ class MADDPGAgentTrainer(AgentTrainer):
 
         return [q_loss, p_loss, np.mean(target_q), np.mean(rew), np.mean(target_q_next), np.std(target_q)]
 
+
+class FusedMADDPGUpdate(object):
+
+    def __init__(self, trainers):
+        """
+        Update of all MADDPGAgentTrainer in four session.run, instead of O(n^2),
+            1. target actions of all agents, for the batches of all trainers
+            2. target q values of all critics
+            3. train all critics
+            4. train all actors, then soft update all target networks
+
+        All target actions are computed before any network is trained, the trainers are
+        not updated one after another as in MADDPGAgentTrainer.update.
+
+        Args:
+            trainers: MADDPGAgentTrainer, the same order as the observations
+        """
+        self.trainers = trainers
+
+        # 1. target actor of agent i, the batches of all trainers are concatenated
+        self._target_act = U.function(
+            inputs=[trainer.p_debug["obs_ph"] for trainer in trainers],
+            outputs=[trainer.p_debug["target_act_sample"] for trainer in trainers]
+        )
+
+        # 2. target critics
+        inputs = []
+        for trainer in trainers:
+            inputs += trainer.q_debug["obs_ph_n"] + trainer.q_debug["act_ph_n"]
+        self._target_q = U.function(inputs, [trainer.q_debug["target_q"] for trainer in trainers])
+
+        # 3. critics
+        inputs = []
+        outputs = []
+        for trainer in trainers:
+            inputs += trainer.q_debug["obs_ph_n"] + trainer.q_debug["act_ph_n"] + \
+                      [trainer.q_debug["target_ph"], trainer.q_debug["weights_ph"]]
+            outputs += [trainer.q_debug["loss"], trainer.q_debug["td_error"]]
+        self._q_train = U.function(inputs, outputs,
+                                   updates=[trainer.q_debug["optimize_expr"] for trainer in trainers])
+
+        # 4. actors, target networks are updated after all actors are trained
+        inputs = []
+        p_optimize_expr = []
+        for trainer in trainers:
+            inputs += trainer.p_debug["obs_ph_n"] + trainer.p_debug["act_ph_n"]
+            p_optimize_expr.append(trainer.p_debug["optimize_expr"])
+        with tf.control_dependencies(p_optimize_expr):
+            target_update_expr = []
+            for trainer in trainers:
+                target_update_expr.append(make_update_expression(trainer.p_debug["p_func_vars"],
+                                                                 trainer.p_debug["target_p_func_vars"]))
+                target_update_expr.append(make_update_expression(trainer.q_debug["q_func_vars"],
+                                                                 trainer.q_debug["target_q_func_vars"]))
+        self._p_train = U.function(inputs, [trainer.p_debug["loss"] for trainer in trainers],
+                                   updates=p_optimize_expr + target_update_expr)
+
+    def update(self, t):
+        '''
+        Returns:
+            losses of all trainers, the same as MADDPGAgentTrainer.update, None if the trainers are not ready
+        '''
+        trainers = self.trainers
+        if not all(trainer.ready(t) for trainer in trainers):
+            return
+
+        for trainer in trainers:
+            trainer.preupdate()
+        batches = [trainer.sample(trainers) for trainer in trainers]
+
+        # 1. target actions, agent i acts on obs_next_n[i] of every trainer's batch
+        sizes = [len(batch[2]) for batch in batches]
+        splits = np.cumsum(sizes)[:-1]
+        target_act_n = self._target_act(*[
+            np.concatenate([batch[3][i] for batch in batches]) for i in range(len(trainers))
+        ])
+        # target_act_next_n[j][i], target action of agent i in the batch of trainer j
+        target_act_next_n = list(zip(*[np.split(act, splits) for act in target_act_n]))
+
+        # 2. target q values
+        inputs = []
+        for j, (obs_n, act_n, rew, obs_next_n, done, weights) in enumerate(batches):
+            inputs += list(obs_next_n) + list(target_act_next_n[j])
+        target_q_next_n = self._target_q(*inputs)
+        target_q_n = [
+            rew + trainer.args.gamma * (1.0 - done) * target_q_next
+            for trainer, (obs_n, act_n, rew, obs_next_n, done, weights), target_q_next
+            in zip(trainers, batches, target_q_next_n)
+        ]
+
+        # 3. critics
+        inputs = []
+        for (obs_n, act_n, rew, obs_next_n, done, weights), target_q in zip(batches, target_q_n):
+            inputs += list(obs_n) + list(act_n) + [target_q, weights]
+        q_outputs = self._q_train(*inputs)
+        q_loss_n, td_error_n = q_outputs[0::2], q_outputs[1::2]
+        for trainer, td_error in zip(trainers, td_error_n):
+            trainer.update_priorities(trainers, td_error)
+
+        # 4. actors and target networks
+        inputs = []
+        for obs_n, act_n, rew, obs_next_n, done, weights in batches:
+            inputs += list(obs_n) + list(act_n)
+        p_loss_n = self._p_train(*inputs)
+
+        return [
+            [q_loss, p_loss, np.mean(target_q), np.mean(batch[2]), np.mean(target_q_next), np.std(target_q)]
+            for q_loss, p_loss, target_q, batch, target_q_next
+            in zip(q_loss_n, p_loss_n, target_q_n, batches, target_q_next_n)
+        ]
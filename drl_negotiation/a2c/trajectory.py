@@ -0,0 +1,197 @@
+'''
+    Streaming trajectory recorder of the benchmark mode.
+
+    Every step of the benchmark(observations, actions, rewards, dones and the profitability of benchmark_data)
+    is buffered in memory for chunk_size steps, then written to a chunk of .npy files, one file per column.
+    The memory of the recorder is bounded by a chunk, the chunks are loaded memory mapped by load_trajectory.
+
+    Layout of the trajectory directory:
+        index.json                      columns(dtype, shape of a step) and steps of every chunk, rewritten per chunk
+        chunk_<k>/<column>.npy          values of the column in the k-th chunk, the first axis is the step
+
+    Columns, i is the index of the agent in obs_n/action_n:
+        episode                         index of the episode, (), int64
+        terminal                        the episode ends at this step, done or max_episode_len, (), bool
+        reward                          (n_agents, ), float32
+        done                            (n_agents, ), bool
+        obs_<i>                         observation before the step, float32
+        action_<i>                      float32
+        profitability_<i>               profitabilities of the step, flat, their number differs between worlds
+        profitability_<i>_len           number of profitabilities of every step, (), int64
+'''
+import json
+import os
+from typing import Dict, List
+
+import numpy as np
+
+__all__ = [
+    "TRAJECTORY_INDEX",
+    "TrajectoryRecorder",
+    "Trajectory",
+    "load_trajectory",
+]
+
+TRAJECTORY_INDEX = "index.json"
+
+
+class TrajectoryRecorder:
+    '''
+    Records the steps of the benchmark in chunks of columnar .npy files.
+
+    Example:
+        >>> recorder = TrajectoryRecorder(benchmark_dir + exp_name, n_agents=len(obs_n))
+        >>> recorder.add(obs_n, action_n, rew_n, done_n, done or terminal, info_n['n'])
+        >>> recorder.close()
+    '''
+    def __init__(self, directory: str, n_agents: int, chunk_size: int = 1024):
+        """
+
+        Args:
+            directory: directory of the trajectory, created if it does not exist
+            n_agents: number of agents in obs_n
+            chunk_size: steps of a chunk
+        """
+        self.directory = directory
+        self.n_agents = n_agents
+        self.chunk_size = chunk_size
+        self.n_steps = 0
+        self.episode = 0
+        self.closed = False
+        self._columns = {}
+        self._chunks = []
+        self._buffer = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _append(self, name: str, value):
+        self._buffer.setdefault(name, []).append(value)
+
+    def add(self, obs_n, action_n, rew_n, done_n, terminal: bool, info_n: List[Dict] = None):
+        '''
+        records a step
+
+        Args:
+            obs_n: observations before the step
+            action_n: actions of the step
+            rew_n: rewards of the step
+            done_n: dones of the step
+            terminal: the episode ends at this step
+            info_n: info of every agent, info_n['n'] of SCMLEnv.step, profitability of benchmark_data
+        '''
+        assert not self.closed, "Error, the trajectory recorder is closed!"
+        self._append("episode", self.episode)
+        self._append("terminal", bool(terminal))
+        self._append("reward", np.asarray(rew_n, dtype=np.float32))
+        self._append("done", np.asarray(done_n, dtype=np.bool_))
+        for i in range(self.n_agents):
+            self._append(f"obs_{i}", np.asarray(obs_n[i], dtype=np.float32))
+            self._append(f"action_{i}", np.asarray(action_n[i], dtype=np.float32))
+            profitability = np.asarray((info_n[i] if info_n else {}).get("profitability", []), dtype=np.float32)
+            self._append(f"profitability_{i}", profitability.ravel())
+            self._append(f"profitability_{i}_len", profitability.size)
+
+        self.n_steps += 1
+        if terminal:
+            self.episode += 1
+        if len(self._buffer["episode"]) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        '''
+        writes the buffered steps to a new chunk
+        '''
+        if not self._buffer:
+            return
+
+        chunk = f"chunk_{len(self._chunks)}"
+        os.makedirs(os.path.join(self.directory, chunk), exist_ok=True)
+        n_steps = len(self._buffer["episode"])
+        for name, values in self._buffer.items():
+            if name.startswith("profitability_") and not name.endswith("_len"):
+                # ragged, flat in a single axis
+                array = np.concatenate(values).astype(np.float32)
+                shape = None
+            else:
+                array = np.stack([np.asarray(_) for _ in values])
+                shape = list(array.shape[1:])
+            column = self._columns.setdefault(name, {"dtype": array.dtype.str, "shape": shape})
+            if column["shape"] != shape:
+                raise ValueError(f"Error, shape of {name} changes from {column['shape']} to {shape}!")
+            np.save(os.path.join(self.directory, chunk, name + ".npy"), array)
+
+        self._chunks.append({"name": chunk, "n_steps": n_steps})
+        self._buffer = {}
+        self._write_index()
+
+    def _write_index(self):
+        index = {
+            "n_agents": self.n_agents,
+            "chunk_size": self.chunk_size,
+            "n_steps": sum(_["n_steps"] for _ in self._chunks),
+            "columns": self._columns,
+            "chunks": self._chunks,
+        }
+        # the index only lists finished chunks, replaced atomically
+        file_name = os.path.join(self.directory, TRAJECTORY_INDEX)
+        with open(file_name + ".tmp", "w") as fp:
+            json.dump(index, fp, indent=2)
+        os.replace(file_name + ".tmp", file_name)
+
+    def close(self):
+        if self.closed:
+            return
+        self.flush()
+        self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class Trajectory:
+    '''
+    Recorded trajectory, the chunks are memory mapped and read lazily.
+
+    Example:
+        >>> trajectory = load_trajectory(benchmark_dir + exp_name)
+        >>> rewards = trajectory.column("reward")
+        >>> profitability = trajectory.profitability(0)
+    '''
+    def __init__(self, directory: str):
+        with open(os.path.join(directory, TRAJECTORY_INDEX)) as fp:
+            self.index = json.load(fp)
+        self.directory = directory
+        self.n_agents = self.index["n_agents"]
+        self.n_steps = self.index["n_steps"]
+        self.columns = list(self.index["columns"])
+
+    def __len__(self):
+        return self.n_steps
+
+    def chunks(self, name: str) -> List[np.ndarray]:
+        '''
+        the column in every chunk, memory mapped, read only
+        '''
+        if name not in self.index["columns"]:
+            raise KeyError(f"Error, {name} is not a column of the trajectory {self.directory}!")
+        return [np.load(os.path.join(self.directory, chunk["name"], name + ".npy"), mmap_mode="r")
+                for chunk in self.index["chunks"]]
+
+    def column(self, name: str) -> np.ndarray:
+        '''
+        the column of all steps, a copy in memory
+        '''
+        return np.concatenate(self.chunks(name))
+
+    def profitability(self, i: int) -> List[np.ndarray]:
+        '''
+        profitabilities of the i-th agent in every step
+        '''
+        lengths = self.column(f"profitability_{i}_len")
+        return np.split(self.column(f"profitability_{i}"), np.cumsum(lengths)[:-1])
+
+
+def load_trajectory(directory: str) -> Trajectory:
+    return Trajectory(directory)
@@ -10,7 +10,6 @@ from scml import (IndependentNegotiationsManager,
                             RandomAgent,
                             DecentralizingAgent,
                                 SCML2020Agent)
-import matplotlib.pyplot as plt
 ############################
 from typing import Union, Optional, Dict, Tuple
 from negmas import (SAOSyncController,
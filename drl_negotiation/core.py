@@ -4,6 +4,8 @@
     E-Mail: n1085633848@outlook.com
 '''
 import os, sys
+import random
+import logging
 import numpy as np
 from scml.scml2020 import SCML2020World, SCML2020Agent, is_system_agent
 from typing import Optional
@@ -101,6 +103,11 @@ class MySCML2020Agent(SCML2020Agent):
         # agents are adversary
         self.adversary = False
 
+        # number of running negotiations and standing negotiation requests, sell, buy
+        # updated by the negotiation lifecycle callbacks
+        self._running_counts = [0, 0]
+        self._request_counts = [0, 0]
+
     def init(self):
         super(MySCML2020Agent, self).init()
 
@@ -112,7 +119,7 @@ class MySCML2020Agent(SCML2020Agent):
             number of runniing negotiations
         """
 
-        return self._count(super(MySCML2020Agent, self).running_negotiations)
+        return tuple(self._running_counts)
 
 
     @property
@@ -122,17 +129,61 @@ class MySCML2020Agent(SCML2020Agent):
         Returns:
             number of standing negotiation requests, sell, buy
         """
-        return self._count(super(MySCML2020Agent, self).negotiation_requests)
-
-    def _count(self, negotiations):
-        sell = 0
-        buy = 0
-        for n in negotiations:
-            if n.annotation["seller"] == self.id:
-                sell +=1
-            elif n.annotation["buyer"] == self.id:
-                buy +=1
-        return sell, buy
+        return tuple(self._request_counts)
+
+    def _role(self, annotation) -> Optional[int]:
+        '''
+            0 if the agent is the seller of the negotiation, 1 if buyer, otherwise None
+        '''
+        if not annotation:
+            return None
+        if annotation.get("seller", None) == self.id:
+            return 0
+        if annotation.get("buyer", None) == self.id:
+            return 1
+        return None
+
+    def _update_count(self, counts, annotation, delta):
+        role = self._role(annotation)
+        if role is not None:
+            counts[role] += delta
+
+    ##########################################################################################
+    # negotiation lifecycle callbacks of negmas, keep the counters of negotiations
+    ##########################################################################################
+    def create_negotiation_request(self, issues, partners, annotation, negotiator, extra) -> str:
+        req_id = super().create_negotiation_request(issues, partners, annotation, negotiator, extra)
+        self._update_count(self._request_counts, annotation, +1)
+        return req_id
+
+    def on_neg_request_rejected_(self, req_id, by):
+        info = self._requested_negotiations.get(req_id, None)
+        super().on_neg_request_rejected_(req_id, by)
+        if info is not None and req_id not in self._requested_negotiations:
+            self._update_count(self._request_counts, info.annotation, -1)
+
+    def on_neg_request_accepted_(self, req_id, mechanism):
+        requested = self._requested_negotiations.get(req_id, None) if req_id is not None else None
+        running = mechanism.id in self._running_negotiations
+        super().on_neg_request_accepted_(req_id, mechanism)
+        if requested is not None and req_id not in self._requested_negotiations:
+            self._update_count(self._request_counts, requested.annotation, -1)
+        if not running and mechanism.id in self._running_negotiations:
+            self._update_count(self._running_counts, self._running_negotiations[mechanism.id].annotation, +1)
+
+    def on_negotiation_failure_(self, partners, annotation, mechanism, state):
+        self._negotiation_ended(mechanism)
+        super().on_negotiation_failure_(partners, annotation, mechanism, state)
+
+    def on_negotiation_success_(self, contract, mechanism):
+        self._negotiation_ended(mechanism)
+        super().on_negotiation_success_(contract, mechanism)
+
+    def _negotiation_ended(self, mechanism):
+        info = self._running_negotiations.get(mechanism.id, None)
+        if info is not None:
+            self._update_count(self._running_counts, info.annotation, -1)
+
       
     def _get_obs(self, seller=True, scenario="scml"):
         # local observation
@@ -177,6 +228,23 @@ class MySCML2020Agent(SCML2020Agent):
 
 
 
+####################################################################################################
+# columns of the state table of TrainWorld, one row for every entity
+####################################################################################################
+STATE_TABLE_COLUMNS = (
+    "initial_balance", "balance", "bankrupt",
+    # state.f of policy agents, initial, begin and end of the step
+    "f_init", "f_begin", "f_end",
+    # running negotiations and negotiation requests of policy agents
+    "running_sell", "running_buy", "request_sell", "request_buy",
+    # current step / n_steps
+    "time",
+    # the policy agent negotiated in this step
+    "negotiated",
+)
+(S_INITIAL_BALANCE, S_BALANCE, S_BANKRUPT, S_F_INIT, S_F_BEGIN, S_F_END, S_RUNNING_SELL, S_RUNNING_BUY,
+ S_REQUEST_SELL, S_REQUEST_BUY, S_TIME, S_NEGOTIATED) = range(len(STATE_TABLE_COLUMNS))
+
 class TrainWorld(SCML2020World):
     """
     Multi-Agent, SCML world, used for training
@@ -224,40 +292,150 @@ class TrainWorld(SCML2020World):
             if not hasattr(agent, 'state'):
                 agent.state = AgentState()
 
+        self.reindex()
+
+    def reindex(self):
+        '''
+            Builds the indexes agent_id -> factory and role -> agents,
+            the indexes are pickled together with the world, so they are still valid after restore.
+            Must be called again if the action_callback or interactive of an agent is changed.
+        '''
+        self._factory_by_agent = {factory.agent_id: factory for factory in self.factories}
+        self._entity_list = [agent for agent in self.agents.values()]
+        self._policy_agents = [agent for agent in self._entity_list if agent.action_callback is None]
+        self._heuristic_agents = [agent for agent in self._entity_list if agent.action_callback=='heuristic']
+        self._interactive_agents = [agent for agent in self._entity_list if agent.interactive]
+        self._script_agents = [agent for agent in self._entity_list if callable(agent.action_callback)]
+
+        # rows of the state table
+        self._policy_rows = np.array([i for i, agent in enumerate(self._entity_list) if agent.action_callback is None],
+                                     dtype=np.int64)
+        # entities compared with the policy agents in the reward, not system and not policy agents
+        self._other_rows = np.array([i for i, agent in enumerate(self._entity_list)
+                                     if agent.action_callback != "system" and agent.action_callback is not None],
+                                    dtype=np.int64)
+        self._adversary = np.array([getattr(self._entity_list[i], "adversary", False) for i in self._policy_rows],
+                                   dtype=bool)
+        self.state_table = np.zeros((len(self._entity_list), len(STATE_TABLE_COLUMNS)), dtype=np.float64)
+        # static part of the observations, costs of processes, horizon and catalog prices, built once per world
+        self._static_obs = None
+
+    def update_state_table(self):
+        '''
+            Updates the state table of all entities once per world step,
+            columns are in STATE_TABLE_COLUMNS, rows are in the same order as entities
+        '''
+        table = self.state_table
+        for i, entity in enumerate(self._entity_list):
+            factory = self._factory_by_agent.get(entity.id, None)
+            if factory is not None:
+                table[i, S_INITIAL_BALANCE] = factory.initial_balance
+                table[i, S_BALANCE] = factory.current_balance
+                table[i, S_BANKRUPT] = factory.is_bankrupt
+
+        for i in self._policy_rows:
+            agent = self._entity_list[i]
+            if agent.state.f is not None:
+                table[i, S_F_INIT:S_F_END + 1] = agent.state.f
+            table[i, S_RUNNING_SELL:S_RUNNING_BUY + 1] = agent.running_negotiations
+            table[i, S_REQUEST_SELL:S_REQUEST_BUY + 1] = agent.negotiation_requests
+            table[i, S_TIME] = agent.awi.current_step / agent.awi.n_steps
+            table[i, S_NEGOTIATED] = agent.state.o_negotiation_step == agent.awi.current_step
+
+        if self._static_obs is None and len(self._policy_rows):
+            self._static_obs = np.stack([self._get_static_obs(self._entity_list[i]) for i in self._policy_rows])
+
+    @staticmethod
+    def _get_static_obs(agent):
+        '''
+            parts of MySCML2020Agent._get_obs which do not change during the simulation
+        '''
+        o_m = agent.awi.profile.costs
+        o_m = o_m[:, agent.awi.profile.processes]
+        return np.concatenate((o_m.flatten(), np.array([agent._horizon]), agent.awi.catalog_prices))
+
+    def observations(self) -> np.ndarray:
+        '''
+            observations of all policy agents, the same as MySCML2020Agent._get_obs,
+            (n_policy_agents, obs_dim)
+        '''
+        table = self.state_table[self._policy_rows]
+        return np.concatenate((
+            (table[:, S_F_END] - table[:, S_F_BEGIN])[:, None],
+            self._static_obs,
+            table[:, S_RUNNING_SELL:S_REQUEST_BUY + 1],
+            table[:, S_TIME:S_TIME + 1],
+        ), axis=1)
+
+    def rewards(self, rew_factor=REW_FACTOR) -> np.ndarray:
+        '''
+            rewards of all policy agents, the same as Scenario.reward of scml,
+            (n_policy_agents, )
+        '''
+        table = self.state_table
+        policy = table[self._policy_rows]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            rew = np.where(
+                policy[:, S_NEGOTIATED] > 0,
+                (policy[:, S_F_END] - policy[:, S_F_BEGIN]) / policy[:, S_F_INIT] * rew_factor,
+                0.0
+            )
+        others = table[self._other_rows]
+        gap = (others[:, S_BALANCE] - others[:, S_INITIAL_BALANCE]) / others[:, S_INITIAL_BALANCE]
+        rew -= np.mean(gap)
+        # reward of adversary is not implemented, see Scenario.adversary_reward
+        rew[self._adversary] = 0
+        return rew
+
+    def dones(self) -> np.ndarray:
+        '''
+            dones of all policy agents, simulation is end or factory is bankrupt,
+            (n_policy_agents, )
+        '''
+        if self.world_done:
+            return np.ones(len(self._policy_rows), dtype=bool)
+        return self.state_table[self._policy_rows, S_BANKRUPT] > 0
+
+    def factory_of(self, agent_id: str):
+        '''
+            factory of the agent, O(1)
+        '''
+        return self._factory_by_agent[agent_id]
+
     @property
     def entities(self):
         '''
             agents + system_entities
         '''
-        return [agent for agent in self.agents.values()]
+        return self._entity_list
 
     @property
     def policy_agents(self):
         '''
            e.g. maddpg drived agents,
         '''
-        return [agent for agent in self.entities if agent.action_callback is None]
+        return self._policy_agents
     
     @property
     def heuristic_agents(self):
         '''
             e.g. heuristic agents, BuyCheapSellExpensiveAgent
         '''
-        return [agent for agent in self.entities if agent.action_callback=='heuristic']
+        return self._heuristic_agents
 
     @property
     def interactive_agents(self):
         '''
             e.g. controlled by user
         '''
-        return [agent for agent in self.entities if agent.interactive]
+        return self._interactive_agents
     
     @property
     def script_agents(self):
         '''
             My script-drived agents, with action_callback
         '''
-        return [agent for agent in self.entities if callable(agent.action_callback)] 
+        return self._script_agents
 
     def step(self):
         # actions of policy agents are preset in environement.
@@ -271,16 +449,15 @@ class TrainWorld(SCML2020World):
         # simulation is already ends
         if self.time >= self.time_limit:
             self.__done = True
-            return
-        
-        if not super().step():
+        elif not super().step():
             self.__done = True
-            return 
-        
-        # update agents' state
-        # policy agents
-        for agent in self.policy_agents:
-            self.update_agent_state(agent)
+        else:
+            # update agents' state
+            # policy agents
+            for agent in self.policy_agents:
+                self.update_agent_state(agent)
+
+        self.update_state_table()
     
     @property 
     def world_done(self):
@@ -292,7 +469,7 @@ class TrainWorld(SCML2020World):
     def update_agent_state(self, agent: Optional[MySCML2020Agent]):
         # initial update the state of
         if agent.awi.current_step == 0:
-            f_init = [_.initial_balance for _ in self.factories if _.agent_id == agent.id][0]
+            f_init = self.factory_of(agent.id).initial_balance
             f_begin = f_init
             f_end = f_begin
             agent.state.f = np.array([f_init, f_begin, f_end])
@@ -309,7 +486,7 @@ class TrainWorld(SCML2020World):
                 # uvalues = agent._urange(agent.state.o_step, agent.state.o_is_sell, tvalues)
                 # agent.state.m = [qvalues, tvalues, uvalues]
 
-                f_end = [_.current_balance for _ in self.factories if _.agent_id == agent.id][0]
+                f_end = self.factory_of(agent.id).current_balance
                 agent.state.f[2] = f_end
 
                 #TODO: interactive test
@@ -329,6 +506,20 @@ class TrainWorld(SCML2020World):
                 noise = np.random.randn(*agent.action.c.shape) * agent.c_nois if agent.c_nois else 0.0
                 agent.state.c = agent.action.c + noise
 
+    def snapshot(self) -> bytes:
+        '''
+            In-memory snapshot of the initialized world,
+            factories, agents, awi and contracts are all contained
+        '''
+        return pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def restore(snapshot: bytes) -> "TrainWorld":
+        '''
+            Restore a world from the snapshot, the restored world is independent of the others
+        '''
+        return pickle.loads(snapshot)
+
     def save_config(self, file_name: str):
         dump_data = {
             "agent_types": [_._type_name() for _ in self.configuration['agent_types']],
@@ -356,3 +547,59 @@ class TrainWorld(SCML2020World):
         with open(file_name+'.pkl', 'wb') as file:
             pickle.dump(dump_data, file)
         # super().save_config(file_name=file_name)
+
+
+
+class WorldPool:
+    """
+    Pool of snapshots of initialized TrainWorlds,
+    used by the scenario to reset the world without building a new SCML2020World.
+
+    The pool is filled with the first `size` generated worlds,
+    afterwards every reset restores a random snapshot of the pool.
+    """
+    def __init__(self, size: int = WORLD_POOL_SIZE):
+        """
+
+        Args:
+            size: maximum number of snapshots, 0 means the pool is disabled
+        """
+        self.size = size
+        self._snapshots = []
+
+    def __len__(self):
+        return len(self._snapshots)
+
+    @property
+    def full(self) -> bool:
+        return self.size > 0 and len(self._snapshots) >= self.size
+
+    def add(self, world: TrainWorld) -> bool:
+        """
+        Take a snapshot of the world, must be called directly after the world is initialized
+        Returns:
+            bool, whether the snapshot is added into the pool
+        """
+        if self.full or self.size <= 0:
+            return False
+
+        try:
+            self._snapshots.append(world.snapshot())
+        except Exception as e:
+            # world can not be pickled, e.g. agents hold unpicklable objects, disable the pool
+            logging.warning(f"can not take a snapshot of the world, disable the world pool! {e}")
+            self.size = 0
+            self._snapshots = []
+            return False
+        return True
+
+    def sample(self) -> TrainWorld:
+        """
+        Returns:
+            a restored copy of a random snapshot
+        """
+        assert self._snapshots, "Error, world pool is empty!"
+        return TrainWorld.restore(random.choice(self._snapshots))
+
+    def clear(self):
+        self._snapshots = []
@@ -6,6 +6,7 @@ import numpy as np
 from gym.spaces import Discrete, Box
 from gym.utils import seeding
 
+from .timer import NULL_TIMER
 from .game import (Game,
                    NegotiationGame,
                    DRLNegotiationGame,
@@ -481,7 +482,20 @@ class SCMLEnv(gym.Env):
             info_callback=None,
             done_callback=None,
             shared_viewer=True,
+            batch_observation_callback=None,
+            batch_reward_callback=None,
+            batch_done_callback=None,
             ):
+        """
+
+        Args:
+            world: TrainWorld
+            reset_callback, reward_callback, observation_callback, info_callback, done_callback:
+                callbacks of the scenario, called for every agent and role(seller/buyer)
+            batch_observation_callback, batch_reward_callback, batch_done_callback:
+                callbacks of the scenario which compute all policy agents at once from the state table of world,
+                used in step and reset instead of the per agent callbacks if all of them are set
+        """
 
         self.world = world
         self.agents = self.world.policy_agents
@@ -494,6 +508,14 @@ class SCMLEnv(gym.Env):
         self.observation_callback = observation_callback
         self.info_callback = info_callback
         self.done_callback = done_callback
+        self.batch_observation_callback = batch_observation_callback
+        self.batch_reward_callback = batch_reward_callback
+        self.batch_done_callback = batch_done_callback
+        self._batch = all(_ is not None for _ in (batch_observation_callback,
+                                                  batch_reward_callback,
+                                                  batch_done_callback))
+        # phase timer, set by MADDPGModel.learn
+        self.timer = NULL_TIMER
         # env parameters
         self.discrete_action_space = DISCRETE_ACTION_SPACE
         # action is a number 0...N, otherwise action is a one-hot N-dimensional vector
@@ -594,17 +616,38 @@ class SCMLEnv(gym.Env):
                 # buyer action, the same action_space as the seller
                 self._set_buyer_action(action_n[i+1], agent, self.action_space[i+1])
 
-        self.world.step()
-        for agent in self.agents:
-            obs_n.append(self._get_obs(agent, seller=True))
-            reward_n.append(self._get_reward(agent, seller=True))
-            done_n.append(self._get_done(agent, seller=True))
+        with self.timer.phase("world_step"):
+            self.world.step()
+        if self._batch:
+            # all agents at once from the state table of world
+            with self.timer.phase("observation"):
+                obs_batch = self.batch_observation_callback(self.world)
+            with self.timer.phase("reward"):
+                reward_batch = self.batch_reward_callback(self.world)
+            with self.timer.phase("done"):
+                done_batch = self.batch_done_callback(self.world)
+
+        for i, agent in enumerate(self.agents):
+            if self._batch:
+                obs_n.append(obs_batch[i])
+                reward_n.append(reward_batch[i])
+                done_n.append(done_batch[i])
+            else:
+                obs_n.append(self._get_obs(agent, seller=True))
+                reward_n.append(self._get_reward(agent, seller=True))
+                done_n.append(self._get_done(agent, seller=True))
             info_n['n'].append(self._get_info(agent, seller=True))
 
             if not ONLY_SELLER:
-                obs_n.append(self._get_obs(agent, seller=False))
-                reward_n.append(self._get_reward(agent, seller=False))
-                done_n.append(self._get_done(agent, seller=False))
+                if self._batch:
+                    # seller and buyer have the same observation, reward and done
+                    obs_n.append(obs_batch[i].copy())
+                    reward_n.append(reward_batch[i])
+                    done_n.append(done_batch[i])
+                else:
+                    obs_n.append(self._get_obs(agent, seller=False))
+                    reward_n.append(self._get_reward(agent, seller=False))
+                    done_n.append(self._get_done(agent, seller=False))
                 info_n['n'].append(self._get_info(agent, seller=False))
 
             # update state after calculate reward
@@ -629,7 +672,10 @@ class SCMLEnv(gym.Env):
 
     def reset(self):
         # reset world
-        self.reset_callback(self.world)
+        world = self.reset_callback(self.world)
+        if world is not None:
+            # the world may be restored from a snapshot instead of reset in place
+            self.world = world
         
         obs_n = []
         self.agents = self.world.policy_agents
@@ -637,9 +683,18 @@ class SCMLEnv(gym.Env):
 
         for agent in self.agents:
             self.world.update_agent_state(agent)
+        if hasattr(self.world, "update_state_table"):
+            self.world.update_state_table()
 
         # and get the initial obs
-        for agent in self.agents:
+        if self._batch:
+            obs_batch = self.batch_observation_callback(self.world)
+        for i, agent in enumerate(self.agents):
+            if self._batch:
+                obs_n.append(obs_batch[i])
+                if not ONLY_SELLER:
+                    obs_n.append(obs_batch[i].copy())
+                continue
             obs_n.append(self._get_obs(agent, seller=True))
             if not ONLY_SELLER:
                 obs_n.append(self._get_obs(agent, seller=False))
@@ -692,22 +747,26 @@ class SCMLEnv(gym.Env):
     def _get_info(self, agent, seller=True):
         if self.info_callback is None:
             return {}
-        return self.info_callback(agent, self.world, seller=seller)
+        with self.timer.phase("info"):
+            return self.info_callback(agent, self.world, seller=seller)
 
     def _get_obs(self, agent, seller=True):
         if self.observation_callback is None:
             return np.zeros(0)
-        return self.observation_callback(agent, self.world, seller=seller)
+        with self.timer.phase("observation"):
+            return self.observation_callback(agent, self.world, seller=seller)
 
     def _get_done(self, agent, seller=True):
         if self.done_callback is None:
             return False
-        return self.done_callback(agent, self.world, seller=seller)
+        with self.timer.phase("done"):
+            return self.done_callback(agent, self.world, seller=seller)
 
     def _get_reward(self, agent, seller=True):
         if self.reward_callback is None:
             return 0.0
-        return self.reward_callback(agent, self.world, seller=seller)
+        with self.timer.phase("reward"):
+            return self.reward_callback(agent, self.world, seller=seller)
 
     def _preprocess_action(self, action, action_space):
         if isinstance(action_space, spaces.MultiDiscrete):
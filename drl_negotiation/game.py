@@ -8,7 +8,6 @@ from negmas import (
                         MechanismState,
                         Negotiator,
                         ResponseType,
-                        normalize
                     )
 from typing import Optional, Union, Dict, List
 from .myagent import MyComponentsBasedAgent
@@ -17,6 +16,7 @@ from scml.scml2020.agents import DecentralizingAgent, BuyCheapSellExpensiveAgent
 from scml.scml2020 import anac2020_std, anac2020_collusion
 from dataclasses import dataclass
 from .utils import reverse_normalize_action
+from .utility_functions import NormalizedUtilityTable
 
 # extra reward for agreement when negotiator get a agreement
 EXTRA_REWARD = 1.01
@@ -334,6 +334,28 @@ class NegotiationGame(DRLGameMixIn, Game):
         self.session.add(competitor)
         # competitor.set_env(env=self.env)
 
+    def init_game(self):
+        super().init_game()
+        # normalized utility tables of competitors, built once per episode
+        self._utility_tables = {}
+
+    def utility_table(self, competitor: DRLNegotiator) -> NormalizedUtilityTable:
+        """
+        The ufun of competitor is fixed in the episode, so the normalized utilities of all
+        outcomes are calculated once after reset, used by the reward of every step
+
+        Args:
+            competitor: negotiator joined in the session
+
+        Returns:
+            NormalizedUtilityTable, normalized in (-1, 1)
+        """
+        table = self._utility_tables.get(competitor.id, None)
+        if table is None:
+            table = NormalizedUtilityTable(competitor.get_ufun, competitor.ami.outcomes, rng=(-1, 1))
+            self._utility_tables[competitor.id] = table
+        return table
+
 
     def step_forward(self, action=None, competitor: Optional[DRLNegotiator] = None):
         
@@ -361,16 +383,16 @@ class NegotiationGame(DRLGameMixIn, Game):
                     reward = 0
                     if competitor.time < competitor.maximum_time:
 
+                        # normalized ufun is monotone in ufun, so also used for comparing with _rp
+                        ufun = self.utility_table(competitor)
                         if competitor.action == ResponseType.ACCEPT_OFFER:
                             if result.agreement:
                                 if "_rp" in competitor.__dict__:
-                                    if competitor.ufun(result.agreement) >= competitor.ufun(competitor._rp):
-                                        ufun = normalize(competitor.get_ufun, competitor.ami.outcomes, rng=(-1, 1))
+                                    if ufun(result.agreement) >= ufun(competitor._rp):
                                         reward = (ufun(result.agreement) + EXTRA_REWARD) * 1000
                                     else:
                                         reward = -1
                                 else:
-                                    ufun = normalize(competitor.get_ufun, competitor.ami.outcomes, rng=(-1, 1))
                                     reward = ufun(result.agreement)+EXTRA_REWARD
                             else:
                                 reward = 0
@@ -381,13 +403,11 @@ class NegotiationGame(DRLGameMixIn, Game):
                                 # proposal a meaningful offer
                                 # calculate the reward
                                 if "_rp" in competitor.__dict__:
-                                    if competitor.ufun(competitor.proposal_offer) >= competitor.ufun(competitor._rp):
-                                        ufun = normalize(competitor.get_ufun, competitor.ami.outcomes, rng=(-1, 1))
+                                    if ufun(competitor.proposal_offer) >= ufun(competitor._rp):
                                         reward = ufun(competitor.proposal_offer)
                                     else:
                                         reward = -1
                                 else:
-                                    ufun = normalize(competitor.get_ufun, competitor.ami.outcomes, rng=(-1, 1))
                                     reward = ufun(competitor.proposal_offer)
                                 # competitor.set_proposal_offer(offer=None)
                             else:
@@ -405,7 +425,7 @@ class NegotiationGame(DRLGameMixIn, Game):
                     return reward
                 elif self.env.strategy == "of_s":
                     if competitor.time < competitor.maximum_time:
-                        ufun = normalize(competitor.get_ufun, outcomes=competitor.ami.outcomes, rng=(-1, 1))
+                        ufun = self.utility_table(competitor)
                         action = reverse_normalize_action(action, competitor)
                         # print(action)
                         reward = ufun(action)
@@ -18,6 +18,7 @@ ONLY_SELLER = False # train seller and buyer together
 ROOT_DIR = "/" + "tmp" + "/"
 # save dir, single policy
 SAVE_DIR = ROOT_DIR+"policy4" + "/"
+REPLAY_DIR = SAVE_DIR + "replay/"
 # model name
 MODEL_NAME = "model"
 # train episode
@@ -26,8 +27,46 @@ TRAIN_EPISODES = 1000
 SAVE_RATE = 5
 # max length of single episode
 MAX_EPISODE_LEN = 10
-# save the model of trainers separately
+# index the actors of trainers in the checkpoint(checkpoint_index.json), every policy could be loaded separately
 SAVE_TRAINERS = True
+# number of worlds stepped in parallel worker processes during training
+N_ENVS = 1
+# all trainers share one joint replay buffer, a row holds the transitions of all agents
+JOINT_REPLAY = True
+# prioritized experience replay, sampled in proportion to |td error| ** alpha, importance-sampling weights with beta
+PRIORITIZED_REPLAY = False
+PRIORITIZED_REPLAY_ALPHA = 0.6
+PRIORITIZED_REPLAY_BETA = 0.4
+# replay buffers on memory-mapped files in REPLAY_DIR, flushed at SAVE_RATE, restored with RESTORE
+MEMMAP_REPLAY = False
+# update all trainers in a constant number of session.run
+FUSED_UPDATE = True
+# threads of the tensorflow session, None means all CPUs, INTRA/INTER_OP_THREADS override NUM_CPU
+NUM_CPU = 1
+INTRA_OP_THREADS = None
+INTER_OP_THREADS = None
+# asynchronous actor/learner, rollout workers run SCMLEnv while the learner updates the trainers
+ASYNC_ROLLOUTS = False
+N_ROLLOUT_WORKERS = 2
+# the learner broadcasts the weights of actors every WEIGHT_BROADCAST_INTERVAL training steps
+WEIGHT_BROADCAST_INTERVAL = 50
+# transitions produced by weights older than MAX_STALENESS training steps are dropped, None means never
+MAX_STALENESS = None
+ROLLOUT_CHUNK_SIZE = 32
+# time every phase of the training loop, logged at SAVE_RATE, exported with the learning curves
+PHASE_TIMER = True
+# checkpoints are written by a background thread, only the last MAX_TO_KEEP checkpoints are kept,
+# at most MAX_PENDING_CHECKPOINTS snapshots wait for writing, older ones are dropped
+ASYNC_CHECKPOINT = True
+MAX_TO_KEEP = 5
+MAX_PENDING_CHECKPOINTS = 2
+# export the weights of actors to SAVE_DIR/actors.npz with every checkpoint,
+# MyNegotiationManager acts with NumpyActor without tensorflow if the file exists
+EXPORT_ACTORS = True
+# max number of policies cached in a process, shared by all MyNegotiationManager
+POLICY_CACHE_SIZE = 32
+# steps of a chunk of the trajectory recorded in benchmark mode, the memory of the recorder is bounded by a chunk
+TRAJECTORY_CHUNK_SIZE = 1024
 
 LOAD_MODEL = False
 LOGGING_LEVEL = logging.INFO
@@ -77,6 +116,10 @@ DIM_M = 2
 DIM_B = 2
 TRAINING_AGENT_TYPES = ["drl_negotiation.myagent.MyComponentsBasedAgent", "scml.scml2020.IndDecentralizingAgent"]
 REW_FACTOR = 0.2
+# number of snapshots of initialized worlds, used to reset the world cheaply, opt-in
+# a pool of N snapshots trains on the same N world configurations over and over,
+# 0 disables the pool, a new world is generated in every reset
+WORLD_POOL_SIZE = 0
 
 ################################################
 # scml scenario
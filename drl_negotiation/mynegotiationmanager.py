@@ -20,14 +20,9 @@ from .negotiator import MyDRLNegotiator
 from .core import NegotiationRequestAction
 from .controller import MyDRLSCMLSAOSyncController
 from .hyperparameters import *
-from drl_negotiation.utils import load_seller_neg_model
-from drl_negotiation.utils import load_buyer_neg_model
-from drl_negotiation.utils import get_trainers
 from drl_negotiation.utils import reverse_normalize
-from drl_negotiation.a2c.policy import create_actor
-import drl_negotiation.utils as U
+from drl_negotiation.a2c.policy_registry import get_registry
 from gym import spaces
-import tensorflow as tf
 from drl_negotiation.controller import MyDRLSCMLSAOSyncController
 
 class MyNegotiationManager(IndependentNegotiationsManager):
@@ -50,9 +45,8 @@ class MyNegotiationManager(IndependentNegotiationsManager):
         self.model_path = None
         self.load_model = load_model
         self.train = train
-        self.saver = {}
-        self.already_loaded = []
-        self.initalize = []
+        # index of the consolidated checkpoint in model_path, None means one checkpoint per scope
+        self.checkpoint_index = None
 
         if load_model:
             self.seller_model_path = seller_model_path
@@ -64,29 +58,26 @@ class MyNegotiationManager(IndependentNegotiationsManager):
         # if not train:
         #     self._setup_model()
 
-    @staticmethod
-    def _search_policies(dirs):
-        policies = []
-        for _ in dirs:
-            policies.append(U.traversal_dir_first_dir(_))
-        return policies
-
     def _setup_model(self):
         """
         get the buyer and seller trainer/model,
-        create the policy network and load the saved parameters
+        the actors are shared by all agents of the process, see PolicyRegistry
         Returns:
 
         """
         print(f"setup model called!{self}")
+        registry = get_registry()
         dirs = POLICIES
-        policies = self._search_policies(dirs)
 
         scope_prefix = self.name.replace("@", '-')
         scopes = [scope_prefix + "_seller", scope_prefix + "_buyer"]
         _tmp_index = []
-        for index, policy in enumerate(policies):
-            if dirs[index]+scopes[0] in policy and dirs[index] + scopes[1] in policy:
+        for index, path in enumerate(dirs):
+            policy, checkpoint_index = registry.policy_dir(path)
+            if checkpoint_index is not None:
+                if all(_ in checkpoint_index["policies"] for _ in scopes):
+                    _tmp_index.append(index)
+            elif path+scopes[0] in policy and path + scopes[1] in policy:
                 _tmp_index.append(index)
         if not _tmp_index:
             logging.info(f"Do not load trained model for {self}, use default logic!")
@@ -94,8 +85,7 @@ class MyNegotiationManager(IndependentNegotiationsManager):
             return
         else:
             self.model_path = dirs[random.choice(_tmp_index)]
-
-        obs_ph = []
+            self.checkpoint_index = registry.policy_dir(self.model_path)[1]
 
         # observation space
         observation_space = []
@@ -106,11 +96,6 @@ class MyNegotiationManager(IndependentNegotiationsManager):
 
         obs_shape = [observation_space[i].shape for i in range(len(observation_space))]
 
-        for i in range(len(obs_shape)):
-            obs_ph.append(U.BatchInput(obs_shape[i], name="observation" + str(i)).get())
-
-        make_obs_ph = obs_ph
-
         # action space
         if DISCRETE_ACTION_SPACE:
             act_space = [spaces.Discrete(DIM_M*2 + 1), spaces.Discrete(DIM_B*2 + 1)]
@@ -118,38 +103,25 @@ class MyNegotiationManager(IndependentNegotiationsManager):
             act_space = [spaces.Box(low=-self.m_range, high=+self.m_range, shape=(DIM_M, ), dtype=np.float32),
                         spaces.Box(low=-self.m_range, high=+self.m_range, shape=(DIM_B, ), dtype=np.float32)]
 
-        self.models = []
-
-        for index in range(len(scopes)):
-            self.models.append(
-                (create_actor(
-                    make_obs_ph=make_obs_ph[index],
-                    act_space=act_space[index],
-                    scope=scopes[index]
-                ), scopes[index]))
+        # (act, scope)
+        self.models = [
+            (registry.actor(self.model_path, scopes[index], obs_shape[index], act_space[index]), scopes[index])
+            for index in range(len(scopes))
+        ]
 
         self.scopes = scopes
 
-    def _load_state(self, model):
+    def _policy_action(self, model):
         """
-        restore the model
+        action of the seller or buyer policy for the current observation
         Args:
-            sell:
+            model: (act, scope)
 
         Returns:
-
+            batch of actions, only one observation
         """
-        logging.info("loading model")
-        if os.path.exists(self.model_path+model[1]):
-            if self.name+model[1] not in self.saver:
-                var = tf.global_variables()
-                var_flow_restore = [val for val in var if model[1] in val.name]
-                #self.saver[self.name] = tf.train.import_meta_graph(self.model_path+model[1]+'/'+MODEL_NAME+'.meta')
-                self.saver[self.name] = tf.train.Saver(var_flow_restore)
-
-            # if self.name+model[1] not in self.already_loaded:
-            U.load_state(tf.train.latest_checkpoint(self.model_path+model[1]), saver=self.saver[self.name])
-            self.already_loaded.append(self.name+model[1])
+        _obs = self._get_obs()
+        return model[0](_obs[None])
 
     def respond_to_negotiation_request(
             self,
@@ -279,42 +251,30 @@ class MyNegotiationManager(IndependentNegotiationsManager):
 
             if _model is not None:
                 #TODO: test period, get the action from model
-                with U.single_threaded_session():
-                    if self.name+_model[1] not in self.already_loaded:
-                        if self.name+_model[1] not in self.initalize:
-                            U.initialize()
-                            self.initalize.append(self.name+_model[1])
-                        self._load_state(_model)
-
-                    _obs = self._get_obs()
-                    try:
-                        _act = _model[0](_obs[None])
-                    except Exception as e:
-                        self._load_state(_model)
-                        _act = _model[0](_obs[None])
-
-                    if MANAGEABLE:
-                        self.action.s = np.zeros(DIM_S)
-                        if DISCRETE_ACTION_INPUT:
-                            if _act[0] == 1: self.action.s[0] = -1.0
-                            if _act[0] == 2: self.action.s[0] = +1.0
-                            if _act[0] == 3: self.action.s[1] = -1.0
-                            if _act[0] == 4: self.action.s[1] = +1.0
+                _act = self._policy_action(_model)
+
+                if MANAGEABLE:
+                    self.action.s = np.zeros(DIM_S)
+                    if DISCRETE_ACTION_INPUT:
+                        if _act[0] == 1: self.action.s[0] = -1.0
+                        if _act[0] == 2: self.action.s[0] = +1.0
+                        if _act[0] == 3: self.action.s[1] = -1.0
+                        if _act[0] == 4: self.action.s[1] = +1.0
+                    else:
+                        # one hot
+                        if DISCRETE_ACTION_SPACE:
+                            self.action.s[0] += _act[0][1] - _act[0][2]
+                            self.action.s[1] += _act[0][3] - _act[0][4]
                         else:
-                            # one hot
-                            if DISCRETE_ACTION_SPACE:
-                                self.action.s[0] += _act[0][1] - _act[0][2]
-                                self.action.s[1] += _act[0][3] - _act[0][4]
-                            else:
-                                self.action.s = _act[0]
-
-                        #uvalues = tuple(np.array(uvalues) + (np.array(self.action.s)*).astype("int32"))
-                        # uvalues = (((uvalues[0] - 0) / 2, (uvalues[1] - uvalues[0]) / 2) * self.action.s +np.array(uvalues)).astype("int32")
-
-                        vel = self.action.m_vel if sell else self.action.b_vel
-                        print(f"uvalues {uvalues} to")
-                        uvalues = tuple(np.array(uvalues) + (np.array(self.action.s) * vel).astype("int32"))
-                        print(f"uvalues {uvalues}")
+                            self.action.s = _act[0]
+
+                    #uvalues = tuple(np.array(uvalues) + (np.array(self.action.s)*).astype("int32"))
+                    # uvalues = (((uvalues[0] - 0) / 2, (uvalues[1] - uvalues[0]) / 2) * self.action.s +np.array(uvalues)).astype("int32")
+
+                    vel = self.action.m_vel if sell else self.action.b_vel
+                    print(f"uvalues {uvalues} to")
+                    uvalues = tuple(np.array(uvalues) + (np.array(self.action.s) * vel).astype("int32"))
+                    print(f"uvalues {uvalues}")
 
             else:
                 # training period, action has been set up in env
@@ -1,5 +1,5 @@
 from drl_negotiation.scenario import BaseScenario
-from drl_negotiation.core import TrainWorld, MySCML2020Agent
+from drl_negotiation.core import TrainWorld, MySCML2020Agent, WorldPool
 from drl_negotiation.myagent import MyComponentsBasedAgent
 from drl_negotiation.hyperparameters import *
 from negmas.helpers import get_class
@@ -14,6 +14,10 @@ import numpy as np
 
 class Scenario(BaseScenario):
 
+    def __init__(self, world_pool_size=WORLD_POOL_SIZE):
+        # snapshots of initialized worlds, restored in reset_world
+        self.world_pool = WorldPool(size=world_pool_size)
+
     def make_world(self, config=None) -> TrainWorld:
         # configuration, for Scenario scml
         if config is None:
@@ -33,12 +37,16 @@ class Scenario(BaseScenario):
         world = TrainWorld(configuration=world_configuration)
 
         if config is None:
-            self.reset_world(world)
+            world = self.reset_world(world)
 
         return world
 
-    def reset_world(self, world):
+    def reset_world(self, world) -> TrainWorld:
         # callback, reset
+        # returns the reset world, maybe a new world restored from the pool
+
+        if self.world_pool.full:
+            return self.world_pool.sample()
 
         # reset world, agents, factories
         # fixed position
@@ -54,6 +62,9 @@ class Scenario(BaseScenario):
         )
 
         world.__init__(configuration=reset_configuration)
+        self.world_pool.add(world)
+
+        return world
 
     def benchmark_data(self, agent, world, seller=True):
         #TODO: data for benchmarkign purposes, info_callabck,
@@ -70,22 +81,18 @@ class Scenario(BaseScenario):
             initial_balances.append(factory.initial_balance)
         normalize = all(_ != 0 for _ in initial_balances)
 
-        for _ in world.agents:
-            if world.agents[_].action_callback == "system": continue
-            if world.agents[_] in world.heuristic_agents:
-                if normalize:
-                    profitability.append(
+        for heuristic_agent in world.heuristic_agents:
+            factory = world.factory_of(heuristic_agent.id)
+            if normalize:
+                profitability.append(
                     (agent.state.f[2] - agent.state.f[0]) / agent.state.f[0] -
-                    ([f.current_balance for f in factories if f.agent_id == world.agents[_].id][0] -
-                     [f.initial_balance for f in factories if f.agent_id == world.agents[_].id][0]) /
-                    [f.initial_balance for f in factories if f.agent_id == world.agents[_].id][0]
+                    (factory.current_balance - factory.initial_balance) / factory.initial_balance
+                )
+            else:
+                profitability.append(
+                    (agent.state.f[2] - agent.state.f[0]) -
+                    (factory.current_balance - factory.initial_balance)
                 )
-                else:
-                    profitability.append(
-                        (agent.state.f[2] - agent.state.f[0]) -
-                        ([f.current_balance for f in factories if f.agent_id == world.agents[_].id][0] -
-                         [f.initial_balance for f in factories if f.agent_id == world.agents[_].id][0])
-                    )
 
         return {"profitability": profitability}
 
@@ -118,8 +125,9 @@ class Scenario(BaseScenario):
             if entity is agent: continue
             if entity.action_callback == "system": continue
             if entity.action_callback is None: continue
-            initial_balance = [_.initial_balance for _ in world.factories if _.agent_id == entity.id][0]
-            current_balance = [_.current_balance for _ in world.factories if _.agent_id == entity.id][0]
+            factory = world.factory_of(entity.id)
+            initial_balance = factory.initial_balance
+            current_balance = factory.current_balance
             gap.append((current_balance - initial_balance) / initial_balance)
 
         rew -= np.mean(np.array(gap))
@@ -152,6 +160,19 @@ class Scenario(BaseScenario):
         # return np.concatenate((economic_gaps.flatten(), _obs))
         return _obs
 
+    def observations(self, world: TrainWorld) -> np.ndarray:
+        # batch callback, observations of all policy agents from the state table of world
+        # the same observation for seller and buyer, see observation
+        return world.observations()
+
+    def rewards(self, world: TrainWorld) -> np.ndarray:
+        # batch callback, rewards of all policy agents, the same as reward
+        return world.rewards(rew_factor=REW_FACTOR)
+
+    def dones(self, world: TrainWorld) -> np.ndarray:
+        # batch callback, dones of all policy agents, the same as done
+        return world.dones()
+
     def done(self, agent, world, seller=True):
         # callback of done
         
@@ -159,6 +180,5 @@ class Scenario(BaseScenario):
         if world.world_done:
             return True
 
-        import ipdb
         # agent is brankrupt
-        return [_.is_bankrupt for _ in world.factories if _.agent_id == agent.id][0]
\ No newline at end of file
+        return world.factory_of(agent.id).is_bankrupt
\ No newline at end of file
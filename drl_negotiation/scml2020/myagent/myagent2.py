@@ -79,7 +79,10 @@ def run(competition='std',
          n_steps=20,
          n_configs=2,
          max_n_worlds_per_config=None,
-         n_runs_per_world=1
+         n_runs_per_world=1,
+         parallel=True,
+         max_workers=None,
+         results_file=None,
         ):
     """
     **Not needed for submission.** You can use this function to test your agent.
@@ -93,6 +96,12 @@ def run(competition='std',
                      different number of factories, profiles
                      , production graphs etc
         n_runs_per_world: How many times will each world simulation be run.
+        parallel:    Run the world configurations in a process pool with TournamentRunner,
+                     finished configurations in results_file are skipped.
+        max_workers: Number of worker processes, None means all CPUs.
+        results_file: Scores of the finished configurations (JSON Lines), reused by later runs
+                     with the same competitor names, use a new file after changing an agent.
+                     None means nothing is cached.
 
     Returns:
         None
@@ -105,6 +114,18 @@ def run(competition='std',
     """
     competitors = [MyComponentsBasedAgent, DecentralizingAgent, BuyCheapSellExpensiveAgent]
     start = time.perf_counter()
+    if parallel:
+        from drl_negotiation.tournament import TournamentRunner
+
+        runner = TournamentRunner(
+            competitors, competition=competition, n_steps=n_steps, n_configs=n_configs,
+            n_runs_per_world=n_runs_per_world, max_workers=max_workers,
+            results_file=results_file,
+            )
+        n_failed = runner.run()
+        print(tabulate(runner.total_scores(), headers='keys', tablefmt='psql'))
+        print(f'Finished in {humanize_time(time.perf_counter() - start)}, {n_failed} configurations failed')
+        return
     if competition == 'std':
         results = anac2020_std(
             competitors=competitors, verbose=True, n_steps=n_steps,
@@ -122,4 +143,7 @@ def run(competition='std',
 
 
 if __name__ == '__main__':    
+    import drl_negotiation
+    # logging of the tournament, e.g. the progress of TournamentRunner
+    drl_negotiation.setup()
     run()
@@ -0,0 +1,160 @@
+'''
+    Phase timing of the training loop,
+    time spent in every phase(env.step, world.step, observation, reward, experience, update, save, ...)
+    is aggregated per episode, logged and exported as JSON/CSV.
+'''
+import csv
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+__all__ = [
+    "PhaseTimer",
+    "NULL_TIMER",
+]
+
+
+class _Phase:
+    '''
+        context manager of a single phase, adds the elapsed time to the timer
+    '''
+    __slots__ = ("_timer", "_name", "_start")
+
+    def __init__(self, timer: "PhaseTimer", name: str):
+        self._timer = timer
+        self._name = name
+        self._start = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._timer.add(self._name, time.perf_counter() - self._start)
+        return False
+
+
+class _NullPhase:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class PhaseTimer:
+    '''
+    Accumulates the wall time of named phases, one record per episode.
+    Phases could be nested, e.g. world_step is a part of env_step, the time is counted in both.
+
+    Example:
+        >>> timer = PhaseTimer()
+        >>> with timer.phase("env_step"):
+        ...     env.step(action_n)
+        >>> timer.end_episode()
+        >>> timer.to_json("timing.json")
+    '''
+    def __init__(self, enabled: bool = True):
+        """
+
+        Args:
+            enabled: if False, phase is a no-op context manager and nothing is recorded
+        """
+        self.enabled = enabled
+        # seconds and calls of every phase in the current episode
+        self._seconds = defaultdict(float)
+        self._calls = defaultdict(int)
+        self._episode_start = time.perf_counter()
+        # records of finished episodes
+        self.episodes: List[Dict[str, float]] = []
+        self.phases: List[str] = []
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def add(self, name: str, seconds: float):
+        if name not in self.phases:
+            self.phases.append(name)
+        self._seconds[name] += seconds
+        self._calls[name] += 1
+
+    def end_episode(self, n_episodes: int = 1):
+        '''
+        closes the current record, n_episodes finished together, e.g. in a vectorized env
+        '''
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        record = {"episodes": n_episodes, "duration": now - self._episode_start}
+        for name in self.phases:
+            record[name] = self._seconds.get(name, 0.0)
+            record[name + "_calls"] = self._calls.get(name, 0)
+        self.episodes.append(record)
+        self._seconds.clear()
+        self._calls.clear()
+        self._episode_start = now
+
+    def summary(self, last: Optional[int] = None, last_episodes: Optional[int] = None) -> Dict[str, float]:
+        '''
+        Args:
+            last: only the last records, None means all
+            last_episodes: only the last records which cover this number of episodes,
+                           a record of several episodes(vectorized env) is taken as a whole
+
+        Returns:
+            seconds per episode of every phase, share of phases in the wall time and episodes per second
+        '''
+        records = self.episodes[-last:] if last else self.episodes
+        if last_episodes:
+            n_episodes = 0
+            start = len(records)
+            while start > 0 and n_episodes < last_episodes:
+                start -= 1
+                n_episodes += records[start]["episodes"]
+            records = records[start:]
+        n_episodes = sum(_["episodes"] for _ in records)
+        duration = sum(_["duration"] for _ in records)
+        result = {
+            "episodes": n_episodes,
+            "duration": duration,
+            "episodes_per_second": n_episodes / duration if duration > 0 else 0.0,
+        }
+        for name in self.phases:
+            seconds = sum(_.get(name, 0.0) for _ in records)
+            result[name + "_per_episode"] = seconds / n_episodes if n_episodes else 0.0
+            result[name + "_share"] = seconds / duration if duration > 0 else 0.0
+        return result
+
+    def log(self, last: Optional[int] = None, level=logging.INFO, last_episodes: Optional[int] = None):
+        if not self.enabled or not self.episodes:
+            return
+        summary = self.summary(last, last_episodes=last_episodes)
+        phases = ", ".join(f"{name}: {summary[name + '_per_episode']:.4f}s({summary[name + '_share']:.1%})"
+                           for name in self.phases)
+        logging.log(level, f"timing, episodes/s: {summary['episodes_per_second']:.3f}, per episode: {phases}")
+
+    def to_json(self, file_name: str):
+        with open(file_name, "w") as fp:
+            json.dump({"summary": self.summary(), "episodes": self.episodes}, fp, indent=2)
+
+    def to_csv(self, file_name: str):
+        fields = ["episodes", "duration"]
+        for name in self.phases:
+            fields += [name, name + "_calls"]
+        with open(file_name, "w", newline="") as fp:
+            writer = csv.DictWriter(fp, fieldnames=fields, restval=0)
+            writer.writeheader()
+            writer.writerows(self.episodes)
+
+
+# disabled timer, default of the environments
+NULL_TIMER = PhaseTimer(enabled=False)
@@ -0,0 +1,236 @@
+'''
+    Parallel and resumable ANAC 2020 SCML tournaments.
+
+    Every world configuration(seed) is run by anac2020_std/anac2020_collusion in a worker process,
+    the scores of finished configurations are appended to a JSON Lines file as soon as they arrive.
+    A configuration is skipped if the file already has it under the same (config hash, competitor set) key,
+    an interrupted tournament resumes where it stopped and repeated comparisons reuse the cached scores.
+    Competitors are keyed by their type names, the code of an agent is not part of the key,
+    give a new tag(or a new file) after the agent changes. Without results_file nothing is cached.
+'''
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+__all__ = [
+    "TournamentRunner",
+]
+
+
+def _hash(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def _full_type_name(agent_type) -> str:
+    from negmas.helpers import get_full_type_name
+    return get_full_type_name(agent_type)
+
+
+def _run_config(spec: Dict) -> Dict:
+    '''
+    runs a single world configuration, in a worker process
+    '''
+    from negmas.helpers import get_class
+    from scml.scml2020.utils import anac2020_std, anac2020_collusion
+
+    # the configuration of the world is generated from the seed, the same seed gives the same world
+    random.seed(spec["seed"])
+    np.random.seed(spec["seed"])
+
+    competitors = [get_class(_) for _ in spec["competitors"]]
+    tournament = anac2020_std if spec["competition"] == "std" else anac2020_collusion
+    start = time.perf_counter()
+    results = tournament(
+        competitors=competitors,
+        n_configs=1,
+        n_runs_per_world=spec["n_runs_per_world"],
+        n_steps=spec["n_steps"],
+        verbose=False,
+        parallelism="serial",
+        **spec["kwargs"],
+    )
+    scores = [
+        {"agent_type": str(row["agent_type"]), "score": float(row["score"]), "world": str(row.get("world", ""))}
+        for row in results.scores.to_dict("records")
+    ]
+    return {
+        "config_hash": spec["config_hash"],
+        "competitors_key": spec["competitors_key"],
+        "seed": spec["seed"],
+        "scores": scores,
+        "duration": time.perf_counter() - start,
+    }
+
+
+class TournamentRunner:
+    '''
+    Runs the world configurations of an ANAC 2020 tournament in a process pool,
+    streams the scores to results_file(JSON Lines, one line per configuration) and skips finished configurations.
+
+    Example:
+        >>> runner = TournamentRunner([MyAgent, DecentralizingAgent], n_configs=10, results_file="std.jsonl", tag="v2")
+        >>> runner.run()
+        >>> print(tabulate(runner.total_scores(), headers="keys", tablefmt="psql"))
+    '''
+    def __init__(
+            self,
+            competitors: List,
+            competition: str = "std",
+            n_configs: int = 2,
+            n_runs_per_world: int = 1,
+            n_steps: int = 20,
+            results_file: Optional[str] = None,
+            max_workers: Optional[int] = None,
+            seed: int = 0,
+            tag: str = "",
+            **kwargs,
+    ):
+        """
+
+        Args:
+            competitors: agent types, classes or full type names
+            competition: std or collusion
+            n_configs: number of world configurations, configuration i is generated from seed + i
+            n_runs_per_world: runs of every world
+            n_steps: number of simulation steps
+            results_file: JSON Lines file of the scores, appended, read again when resumed,
+                          None means the scores are kept in memory and nothing is cached
+            max_workers: number of worker processes, None means all CPUs
+            seed: seed of the first configuration
+            tag: version of the competitors, e.g. a commit, part of the competitor set key
+            **kwargs: passed to anac2020_std/anac2020_collusion, part of the config hash
+        """
+        if competition not in ("std", "collusion"):
+            raise ValueError(f'Unknown competition type {competition}')
+
+        self.competitors = [_ if isinstance(_, str) else _full_type_name(_) for _ in competitors]
+        self.competition = competition
+        self.n_configs = n_configs
+        self.n_runs_per_world = n_runs_per_world
+        self.n_steps = n_steps
+        self.results_file = results_file
+        self.max_workers = max_workers
+        self.seed = seed
+        self.tag = tag
+        self.kwargs = kwargs
+        # the order of competitors does not change the set
+        self.competitors_key = _hash({"competitors": sorted(self.competitors), "tag": tag})
+        # records of this runner if there is no results_file
+        self._records = []
+
+    def specs(self) -> List[Dict]:
+        '''
+        all configurations of the tournament
+        '''
+        specs = []
+        for i in range(self.n_configs):
+            config = {
+                "competition": self.competition,
+                "n_steps": self.n_steps,
+                "n_runs_per_world": self.n_runs_per_world,
+                "seed": self.seed + i,
+                "kwargs": self.kwargs,
+            }
+            specs.append(dict(config,
+                              competitors=self.competitors,
+                              config_hash=_hash(config),
+                              competitors_key=self.competitors_key))
+        return specs
+
+    def records(self) -> List[Dict]:
+        '''
+        finished configurations in results_file, of all competitor sets
+        '''
+        if self.results_file is None:
+            return list(self._records)
+        records = []
+        if not os.path.exists(self.results_file):
+            return records
+        with open(self.results_file) as fp:
+            for line in fp:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # the last line is incomplete if the runner was killed while writing
+                    logging.warning(f"skip a broken line in {self.results_file}")
+        return records
+
+    def completed(self) -> Set[Tuple[str, str]]:
+        return {(_["config_hash"], _["competitors_key"]) for _ in self.records()}
+
+    def pending(self) -> List[Dict]:
+        completed = self.completed()
+        return [_ for _ in self.specs() if (_["config_hash"], _["competitors_key"]) not in completed]
+
+    def _append(self, record: Dict):
+        if self.results_file is None:
+            self._records.append(record)
+            return
+        with open(self.results_file, "a") as fp:
+            fp.write(json.dumps(record) + "\n")
+            fp.flush()
+            os.fsync(fp.fileno())
+
+    def run(self) -> int:
+        '''
+        runs the pending configurations
+
+        Returns:
+            number of failed configurations, they are run again next time
+        '''
+        pending = self.pending()
+        logging.info(f"tournament {self.competition}: {self.n_configs - len(pending)} configurations cached, "
+                     f"{len(pending)} to run")
+        if not pending:
+            return 0
+
+        if self.results_file is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.results_file)), exist_ok=True)
+        n_failed = 0
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(_run_config, spec): spec for spec in pending}
+            for i, future in enumerate(as_completed(futures)):
+                spec = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    n_failed += 1
+                    logging.error(f"Error when running the configuration with seed {spec['seed']}: {e}")
+                    continue
+                record["competitors"] = self.competitors
+                self._append(record)
+                logging.info(f"configuration {i + 1}/{len(pending)}, seed {spec['seed']}, "
+                             f"finished in {record['duration']:.1f}s")
+        return n_failed
+
+    def total_scores(self) -> List[Dict]:
+        '''
+        scores of every agent type over the configurations of this tournament, sorted by the mean score
+
+        Returns:
+            [{"agent_type", "score"(mean), "median", "std", "n"}]
+        '''
+        hashes = {_["config_hash"] for _ in self.specs()}
+        scores = {}
+        for record in self.records():
+            if record["competitors_key"] != self.competitors_key or record["config_hash"] not in hashes:
+                continue
+            for _ in record["scores"]:
+                scores.setdefault(_["agent_type"], []).append(_["score"])
+
+        table = [
+            {"agent_type": agent_type, "score": float(np.mean(values)), "median": float(np.median(values)),
+             "std": float(np.std(values)), "n": len(values)}
+            for agent_type, values in scores.items()
+        ]
+        return sorted(table, key=lambda _: _["score"], reverse=True)
@@ -1,4 +1,5 @@
 from .env import NEnv
+from .vec_negotiation_env import VecNegotiationEnv
 from datetime import datetime
 
 MODEL_NEGOTIATION = [
@@ -11,10 +12,20 @@ MODEL_NEGOTIATION = [
     "DDPG",
 ]
 
+# models which could be trained with multiple negotiation sessions, VecNegotiationEnv
+MODEL_NEGOTIATION_VEC = [
+    "PPO2",
+    "A2C",
+    "ACER",
+]
+
 def train_negotiation(plot=True, model="DQN", env=None, monitor=True, num_timesteps=1000, eval_freq=100, eval_episodes=2, seed=721, LOGDIR=None):
     
     if model not in MODEL_NEGOTIATION:
         return False, None
+
+    if isinstance(env, VecNegotiationEnv) and model not in MODEL_NEGOTIATION_VEC:
+        return False, None
     
     import os
     from typing import Optional
@@ -37,6 +48,10 @@ def train_negotiation(plot=True, model="DQN", env=None, monitor=True, num_timest
     
     env = env
 
+    if isinstance(env, VecNegotiationEnv):
+        # N negotiation sessions, seeded with SEED, SEED+1, ...
+        env.seed(SEED)
+
     def _monitor_env(env: Optional[NEnv]=None, monitor: bool=False):
         
         assert isinstance(env,  NEnv), "must set the env corretly!"
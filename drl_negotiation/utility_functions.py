@@ -17,9 +17,36 @@ from negmas.generics import (
 from negmas.utilities import UtilityValue
 
 import random
-from typing import List, Optional, Type, Sequence, Union, Tuple
+import numpy as np
+from typing import List, Optional, Type, Sequence, Union, Tuple, Collection
 
-class ANegmaUtilityFunction(UtilityFunction):
+class BatchUtilityMixIn:
+    """
+        Evaluate many outcomes with a single vectorized call,
+        used by negmas when all outcomes are evaluated at once(eval_all), e.g. presorting
+        outcomes in AspirationNegotiator, and by NormalizedUtilityTable.
+
+    Abstract method:
+        eval_batch
+    """
+    def eval_batch(self, outcomes: np.ndarray) -> np.ndarray:
+        """
+
+        Args:
+            outcomes: (n_outcomes, n_issues)
+
+        Returns:
+            utility values, (n_outcomes, )
+        """
+        raise NotImplementedError("Error: function eval_batch has not been implemented!")
+
+    def eval_all(self, outcomes: List["Outcome"]) -> List[UtilityValue]:
+        outcomes = list(outcomes)
+        if not outcomes or any(_ is None or isinstance(_, dict) for _ in outcomes):
+            return super().eval_all(outcomes)
+        return self.eval_batch(np.array([outcome_as_tuple(_) for _ in outcomes], dtype=np.float64)).tolist()
+
+class ANegmaUtilityFunction(BatchUtilityMixIn, UtilityFunction):
     """
         Idea comes from ANegma, single issue
     """
@@ -65,10 +92,17 @@ class ANegmaUtilityFunction(UtilityFunction):
                     ((getattr(self.ami.state, self.factor)+1.0) / float(self.max_t)) ** self.delta
         return self.reserved_value
 
+    def eval_batch(self, outcomes: np.ndarray) -> np.ndarray:
+        outcomes = np.atleast_2d(np.asarray(outcomes, dtype=np.float64))
+        if self.ami:
+            return ((float(self.rp) - outcomes[:, 0]) / (float(self.rp) - float(self.ip))) * \
+                    ((getattr(self.ami.state, self.factor)+1.0) / float(self.max_t)) ** self.delta
+        return np.full(len(outcomes), self.reserved_value, dtype=np.float64)
+
     def xml(self, issues: List[Issue]) -> str:
         pass
     
-class MyUtilityFunction(UtilityFunction):
+class MyUtilityFunction(BatchUtilityMixIn, UtilityFunction):
     r""" Model My utility function, linear utility function with discount factor based on relative time
     
     Info:
@@ -134,6 +168,16 @@ class MyUtilityFunction(UtilityFunction):
             return sum(w * v for w, v in zip(self.weights, offer))
         else:
             return sum(w * v for w, v in zip(self.weights, offer))
+
+    def eval_batch(self, outcomes: np.ndarray) -> np.ndarray:
+        '''
+        weighted sum of all outcomes, a single dot product
+        '''
+        outcomes = np.atleast_2d(np.asarray(outcomes, dtype=np.float64))
+        weights = np.asarray(self.weights, dtype=np.float64)
+        # as same as zip in eval, extra issues or weights are ignored
+        n = min(outcomes.shape[1], len(weights))
+        return outcomes[:, :n] @ weights[:n]
     
     def xml(self, issues: List[Issue]) -> str:
         output = ""
@@ -156,4 +200,88 @@ class MyUtilityFunction(UtilityFunction):
     def __str__(self):
         return f"w: {self.weights}, delta: {self.delta}, factor: {self.factor}"
 
+class NormalizedUtilityTable:
+    """
+        Normalized utility values of all outcomes, same semantics as
+        negmas.normalize(ufun, outcomes, rng), but built once per episode.
+
+    Info:
+        values[i] is the normalized utility of outcomes[i],
+        looking up an outcome of the outcome space is O(1).
+
+        Normalized utilities do not change under a positive rescaling of the ufun,
+        which is how the time enters ANegmaUtilityFunction, so the table stays valid
+        during the whole episode. Outcomes out of the outcome space, e.g. continuous offers,
+        are normalized with the current utilities of the worst and best outcome.
+
+    Args:
+        ufun: utility function, MyUtilityFunction, ANegmaUtilityFunction, MappingUtilityFunction ...
+        outcomes: all outcomes of the negotiation, e.g. ami.outcomes
+        rng: range of normalized utility
+        epsilon: resolution, the same as negmas.normalize
+    """
+    def __init__(
+            self,
+            ufun: UtilityFunction,
+            outcomes: Collection[Outcome],
+            rng: Tuple[float, float] = (-1, 1),
+            epsilon: float = 1e-6,
+    ):
+        self.ufun = ufun
+        self.rng = rng
+        self.epsilon = epsilon
+        self.outcomes = [outcome_as_tuple(_) for _ in outcomes]
+        self._index = {outcome: i for i, outcome in enumerate(self.outcomes)}
+
+        utilities = self._eval_all()
+        if len(utilities) and not np.isnan(utilities).all():
+            self._worst = self.outcomes[int(np.nanargmin(utilities))]
+            self._best = self.outcomes[int(np.nanargmax(utilities))]
+            self.scale, self.offset = self._affine(np.nanmin(utilities), np.nanmax(utilities))
+        else:
+            self._worst, self._best = None, None
+            self.scale, self.offset = 1.0, 0.0
+
+        self.values = self.scale * utilities + self.offset
+
+    def __len__(self):
+        return len(self.outcomes)
+
+    def __call__(self, outcome: Optional[Outcome]) -> Optional[float]:
+        if outcome is None:
+            return self.ufun(outcome)
+
+        index = self._index.get(outcome_as_tuple(outcome), None)
+        if index is not None:
+            return float(self.values[index])
+
+        # outcome out of the outcome space
+        utility = self.ufun(outcome)
+        if utility is None or self._worst is None:
+            return utility
+        scale, offset = self._affine(float(self.ufun(self._worst)), float(self.ufun(self._best)))
+        return scale * float(utility) + offset
+
+    def _eval_all(self) -> np.ndarray:
+        if isinstance(self.ufun, BatchUtilityMixIn) and self.outcomes:
+            return np.asarray(self.ufun.eval_batch(np.array(self.outcomes, dtype=np.float64)), dtype=np.float64)
+        utilities = [self.ufun(outcome) for outcome in self.outcomes]
+        return np.array([np.nan if _ is None else float(_) for _ in utilities], dtype=np.float64)
+
+    def _affine(self, mn: float, mx: float) -> Tuple[float, float]:
+        """
+        normalized utility = scale * utility + offset, the same cases as negmas.normalize
+        """
+        rng, epsilon = self.rng, self.epsilon
+        if abs(mx - 1.0) < epsilon and abs(mn) < epsilon:
+            return 1.0, 0.0
+        if mx == mn:
+            if -epsilon <= mn <= 1 + epsilon:
+                return 1.0, 0.0
+            return 0.5 / mn, 0.0
+        scale = (rng[1] - rng[0]) / (mx - mn)
+        if abs(mn - rng[0] / scale) < epsilon:
+            return 1.0, 0.0
+        return scale, rng[0] - scale * mn
+
 MyOpponentUtilityFunction = MappingUtilityFunction(lambda x: random.random() * x[0])
\ No newline at end of file
@@ -0,0 +1,181 @@
+'''
+    Vectorized environments, run several environments at the same time
+    in order to collect more transitions per python-level step.
+
+    VecNegotiationEnv lives in vec_negotiation_env and is imported lazily,
+    importing this module(e.g. in the workers of SubprocVecSCMLEnv) does not import tensorflow.
+'''
+import multiprocessing
+from types import SimpleNamespace
+from typing import Callable, List, Optional
+
+import numpy as np
+
+from drl_negotiation.env import SCMLEnv
+
+__all__ = [
+    "VecNegotiationEnv",
+    "SubprocVecSCMLEnv",
+]
+
+
+
+def __getattr__(name):
+    """
+        forwards VecNegotiationEnv, stable_baselines and tensorflow are imported at the first access
+    """
+    if name == "VecNegotiationEnv":
+        from drl_negotiation.vec_negotiation_env import VecNegotiationEnv
+        globals()[name] = VecNegotiationEnv
+        return VecNegotiationEnv
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+####################################################################################################
+# For SCML
+#
+#
+####################################################################################################
+
+def _scml_worker(remote, parent_remote, env_fn: Callable[[], SCMLEnv], max_episode_len: Optional[int]):
+    '''
+        Runs a single SCMLEnv/TrainWorld in a worker process,
+        receives commands from the parent through the pipe.
+    '''
+    parent_remote.close()
+    env = env_fn()
+    episode_step = 0
+    try:
+        while True:
+            cmd, data = remote.recv()
+            if cmd == "step":
+                obs_n, rew_n, done_n, info_n = env.step(data)
+                episode_step += 1
+                # the same terminal condition as used in MADDPGModel.learn
+                terminal = max_episode_len is not None and episode_step > max_episode_len
+                info_n["terminal"] = terminal
+                if all(done_n) or terminal:
+                    # auto reset the finished world, keep the last observation for the replay buffer
+                    info_n["terminal_observation"] = obs_n
+                    obs_n = env.reset()
+                    episode_step = 0
+                remote.send((obs_n, rew_n, done_n, info_n))
+            elif cmd == "reset":
+                episode_step = 0
+                remote.send(env.reset())
+            elif cmd == "get_spaces":
+                remote.send((
+                    env.observation_space,
+                    env.action_space,
+                    env.n,
+                    [agent.name for agent in env.agents]
+                ))
+            elif cmd == "close":
+                env.close()
+                remote.close()
+                break
+            else:
+                raise NotImplementedError(f"Unknown command {cmd} in SCML worker!")
+    except KeyboardInterrupt:
+        print("SubprocVecSCMLEnv worker: got KeyboardInterrupt")
+
+
+class SubprocVecSCMLEnv:
+    '''
+    Runs K SCMLEnv(TrainWorld) in worker processes, steps them in parallel.
+
+    Observations, rewards and dones are stacked per agent(seller/buyer),
+        obs_n[i]: (K, obs_dim_i),
+        rew_n[i]: (K, ),
+        done_n[i]: (K, ),
+        info_n: list of K info dicts, one for every world
+
+    Finished worlds are reset automatically in the worker, the last observation
+    of the finished episode is stored in info_n[k]["terminal_observation"].
+
+    Example:
+        >>> env = SubprocVecSCMLEnv([functools.partial(make_env, "scml")] * 4, max_episode_len=10)
+    '''
+    def __init__(
+            self,
+            env_fns: List[Callable[[], SCMLEnv]],
+            max_episode_len: Optional[int] = None,
+            start_method: Optional[str] = None,
+    ):
+        """
+
+        Args:
+            env_fns: functions which create SCMLEnv, must be picklable, e.g. functools.partial(make_env, "scml")
+            max_episode_len: the worker resets the world after max_episode_len steps, None means only reset when done
+            start_method: start method of multiprocessing, default is forkserver if available, otherwise spawn
+        """
+        self.waiting = False
+        self.closed = False
+        self.num_envs = len(env_fns)
+        self.max_episode_len = max_episode_len
+
+        if start_method is None:
+            # fork is not safe after tensorflow session created
+            forkserver_available = "forkserver" in multiprocessing.get_all_start_methods()
+            start_method = "forkserver" if forkserver_available else "spawn"
+        ctx = multiprocessing.get_context(start_method)
+
+        self.remotes, self.work_remotes = zip(*[ctx.Pipe(duplex=True) for _ in range(self.num_envs)])
+        self.processes = []
+        for work_remote, remote, env_fn in zip(self.work_remotes, self.remotes, env_fns):
+            args = (work_remote, remote, env_fn, max_episode_len)
+            process = ctx.Process(target=_scml_worker, args=args, daemon=True)
+            process.start()
+            self.processes.append(process)
+            work_remote.close()
+
+        self.remotes[0].send(("get_spaces", None))
+        self.observation_space, self.action_space, self.n, agent_names = self.remotes[0].recv()
+        # light-weight agents, the trainers only need the name of agents
+        self.agents = [SimpleNamespace(name=name) for name in agent_names]
+
+    def step_async(self, action_n: List[np.ndarray]):
+        '''
+        Args:
+            action_n: actions of all agents, action_n[i] is (K, act_dim_i)
+        '''
+        for k, remote in enumerate(self.remotes):
+            remote.send(("step", [action[k] for action in action_n]))
+        self.waiting = True
+
+    def step_wait(self):
+        results = [remote.recv() for remote in self.remotes]
+        self.waiting = False
+        obs, rews, dones, infos = zip(*results)
+        return self._stack(obs), np.array(rews, dtype=np.float32).T, np.array(dones, dtype=bool).T, list(infos)
+
+    def step(self, action_n: List[np.ndarray]):
+        self.step_async(action_n)
+        return self.step_wait()
+
+    def reset(self) -> List[np.ndarray]:
+        for remote in self.remotes:
+            remote.send(("reset", None))
+        return self._stack([remote.recv() for remote in self.remotes])
+
+    def render(self, mode="human"):
+        pass
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            for remote in self.remotes:
+                remote.recv()
+        for remote in self.remotes:
+            remote.send(("close", None))
+        for process in self.processes:
+            process.join()
+        self.closed = True
+
+    @staticmethod
+    def _stack(obs) -> List[np.ndarray]:
+        '''
+            [K][n_agents](obs_dim, ) -> [n_agents](K, obs_dim)
+        '''
+        return [np.stack([_[i] for _ in obs]) for i in range(len(obs[0]))]
@@ -0,0 +1,143 @@
+'''
+    Vectorized negotiation sessions for the models of stable_baselines.
+
+    Separated from vec_env, stable_baselines imports tensorflow, the workers of SubprocVecSCMLEnv do not need it.
+'''
+from typing import Callable, List, Dict
+
+import numpy as np
+from stable_baselines.common.vec_env import VecEnv
+
+from drl_negotiation.env import NegotiationEnv
+from drl_negotiation.game import NegotiationGame
+from drl_negotiation.negotiator import MyDRLNegotiator, MyOpponentNegotiator
+from drl_negotiation.utility_functions import MyUtilityFunction
+from drl_negotiation.utils import genearate_observation_space, generate_action_space
+
+__all__ = [
+    "VecNegotiationEnv",
+]
+
+
+class VecNegotiationEnv(VecEnv):
+    '''
+    Runs N independent negotiation sessions(SAOMechanism) in the same process,
+    every session is driven by its own NegotiationEnv/NegotiationGame with its own
+    negotiators, e.g. MyDRLNegotiator and MyOpponentNegotiator.
+
+    Implements the VecEnv interface of stable_baselines, can be passed to the models
+    which support multiple environments, e.g. A2C, ACER, PPO2 in train.train_negotiation.
+
+    step(actions):
+        actions: (N, ) for acceptance strategy, (N, n_issues) for offer strategy
+        returns: obs (N, obs_dim), rewards (N, ), dones (N, ), infos
+
+    Sessions which finish are reset immediately, the others are not affected.
+    The last observation of the finished session is stored in infos[i]["terminal_observation"].
+    '''
+    def __init__(self, env_fns: List[Callable[[], NegotiationEnv]]):
+        """
+
+        Args:
+            env_fns: functions which create NegotiationEnv, every env must own its game and negotiators
+        """
+        self.envs = [fn() for fn in env_fns]
+        games = set(id(env.game) for env in self.envs)
+        assert len(games) == len(self.envs), "Error, every negotiation session must own its NegotiationGame!"
+
+        env = self.envs[0]
+        super().__init__(len(self.envs), env.observation_space, env.action_space)
+        self.actions = None
+
+    @classmethod
+    def from_config(cls, n_envs: int, config: Dict, strategy="ac_s", name="vec_negotiation_env"):
+        """
+        Creates n_envs negotiation sessions, with the config generated by utils.generate_config
+
+        Args:
+            n_envs: number of negotiation sessions
+            config: config of game, issues, weights and n_steps
+            strategy: ac_s or of_s
+
+        Returns:
+            VecNegotiationEnv
+        """
+        if strategy == "ac_s":
+            action_space = 3
+        else:
+            action_space = generate_action_space(config)
+
+        def make_env(index):
+            def _init():
+                game = NegotiationGame(
+                    name=f"{name}_game_{index}",
+                    game_type="DRLNegotiation",
+                    issues=config.get("issues"),
+                    competitors=[
+                        MyDRLNegotiator(
+                            name=f"my_drl_negotiator_{index}",
+                            ufun=MyUtilityFunction(weights=config.get("weights")[0]),
+                            init_proposal=False,
+                        ),
+                        MyOpponentNegotiator(
+                            name=f"my_opponent_negotiator_{index}",
+                            ufun=MyUtilityFunction(weights=config.get("weights")[1])
+                        )
+                    ],
+                    n_steps=config.get("n_steps")
+                )
+                return NegotiationEnv(
+                    name=f"{name}_{index}",
+                    game=game,
+                    strategy=strategy,
+                    observation_space=genearate_observation_space(config),
+                    action_space=action_space,
+                )
+            return _init
+
+        return cls([make_env(i) for i in range(n_envs)])
+
+    def reset(self) -> np.ndarray:
+        return np.stack([env.reset() for env in self.envs]).astype(np.float32)
+
+    def step_async(self, actions):
+        self.actions = actions
+
+    def step_wait(self):
+        obs = []
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = []
+        for i, env in enumerate(self.envs):
+            _obs, rewards[i], dones[i], info = env.step(action=self.actions[i])
+            if dones[i]:
+                # reset the finished session, the other sessions go on
+                info["terminal_observation"] = _obs
+                _obs = env.reset()
+            obs.append(_obs)
+            infos.append(info)
+        return np.stack(obs).astype(np.float32), rewards, dones, infos
+
+    def close(self):
+        for env in self.envs:
+            env.close()
+
+    def seed(self, seed=None):
+        return [env.seed(seed + i if seed is not None else None) for i, env in enumerate(self.envs)]
+
+    def get_attr(self, attr_name, indices=None):
+        return [getattr(env, attr_name) for env in self._get_target_envs(indices)]
+
+    def set_attr(self, attr_name, value, indices=None):
+        for env in self._get_target_envs(indices):
+            setattr(env, attr_name, value)
+
+    def env_method(self, method_name, *method_args, indices=None, **method_kwargs):
+        return [getattr(env, method_name)(*method_args, **method_kwargs) for env in self._get_target_envs(indices)]
+
+    def get_images(self, *args, **kwargs):
+        return [env.render(mode="rgb_array") for env in self.envs]
+
+    def _get_target_envs(self, indices):
+        indices = self._get_indices(indices)
+        return [self.envs[i] for i in indices]
@@ -128,5 +128,7 @@ def train(arglist):
                 break
 
 if __name__ == '__main__':
+    import drl_negotiation
+    drl_negotiation.setup()
     arglist = U.parse_args()
     train(arglist)
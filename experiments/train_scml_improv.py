@@ -1,15 +1,29 @@
 from drl_negotiation.a2c.a2c import MADDPGModel
-from drl_negotiation.utils import make_env
+from drl_negotiation.utils import make_env, make_vec_env
 from drl_negotiation.hyperparameters import *
+import functools
 import logging
+import drl_negotiation
+
+drl_negotiation.setup()
 
 # make environment
 env = make_env('scml', save_config=SAVE_WORLD_CONFIG, load_config=LOAD_WORLD_CONFIG, save_dir=SAVE_WORLD_CONFIG_DIR, load_dir=LOAD_WORLD_CONFIG_DIR)
 
 # train model
 if TRAIN:
-    model = MADDPGModel(env=env, verbose=0, logging_level=logging.DEBUG, restore=RESTORE)
+    if N_ENVS > 1:
+        # collect rollouts from N_ENVS worlds in parallel
+        train_env = make_vec_env('scml', n_envs=N_ENVS, max_episode_len=MAX_EPISODE_LEN,
+                                 load_config=LOAD_WORLD_CONFIG, load_dir=LOAD_WORLD_CONFIG_DIR)
+    else:
+        train_env = env
+    # rollout workers of the asynchronous actor/learner training build their worlds with env_fn
+    env_fn = functools.partial(make_env, 'scml', load_config=LOAD_WORLD_CONFIG, load_dir=LOAD_WORLD_CONFIG_DIR)
+    model = MADDPGModel(env=train_env, verbose=0, logging_level=logging.DEBUG, restore=RESTORE, env_fn=env_fn)
     model.learn(train_episodes=TRAIN_EPISODES)
+    if N_ENVS > 1:
+        train_env.close()
 
 # reset the environment
 obs_n = env.reset()
@@ -0,0 +1,96 @@
+import functools
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow").compat.v1
+
+
+class _StubEnv:
+    '''
+    env of two agents without SCML, picklable for the rollout workers
+    '''
+    def __init__(self, obs_dim=3):
+        from gym import spaces
+        self.obs_dim = obs_dim
+        self.action_space = [spaces.Discrete(3), spaces.Box(low=-1, high=1, shape=(2, ))]
+        self.n_steps = 0
+
+    def _obs(self):
+        return [np.full(self.obs_dim, self.n_steps, dtype=np.float32) for _ in self.action_space]
+
+    def reset(self):
+        self.n_steps = 0
+        return self._obs()
+
+    def step(self, action_n):
+        self.n_steps += 1
+        return self._obs(), [1.0] * len(action_n), [False] * len(action_n), {"n": [{}] * len(action_n)}
+
+    def close(self):
+        pass
+
+
+def _receive(rollouts, until, timeout=300):
+    records = []
+    start = time.time()
+    while not until(records):
+        assert time.time() - start < timeout, "Error, no transitions from the rollout workers!"
+        records.extend(rollouts.receive(timeout=1.0))
+    return records
+
+
+def test_async_rollouts():
+    """
+    Test AsyncRollouts with a stub env, transitions are tagged with the broadcast version,
+    stale transitions are dropped and close joins the workers
+    """
+    import drl_negotiation.utils as U
+    from drl_negotiation.a2c.async_rollouts import AsyncRollouts, is_stale
+    from drl_negotiation.a2c.policy import mlp_model
+    from drl_negotiation.a2c.trainer import p_predict
+
+    env = _StubEnv()
+    obs_shape_n = [(env.obs_dim, )] * len(env.action_space)
+    graph = tf.Graph()
+    with graph.as_default(), U.make_session(num_cpu=1, graph=graph).as_default() as sess:
+        trainers = []
+        for i, act_space in enumerate(env.action_space):
+            obs_ph = U.BatchInput(obs_shape_n[i], name=f"observation_{i}").get()
+            _, p_debug = p_predict(obs_ph, act_space, mlp_model, num_units=8, scope=f"agent_{i}")
+            trainers.append(SimpleNamespace(name=f"agent_{i}", agent_index=i, p_debug=p_debug))
+        sess.run(tf.global_variables_initializer())
+
+        env_fns = [functools.partial(_StubEnv, obs_dim=env.obs_dim)] * 2
+        rollouts = AsyncRollouts(env_fns, trainers, obs_shape_n, env.action_space,
+                                 num_units=8, max_episode_len=2, chunk_size=2, max_queue_size=4)
+        try:
+            rollouts.broadcast(3)
+            records = _receive(rollouts, lambda received: {worker_id for worker_id, _ in received} == {0, 1})
+            assert all(record[-1] == 3 for _, record in records)
+
+            rollouts.broadcast(10)
+            records += _receive(rollouts, lambda received: any(record[-1] == 10 for _, record in received))
+        finally:
+            rollouts.close()
+
+    assert rollouts.closed
+    assert all(not process.is_alive() for process in rollouts.processes)
+
+    # (obs_n, act_n, rew_n, obs_next_n, done_n, terminal, episode_end, version)
+    for _, record in records:
+        assert len(record[0]) == len(record[1]) == len(record[2]) == 2
+        assert record[-1] in (3, 10)
+    for worker_id in (0, 1):
+        versions = [record[-1] for _, record in records if _ == worker_id]
+        # a worker never goes back to older weights
+        assert versions == sorted(versions)
+
+    # the learner at step 10 keeps the transitions of version 10 only
+    kept = [record for _, record in records if not is_stale(record[-1], train_step=10, max_staleness=5)]
+    assert kept and all(record[-1] == 10 for record in kept)
+    assert len(kept) < len(records)
+    assert not is_stale(3, train_step=8, max_staleness=5)
+    assert not is_stale(3, train_step=100, max_staleness=None)
@@ -0,0 +1,88 @@
+import glob
+import threading
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow").compat.v1
+
+
+def _training_graph():
+    graph = tf.Graph()
+    with graph.as_default():
+        with tf.variable_scope("agent_0/p_func"):
+            kernel = tf.get_variable("kernel", [3, 2], initializer=tf.zeros_initializer())
+            bias = tf.get_variable("bias", [2], initializer=tf.zeros_initializer())
+    return graph, [kernel, bias]
+
+
+def test_checkpoint_writer(tmp_path, monkeypatch):
+    """
+    Test CheckpointWriter, the oldest pending snapshots are dropped while the writer is blocked,
+    only the last max_to_keep checkpoints are kept and they are restored with the names of the training graph
+    """
+    import drl_negotiation.utils as U
+    from drl_negotiation.a2c.checkpoint import CheckpointWriter
+
+    # the background thread blocks in the first write until it is released
+    writing, release = threading.Event(), threading.Event()
+    write = CheckpointWriter._write
+
+    def blocked_write(self, sess, step, values):
+        writing.set()
+        release.wait()
+        write(self, sess, step, values)
+
+    monkeypatch.setattr(CheckpointWriter, "_write", blocked_write)
+
+    save_dir = str(tmp_path) + "/"
+    graph, variables = _training_graph()
+    with graph.as_default(), U.make_session(num_cpu=1, graph=graph).as_default() as sess:
+        sess.run(tf.global_variables_initializer())
+        writer = CheckpointWriter(variables, save_dir, "model", max_to_keep=2, max_pending=2)
+        values = {}
+        for step in range(1, 7):
+            for var in variables:
+                var.load(np.full(var.get_shape().as_list(), step, dtype=np.float32), sess)
+            values[step] = sess.run(variables)
+            writer.save(step)
+            if step == 1:
+                assert writing.wait(timeout=60)
+        # step 1 is written, 2, 3 and 4 are dropped for 5 and 6
+        assert writer.n_dropped == 3
+        release.set()
+        writer.close()
+
+    assert writer.error is None and writer.n_written == 3
+    assert sorted(glob.glob(save_dir + "model-*.index")) == [save_dir + "model-5.index", save_dir + "model-6.index"]
+
+    # a fresh graph with the same variable names
+    graph, variables = _training_graph()
+    with graph.as_default(), U.make_session(num_cpu=1, graph=graph).as_default() as sess:
+        tf.train.Saver(variables).restore(sess, tf.train.latest_checkpoint(save_dir))
+        for value, restored in zip(values[6], sess.run(variables)):
+            assert np.array_equal(value, restored)
+
+
+def test_checkpoint_writer_error(tmp_path, monkeypatch):
+    """
+    Test CheckpointWriter without a session, the snapshots are consumed and close does not hang
+    """
+    import drl_negotiation.utils as U
+    from drl_negotiation.a2c.checkpoint import CheckpointWriter
+
+    def make_session(*args, **kwargs):
+        raise RuntimeError("no session")
+
+    monkeypatch.setattr(U, "make_session", make_session)
+    graph, variables = _training_graph()
+    with graph.as_default(), tf.Session(graph=graph).as_default() as sess:
+        sess.run(tf.global_variables_initializer())
+        writer = CheckpointWriter(variables, str(tmp_path) + "/", "model", max_pending=1)
+        for step in range(3):
+            writer.save(step)
+        writer.close()
+
+    assert isinstance(writer.error, RuntimeError)
+    assert writer.n_written == 0 and writer.closed
+    assert not glob.glob(str(tmp_path) + "/model-*")
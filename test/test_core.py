@@ -0,0 +1,135 @@
+import random
+from collections import Counter
+
+import numpy as np
+from scml.scml2020 import SCML2020World, SCML2020Agent, DecentralizingAgent
+from scml.scml2020 import StepNegotiationManager, PredictionBasedTradingStrategy, SupplyDrivenProductionStrategy
+from scml.scml2020.agents.decentralizing import _NegotiationCallbacks
+from drl_negotiation.core import MySCML2020Agent, TrainWorld
+
+
+def _scan(agent, negotiations):
+    '''
+    counts of the negotiations by scanning them, sell, buy
+    '''
+    sell = sum(1 for _ in negotiations if _.annotation.get("seller", None) == agent.id)
+    buy = sum(1 for _ in negotiations if _.annotation.get("buyer", None) == agent.id)
+    return sell, buy
+
+
+class CheckedAgent(
+    _NegotiationCallbacks,
+    StepNegotiationManager,
+    PredictionBasedTradingStrategy,
+    SupplyDrivenProductionStrategy,
+    MySCML2020Agent
+):
+    '''
+    compares the incremental counters with a scan of the negotiations after every lifecycle callback
+    '''
+    events = Counter()
+
+    def _check(self, event):
+        assert self.running_negotiations == _scan(self, SCML2020Agent.running_negotiations.fget(self)), event
+        assert self.negotiation_requests == _scan(self, SCML2020Agent.negotiation_requests.fget(self)), event
+        type(self).events[event] += 1
+
+    def create_negotiation_request(self, *args, **kwargs):
+        req_id = super().create_negotiation_request(*args, **kwargs)
+        self._check("request")
+        return req_id
+
+    def on_neg_request_rejected_(self, *args, **kwargs):
+        super().on_neg_request_rejected_(*args, **kwargs)
+        self._check("reject")
+
+    def on_neg_request_accepted_(self, *args, **kwargs):
+        super().on_neg_request_accepted_(*args, **kwargs)
+        self._check("accept")
+
+    def on_negotiation_failure_(self, *args, **kwargs):
+        super().on_negotiation_failure_(*args, **kwargs)
+        self._check("failure")
+
+    def on_negotiation_success_(self, *args, **kwargs):
+        super().on_negotiation_success_(*args, **kwargs)
+        self._check("success")
+
+
+class RejectingAgent(DecentralizingAgent):
+    '''
+    rejects every other negotiation request
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._n_requests = 0
+
+    def respond_to_negotiation_request(self, *args, **kwargs):
+        self._n_requests += 1
+        if self._n_requests % 2:
+            return None
+        return super().respond_to_negotiation_request(*args, **kwargs)
+
+
+def test_negotiation_counters():
+    """
+    Test the incremental counters of MySCML2020Agent, the same as scanning the negotiations
+    after request, reject, accept, failure and success
+    """
+    CheckedAgent.events.clear()
+    world = SCML2020World(
+        **SCML2020World.generate(
+            agent_types=[CheckedAgent, RejectingAgent],
+            n_steps=10,
+        )
+    )
+    checked = [_ for _ in world.agents.values() if isinstance(_, CheckedAgent)]
+    assert checked
+
+    for _ in range(world.n_steps):
+        if not world.step():
+            break
+        for agent in checked:
+            agent._check("step")
+
+    assert all(CheckedAgent.events[_] > 0 for _ in ("request", "reject", "accept", "failure", "success")), \
+        CheckedAgent.events
+
+
+def _step(env, world, n_steps):
+    '''
+    steps the world in env with random actions of the policy agents
+    '''
+    env.world = world
+    env.agents = world.policy_agents
+    for agent in env.agents:
+        world.update_agent_state(agent)
+    world.update_state_table()
+    for _ in range(n_steps):
+        env.step([np.eye(space.n)[np.random.randint(space.n)] if hasattr(space, "n") else space.sample()
+                  for space in env.action_space])
+
+
+def test_train_world_snapshot():
+    """
+    Test TrainWorld.snapshot and restore, stepping a restored world changes neither the snapshot nor the other copies
+    """
+    from drl_negotiation.utils import make_env
+
+    random.seed(0)
+    np.random.seed(0)
+    env = make_env("scml")
+    snapshot = env.world.snapshot()
+    stepped, other = TrainWorld.restore(snapshot), TrainWorld.restore(snapshot)
+    assert stepped.factories[0] is not other.factories[0]
+    assert stepped.policy_agents[0] is not other.policy_agents[0]
+    balances = [_.current_balance for _ in other.factories]
+    states = [np.copy(_.state.f) for _ in other.policy_agents]
+
+    _step(env, stepped, 4)
+    assert stepped.current_step == 4 and stepped.saved_contracts
+    for world in (other, TrainWorld.restore(snapshot)):
+        assert world.current_step == 0
+        assert not world.saved_contracts
+        assert [_.current_balance for _ in world.factories] == balances
+        assert all(np.array_equal(np.copy(agent.state.f), state) for agent, state in zip(world.policy_agents, states))
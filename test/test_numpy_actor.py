@@ -0,0 +1,85 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from drl_negotiation.a2c.numpy_actor import NumpyActor, save_actors, load_actors
+
+
+def _weights(scope, sizes):
+    return [(f"{scope}/p_func/{name}/{kind}", np.random.randn(*shape).astype(np.float32))
+            for name, (n_in, n_out) in zip(["dense", "dense_1", "dense_2"], zip(sizes[:-1], sizes[1:]))
+            for kind, shape in (("kernel", (n_in, n_out)), ("bias", (n_out, )))]
+
+
+def test_numpy_actor(tmp_path):
+    """
+    Test export and load of actors, output of NumpyActor
+    """
+    file_name = str(tmp_path / "actors.npz")
+    seller = _weights("a-0_seller", [6, 8, 8, 5])
+    buyer = _weights("a-0_buyer", [6, 8, 8, 4])
+    save_actors(file_name, {
+        "a-0_seller": {"weights": seller, "distribution": "soft_categorical", "size": 5},
+        "a-0_buyer": {"weights": buyer, "distribution": "diag_gaussian", "size": 2},
+    })
+
+    actors = load_actors(file_name, seed=0)
+    assert set(actors) == {"a-0_seller", "a-0_buyer"}
+
+    obs = np.random.randn(3, 6).astype(np.float32)
+    # dense, relu, dense, relu, dense
+    w = [value for _, value in seller]
+    expected = np.maximum(np.maximum(obs @ w[0] + w[1], 0) @ w[2] + w[3], 0) @ w[4] + w[5]
+    assert np.allclose(actors["a-0_seller"].p_values(obs), expected, atol=1e-5)
+
+    act = actors["a-0_seller"](obs)
+    assert act.shape == (3, 5)
+    assert np.allclose(act.sum(axis=-1), 1.0, atol=1e-5)
+
+    act = actors["a-0_buyer"](obs)
+    assert act.shape == (3, 2)
+    assert np.allclose(actors["a-0_buyer"].mode(obs), actors["a-0_buyer"].p_values(obs)[:, :2])
+
+
+def test_numpy_actor_seed():
+    layers = [(np.ones((2, 3), dtype=np.float32), np.zeros(3, dtype=np.float32))]
+    obs = np.ones((1, 2))
+    assert np.array_equal(NumpyActor(layers, "soft_categorical", 3, seed=1)(obs),
+                          NumpyActor(layers, "soft_categorical", 3, seed=1)(obs))
+
+def test_numpy_actor_tf(tmp_path):
+    """
+    Test NumpyActor against p_predict, the same p_values and mode as tensorflow for Discrete and Box
+    """
+    tf = pytest.importorskip("tensorflow").compat.v1
+    import drl_negotiation.utils as U
+    from gym import spaces
+    from drl_negotiation.a2c.distributions import make_pd_type
+    from drl_negotiation.a2c.policy import mlp_model
+    from drl_negotiation.a2c.trainer import p_predict
+    from drl_negotiation.a2c.numpy_actor import export_actors
+
+    file_name = str(tmp_path / "actors.npz")
+    act_spaces = {"a-0_seller": spaces.Discrete(5), "a-0_buyer": spaces.Box(low=-1, high=1, shape=(2, ))}
+    obs = np.random.randn(4, 6).astype(np.float32)
+    graph = tf.Graph()
+    with graph.as_default(), U.make_session(num_cpu=1, graph=graph).as_default() as sess:
+        trainers, p_values, modes = [], {}, {}
+        for scope, act_space in act_spaces.items():
+            obs_ph = U.BatchInput((6, ), name=f"observation_{len(trainers)}").get()
+            act, p_debug = p_predict(obs_ph, act_space, mlp_model, num_units=8, scope=scope)
+            trainers.append(SimpleNamespace(name=scope, act_space=act_space, p_debug=p_debug))
+        sess.run(tf.global_variables_initializer())
+        export_actors(trainers, file_name)
+
+        for trainer in trainers:
+            p_values[trainer.name] = trainer.p_debug["p_values"](obs)
+            pd = make_pd_type(trainer.act_space).proba_distribution_from_flat(tf.constant(p_values[trainer.name]))
+            modes[trainer.name] = sess.run(pd.mode())
+
+    actors = load_actors(file_name)
+    for scope in act_spaces:
+        assert np.allclose(actors[scope].p_values(obs), p_values[scope], atol=1e-5)
+        assert np.allclose(actors[scope].mode(obs), modes[scope], atol=1e-5)
+    assert actors["a-0_seller"](obs).shape == (4, 5) and actors["a-0_buyer"](obs).shape == (4, 2)
+
@@ -0,0 +1,59 @@
+import numpy as np
+from drl_negotiation.a2c.numpy_actor import ACTORS_FILE, save_actors
+from drl_negotiation.a2c.policy_registry import PolicyRegistry
+
+
+def test_policy_registry_lru():
+    registry = PolicyRegistry(max_size=2)
+    loads = []
+
+    def loader(key):
+        def load():
+            loads.append(key)
+            return object()
+        return load
+
+    a = registry.get("a", loader("a"))
+    assert registry.get("a", loader("a")) is a
+    registry.get("b", loader("b"))
+    # a is used recently, b is evicted
+    registry.get("a", loader("a"))
+    registry.get("c", loader("c"))
+    assert "a" in registry and "c" in registry and "b" not in registry
+    assert loads == ["a", "b", "c"]
+    assert registry.hits == 2 and registry.misses == 3
+
+
+def test_policy_registry_numpy_actor(tmp_path):
+    model_path = str(tmp_path) + "/"
+    weights = [("s/p_func/dense/kernel", np.ones((4, 3))), ("s/p_func/dense/bias", np.zeros(3))]
+    save_actors(model_path + ACTORS_FILE, {"s": {"weights": weights, "distribution": "soft_categorical", "size": 3}})
+
+    registry = PolicyRegistry()
+    actor = registry.actor(model_path, "s", (4, ), None)
+    # the same instance for all agents, the weights are read only
+    assert registry.actor(model_path, "s", (4, ), None) is actor
+    assert not actor.layers[0][0].flags.writeable
+    assert actor(np.ones((1, 4))).shape == (1, 3)
+
+
+def test_policy_registry_exported_once(tmp_path, monkeypatch):
+    import drl_negotiation.a2c.numpy_actor as numpy_actor
+
+    model_path = str(tmp_path) + "/"
+    spec = lambda scope: {"weights": [(f"{scope}/p_func/dense/kernel", np.ones((4, 3))),
+                                      (f"{scope}/p_func/dense/bias", np.zeros(3))],
+                          "distribution": "soft_categorical", "size": 3}
+    save_actors(model_path + ACTORS_FILE, {"s": spec("s"), "b": spec("b")})
+    loads = []
+    load_actors = numpy_actor.load_actors
+    monkeypatch.setattr(numpy_actor, "load_actors", lambda file: loads.append(file) or load_actors(file))
+
+    registry = PolicyRegistry()
+    seller = registry.actor(model_path, "s", (4, ), None)
+    buyer = registry.actor(model_path, "b", (4, ), None)
+    # actors.npz of the directory is read once for all its scopes
+    assert seller is not buyer and len(loads) == 1
+    registry.clear()
+    registry.actor(model_path, "s", (4, ), None)
+    assert len(loads) == 2
@@ -0,0 +1,151 @@
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from drl_negotiation.a2c.replay_buffer import ReplayBuffer, JointReplayBuffer, SumTree, PrioritizedReplayBuffer
+
+
+def test_replay_buffer():
+    """
+    Test ReplayBuffer, ring buffer with preallocated columns
+    """
+    size = 8
+    buffer = ReplayBuffer(size)
+    assert len(buffer) == 0
+
+    for i in range(size + 3):
+        buffer.add(np.full(4, i), np.full(2, -i), float(i), np.full(4, i + 1), float(i % 2))
+
+    # the oldest transitions are overwritten
+    assert len(buffer) == size
+    obs, act, rew, obs_next, done = buffer.collect()
+    assert obs.shape == (size, 4) and act.shape == (size, 2)
+    assert rew.shape == (size, ) and done.shape == (size, )
+    assert sorted(rew.tolist()) == list(range(3, size + 3))
+
+    index = buffer.make_index(32)
+    assert index.shape == (32, )
+    assert np.all(index < size)
+    obs, act, rew, obs_next, done = buffer.sample_index(index)
+    assert obs.shape == (32, 4)
+    assert np.allclose(obs[:, 0], rew)
+    assert np.allclose(obs_next[:, 0], rew + 1)
+    assert np.allclose(act[:, 0], -rew)
+    assert np.allclose(done, rew % 2)
+
+    buffer.clear()
+    assert len(buffer) == 0
+
+
+def test_joint_replay_buffer():
+    """
+    Test JointReplayBuffer, transitions of all agents in one row
+    """
+    n_agents = 3
+    buffer = JointReplayBuffer(16, n_agents)
+    for t in range(10):
+        buffer.add(
+            [np.full(4 + i, t + i) for i in range(n_agents)],
+            [np.full(2, -t - i) for i in range(n_agents)],
+            [t * 10 + i for i in range(n_agents)],
+            [np.full(4 + i, t + i + 1) for i in range(n_agents)],
+            [float(t == 9)] * n_agents,
+        )
+    assert len(buffer) == 10
+
+    index = buffer.make_index(5)
+    obs_n, act_n, rew, obs_next_n, done = buffer.sample_index(index)
+    assert len(obs_n) == len(act_n) == len(obs_next_n) == n_agents
+    assert rew.shape == done.shape == (5, n_agents)
+    for i in range(n_agents):
+        assert obs_n[i].shape == (5, 4 + i)
+        assert np.allclose(obs_n[i][:, 0], index + i)
+        assert np.allclose(obs_next_n[i][:, 0], index + i + 1)
+        assert np.allclose(act_n[i][:, 0], -index - i)
+        assert np.allclose(rew[:, i], index * 10 + i)
+        assert np.allclose(done[:, i], index == 9)
+
+
+def test_prioritized_replay_buffer():
+    """
+    Test SumTree and PrioritizedReplayBuffer
+    """
+    tree = SumTree(5)
+    tree.update(np.arange(5), [1.0, 2.0, 3.0, 4.0, 0.0])
+    assert np.isclose(tree.total(), 10.0)
+    assert tree.find_prefixsum_idx([0.5, 1.5, 3.5, 9.5]).tolist() == [0, 1, 2, 3]
+    tree.update([1, 1], 0.0)
+    assert np.isclose(tree.total(), 8.0)
+
+    buffer = PrioritizedReplayBuffer(16, alpha=1.0)
+    for i in range(10):
+        buffer.add(np.full(3, i), np.zeros(2), float(i), np.full(3, i + 1), 0.0)
+
+    # only transition 7 has a priority larger than epsilon
+    buffer.update_priorities(np.arange(10), np.zeros(10))
+    buffer.update_priorities([7], np.array([1.0]))
+    index = buffer.make_index(8)
+    assert np.all(index == 7)
+    weights = buffer.importance_weights(index, beta=0.4)
+    assert weights.shape == (8, ) and np.allclose(weights, 1.0)
+
+    # uniform priorities, all transitions can be sampled
+    buffer.update_priorities(np.arange(10), np.ones(10))
+    index = buffer.make_index(1000)
+    assert np.all(index < len(buffer))
+    assert len(np.unique(index)) == 10
+
+
+def test_memmap_replay_buffer(tmp_path):
+    """
+    Test MemmapReplayBuffer, the transitions of the last flush are restored
+    """
+    from drl_negotiation.a2c.replay_buffer import make_replay_buffer, MemmapJointReplayBuffer
+
+    directory = str(tmp_path / "replay")
+    buffer = make_replay_buffer(8, directory=directory)
+    for i in range(5):
+        buffer.add(np.full(4, i), np.full(2, -i), float(i), np.full(4, i + 1), 0.0)
+    assert isinstance(buffer._storage["obs"], np.memmap)
+    buffer.flush()
+    # added after the flush, lost when restored
+    buffer.add(np.full(4, 5), np.full(2, -5), 5.0, np.full(4, 6), 0.0)
+
+    restored = make_replay_buffer(8, directory=directory, restore=True)
+    assert len(restored) == 5
+    obs, act, rew, obs_next, done = restored.collect()
+    assert sorted(rew.tolist()) == list(range(5))
+    restored.add(np.full(4, 9), np.full(2, -9), 9.0, np.full(4, 10), 1.0)
+    assert len(restored) == 6
+    # transitions of other shapes are rejected by a restored buffer
+    restored = make_replay_buffer(8, directory=directory, restore=True)
+    with pytest.raises(ValueError):
+        restored.add(np.full(5, 9), np.full(2, -9), 9.0, np.full(5, 10), 1.0)
+
+    # a new buffer starts empty
+    assert len(make_replay_buffer(8, directory=directory)) == 0
+
+    joint_dir = str(tmp_path / "joint")
+    joint = MemmapJointReplayBuffer(4, 2, joint_dir)
+    for t in range(6):
+        joint.add([np.full(3, t), np.full(2, t)], [np.ones(2), np.ones(2)], [t, -t], [np.zeros(3), np.zeros(2)], [0., 0.])
+    joint.flush()
+    restored = make_replay_buffer(4, n_agents=2, directory=joint_dir, restore=True, prioritized=True)
+    assert len(restored) == 4
+    obs_n, act_n, rew, obs_next_n, done = restored.sample_index(restored.make_index(4))
+    assert obs_n[0].shape == (4, 3) and obs_n[1].shape == (4, 2)
+    assert np.allclose(obs_n[0][:, 0], rew[:, 0])
+
+    # same joint width, but another layout of the agents
+    restored = make_replay_buffer(4, n_agents=2, directory=joint_dir, restore=True)
+    with pytest.raises(ValueError):
+        restored.add([np.zeros(2), np.zeros(3)], [np.ones(2), np.ones(2)], [0, 0], [np.zeros(2), np.zeros(3)], [0., 0.])
+
+
+if __name__ == '__main__':
+    test_replay_buffer()
+    test_joint_replay_buffer()
+    test_prioritized_replay_buffer()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_memmap_replay_buffer(Path(tmp))
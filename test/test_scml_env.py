@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+from drl_negotiation.core import S_F_BEGIN, S_F_END
+
+
+def _actions(env):
+    return [np.eye(space.n)[np.random.randint(space.n)] if hasattr(space, "n") else space.sample()
+            for space in env.action_space]
+
+
+def test_scml_env_state_table():
+    """
+    Test the batch callbacks of SCMLEnv, observations, rewards and dones computed from the state table of TrainWorld
+    are the same as the per agent callbacks, for seller and buyer, at every step
+    """
+    from drl_negotiation.utils import make_env
+
+    random.seed(0)
+    np.random.seed(0)
+    env = make_env("scml")
+    assert env._batch
+    checked = []
+
+    def check(name, batch_callback, callback):
+        def _check(world):
+            # called by SCMLEnv.step after the world step and before f[1] = f[2]
+            batch = batch_callback(world)
+            for i, agent in enumerate(world.policy_agents):
+                for seller in (True, False):
+                    assert np.allclose(batch[i], callback(agent, world, seller=seller), equal_nan=True), \
+                        (name, agent.name, seller, world.current_step)
+            checked.append(name)
+            return batch
+        return _check
+
+    env.batch_observation_callback = check("observation", env.batch_observation_callback, env.observation_callback)
+    env.batch_reward_callback = check("reward", env.batch_reward_callback, env.reward_callback)
+    env.batch_done_callback = check("done", env.batch_done_callback, env.done_callback)
+
+    obs_n = env.reset()
+    world = env.world
+    rows = world._policy_rows
+    assert len(obs_n) == 2 * len(world.policy_agents)
+    f_end = None
+    for _ in range(5):
+        obs_n, rew_n, done_n, info_n = env.step(_actions(env))
+        assert len(rew_n) == len(done_n) == 2 * len(world.policy_agents)
+        # seller and buyer of an agent are the same
+        assert np.allclose(rew_n[::2], rew_n[1::2], equal_nan=True)
+
+        table = world.state_table[rows]
+        if f_end is not None:
+            # f[1] = f[2] after the rewards of the last step, the balance at its end begins this step
+            assert np.allclose(table[:, S_F_BEGIN], f_end)
+        for agent, row in zip(world.policy_agents, table):
+            assert agent.state.f[1] == agent.state.f[2] == row[S_F_END]
+        f_end = table[:, S_F_END].copy()
+
+    assert checked.count("reward") == 5 and checked.count("observation") == 6 and checked.count("done") == 5
+
+
+if __name__ == '__main__':
+    test_scml_env_state_table()
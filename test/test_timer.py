@@ -0,0 +1,43 @@
+import json
+
+from drl_negotiation.timer import PhaseTimer, NULL_TIMER
+
+
+def test_phase_timer(tmp_path):
+    timer = PhaseTimer()
+    for _ in range(3):
+        with timer.phase("env_step"):
+            with timer.phase("world_step"):
+                pass
+        with timer.phase("update"):
+            pass
+        timer.end_episode()
+    timer.end_episode(n_episodes=2)
+
+    assert timer.phases == ["world_step", "env_step", "update"]
+    assert len(timer.episodes) == 4
+    assert timer.episodes[0]["env_step_calls"] == 1
+    assert timer.episodes[0]["env_step"] >= timer.episodes[0]["world_step"]
+
+    summary = timer.summary()
+    assert summary["episodes"] == 5
+    assert 0 <= summary["update_share"] <= 1
+    assert timer.summary(last=1)["episodes"] == 2
+    # the last record holds 2 episodes, one more record is needed for 3
+    assert timer.summary(last_episodes=2)["episodes"] == 2
+    assert timer.summary(last_episodes=3)["episodes"] == 3
+    assert timer.summary(last_episodes=10)["episodes"] == 5
+
+    timer.to_json(str(tmp_path / "timing.json"))
+    with open(tmp_path / "timing.json") as fp:
+        assert len(json.load(fp)["episodes"]) == 4
+    timer.to_csv(str(tmp_path / "timing.csv"))
+    assert len(open(tmp_path / "timing.csv").readlines()) == 5
+
+
+def test_null_timer():
+    with NULL_TIMER.phase("env_step"):
+        pass
+    NULL_TIMER.end_episode()
+    assert NULL_TIMER.phases == []
+    assert NULL_TIMER.episodes == []
@@ -0,0 +1,46 @@
+import json
+from drl_negotiation.tournament import TournamentRunner
+
+COMPETITORS = ["scml.scml2020.agents.DecentralizingAgent", "scml.scml2020.agents.BuyCheapSellExpensiveAgent"]
+
+
+def test_tournament_resume(tmp_path):
+    results_file = str(tmp_path / "std.jsonl")
+    runner = TournamentRunner(COMPETITORS, n_configs=3, results_file=results_file)
+    specs = runner.specs()
+    assert len({_["config_hash"] for _ in specs}) == 3
+    assert len(runner.pending()) == 3
+
+    # the first configuration is finished, the last line is broken
+    with open(results_file, "w") as fp:
+        fp.write(json.dumps({"config_hash": specs[0]["config_hash"], "competitors_key": runner.competitors_key,
+                             "scores": [{"agent_type": COMPETITORS[0], "score": 1.0},
+                                        {"agent_type": COMPETITORS[1], "score": 0.0}]}) + "\n")
+        fp.write('{"config_hash": ')
+    assert [_["seed"] for _ in runner.pending()] == [1, 2]
+
+    # the order of competitors does not matter, other competitor sets are not cached
+    assert len(TournamentRunner(COMPETITORS[::-1], n_configs=3, results_file=results_file).pending()) == 2
+    assert len(TournamentRunner(COMPETITORS[:1], n_configs=3, results_file=results_file).pending()) == 3
+
+    scores = runner.total_scores()
+    assert [_["agent_type"] for _ in scores] == COMPETITORS
+    assert scores[0]["score"] == 1.0 and scores[0]["n"] == 1
+
+
+def test_tournament_cache_opt_in(tmp_path):
+    # without results_file, nothing is read or written
+    runner = TournamentRunner(COMPETITORS, n_configs=2)
+    assert len(runner.pending()) == 2
+    runner._append({"config_hash": runner.specs()[0]["config_hash"], "competitors_key": runner.competitors_key,
+                    "scores": []})
+    assert len(runner.pending()) == 1
+    assert len(TournamentRunner(COMPETITORS, n_configs=2).pending()) == 2
+    assert not list(tmp_path.iterdir())
+
+    # a new tag does not reuse the scores of the old agents
+    results_file = str(tmp_path / "std.jsonl")
+    old = TournamentRunner(COMPETITORS, n_configs=2, results_file=results_file, tag="v1")
+    old._append({"config_hash": old.specs()[0]["config_hash"], "competitors_key": old.competitors_key, "scores": []})
+    assert len(TournamentRunner(COMPETITORS, n_configs=2, results_file=results_file, tag="v1").pending()) == 1
+    assert len(TournamentRunner(COMPETITORS, n_configs=2, results_file=results_file, tag="v2").pending()) == 2
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+tf = pytest.importorskip("tensorflow").compat.v1
+
+
+def _args(**kwargs):
+    args = dict(lr=1e-2, num_units=8, batch_size=4, max_episode_len=2, n_steps=1, gamma=0.95)
+    args.update(kwargs)
+    return SimpleNamespace(**args)
+
+
+def test_fused_update(monkeypatch):
+    """
+    Test FusedMADDPGUpdate, the same losses, target q values and networks as MADDPGAgentTrainer.update
+    of every trainer from the same variables and batch
+    """
+    import drl_negotiation.utils as U
+    from gym import spaces
+    from drl_negotiation.a2c.distributions import SoftCategoricalProbabilityDistribution
+    from drl_negotiation.a2c.policy import mlp_model
+    from drl_negotiation.a2c.trainer import MADDPGAgentTrainer, FusedMADDPGUpdate
+
+    # the gumbel noise differs between session runs, the actions are the probabilities instead
+    monkeypatch.setattr(SoftCategoricalProbabilityDistribution, "sample", lambda self: tf.nn.softmax(self.logits))
+
+    obs_shape_n = [(3, ), (2, )]
+    act_space_n = [spaces.Discrete(3), spaces.Discrete(2)]
+    rng = np.random.RandomState(0)
+    graph = tf.Graph()
+    with graph.as_default(), U.make_session(num_cpu=1, graph=graph).as_default() as sess:
+        tf.set_random_seed(0)
+        trainers = [MADDPGAgentTrainer(f"agent_{i}", mlp_model, obs_shape_n, act_space_n, i, _args())
+                    for i in range(len(obs_shape_n))]
+        fused = FusedMADDPGUpdate(trainers)
+        sess.run(tf.global_variables_initializer())
+
+        # identical buffers, the same transitions for all trainers
+        for _ in range(8):
+            obs_n = [rng.randn(*shape) for shape in obs_shape_n]
+            act_n = [np.eye(space.n)[rng.randint(space.n)] for space in act_space_n]
+            rew = rng.randn()
+            obs_next_n = [rng.randn(*shape) for shape in obs_shape_n]
+            for i, trainer in enumerate(trainers):
+                trainer.experience(obs_n[i], act_n[i], rew, obs_next_n[i], False, False)
+
+        variables = tf.global_variables()
+        initial = sess.run(variables)
+        trainer_vars = [U.scope_vars(trainer.name + "/") for trainer in trainers]
+
+        np.random.seed(1)
+        fused_losses = fused.update(t=0)
+        fused_values = [sess.run(_) for _ in trainer_vars]
+
+        # every trainer is updated alone from the same variables, the batches are sampled in the same order
+        np.random.seed(1)
+        for i, trainer in enumerate(trainers):
+            for var, value in zip(variables, initial):
+                var.load(value, sess)
+            trainer.preupdate()
+            losses = trainer.update(trainers, t=0)
+            assert np.allclose(fused_losses[i], losses, rtol=1e-5, atol=1e-6)
+            for name, fused_value, value in zip([_.name for _ in trainer_vars[i]], fused_values[i],
+                                                sess.run(trainer_vars[i])):
+                assert np.allclose(fused_value, value, rtol=1e-5, atol=1e-6), name
+
+    assert len(fused_losses) == len(trainers)
+    assert any("target_p_func" in _.name for _ in trainer_vars[0])
+    assert any("target_q_func" in _.name for _ in trainer_vars[0])
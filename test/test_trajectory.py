@@ -0,0 +1,27 @@
+import numpy as np
+from drl_negotiation.a2c.trajectory import TrajectoryRecorder, load_trajectory
+
+
+def test_trajectory_recorder(tmp_path):
+    """
+    Test chunks of the recorder, memory mapped loading and ragged profitabilities
+    """
+    directory = str(tmp_path / "exp")
+    with TrajectoryRecorder(directory, n_agents=2, chunk_size=4) as recorder:
+        for step in range(10):
+            obs_n = [np.full(3, step), np.full(5, step)]
+            action_n = [np.ones(2), np.zeros(4)]
+            info_n = [{"profitability": [0.1] * (step % 3)}, {}]
+            recorder.add(obs_n, action_n, [step, -step], [False, False], step % 5 == 4, info_n)
+        # 2 chunks are written, the last 2 steps are still in memory
+        assert len(recorder._chunks) == 2
+
+    trajectory = load_trajectory(directory)
+    assert len(trajectory) == 10
+    assert [len(_) for _ in trajectory.chunks("obs_1")] == [4, 4, 2]
+    assert isinstance(trajectory.chunks("reward")[0], np.memmap)
+    assert trajectory.column("obs_1").shape == (10, 5)
+    assert np.array_equal(trajectory.column("reward")[:, 1], -np.arange(10))
+    assert np.array_equal(trajectory.column("episode"), [0] * 5 + [1] * 5)
+    assert [len(_) for _ in trajectory.profitability(0)] == [_ % 3 for _ in range(10)]
+    assert all(len(_) == 0 for _ in trajectory.profitability(1))
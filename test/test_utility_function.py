@@ -81,6 +81,59 @@ def test_anegma_utility_function():
         assert ufun ==result
         print(ufun)
 
+def test_normalized_utility_table():
+    from drl_negotiation.utility_functions import MyUtilityFunction, NormalizedUtilityTable
+    from negmas import normalize
+
+    issues = [Issue((300, 550))]
+    mechanism = SAOMechanism(
+        issues=issues, n_steps=100
+    )
+    outcomes = mechanism.ami.outcomes
+
+    for weights in [(-0.35, ), (0.25, )]:
+        ufun = MyUtilityFunction(weights=weights, ami=mechanism.ami)
+        table = NormalizedUtilityTable(ufun, outcomes, rng=(-1, 1))
+        expected = normalize(ufun, outcomes, rng=(-1, 1))
+
+        assert len(table) == len(outcomes)
+        for outcome in Issue.sample(issues=issues, n_outcomes=10, astype=tuple):
+            assert abs(table(outcome) - expected(outcome)) < 1e-6
+
+        # continuous offer, out of the outcome space
+        assert abs(table((400.5, )) - expected((400.5, ))) < 1e-6
+
+def test_eval_batch():
+    import numpy as np
+    from drl_negotiation.utility_functions import MyUtilityFunction, ANegmaUtilityFunction
+
+    issues = [
+        Issue(values=10, name="quantity"),
+        Issue(values=100, name="delivery_time"),
+        Issue(values=100, name="unit_price")
+    ]
+    mechanism = SAOMechanism(
+        issues=issues, n_steps=100
+    )
+    outcomes = Issue.sample(issues=issues, n_outcomes=20, astype=tuple)
+
+    ufun = MyUtilityFunction(weights=(0, -0.5, -0.8), ami=mechanism.ami)
+    values = ufun.eval_batch(np.array(outcomes))
+    assert values.shape == (len(outcomes), )
+    assert np.allclose(values, [ufun(_) for _ in outcomes])
+    assert np.allclose(ufun.eval_all(outcomes), [ufun(_) for _ in outcomes])
+
+    issues = [Issue((300, 550))]
+    mechanism = SAOMechanism(
+        issues=issues, n_steps=100
+    )
+    ufun = ANegmaUtilityFunction(delta=0.6, rp=540, ip=310, max_t=0.8, ami=mechanism.ami)
+    outcomes = Issue.sample(issues=issues, n_outcomes=20, astype=tuple)
+    mechanism.step()
+    assert np.allclose(ufun.eval_batch(np.array(outcomes)), [ufun(_) for _ in outcomes])
+
 if __name__ == '__main__':
     test_my_utility_function()
-    test_anegma_utility_function()
\ No newline at end of file
+    test_anegma_utility_function()
+    test_normalized_utility_table()
+    test_eval_batch()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+from drl_negotiation.utils import generate_config
+
+
+def test_vec_negotiation_env():
+    """
+    Test VecNegotiationEnv, N negotiation sessions with the default ANegma setting, single issue
+    """
+    from drl_negotiation.vec_env import VecNegotiationEnv
+
+    n_envs = 4
+    config = generate_config(n_issues=1)
+    vec_env = VecNegotiationEnv.from_config(n_envs=n_envs, config=config, strategy="ac_s")
+
+    # every session owns its game and negotiators
+    games = [env.game for env in vec_env.envs]
+    assert len(set(id(_) for _ in games)) == n_envs
+    assert len(set(id(_.competitors[0]) for _ in games)) == n_envs
+
+    obs = vec_env.reset()
+    assert obs.shape == (n_envs, vec_env.observation_space.shape[0])
+
+    n_dones = 0
+    for _ in range(config.get("n_steps")):
+        actions = np.array([vec_env.action_space.sample() for _ in range(n_envs)])
+        obs, rewards, dones, infos = vec_env.step(actions)
+        assert obs.shape == (n_envs, vec_env.observation_space.shape[0])
+        assert rewards.shape == (n_envs, )
+        assert dones.shape == (n_envs, )
+        assert len(infos) == n_envs
+        for done, info in zip(dones, infos):
+            if done:
+                assert "terminal_observation" in info
+        n_dones += dones.sum()
+
+    assert n_dones > 0, "finished negotiation sessions must be reset!"
+    vec_env.close()
+
+
+def test_vec_env_without_tensorflow():
+    """
+    Test the workers of SubprocVecSCMLEnv, importing vec_env does not import stable_baselines and tensorflow
+    """
+    code = ("import sys, drl_negotiation.vec_env; "
+            "print([_ for _ in ('stable_baselines', 'tensorflow') if _ in sys.modules])")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, "-c", code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert out.strip().splitlines()[-1] == "[]"
+
+
+if __name__ == '__main__':
+    test_vec_negotiation_env()
+    test_vec_env_without_tensorflow()